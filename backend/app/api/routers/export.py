@@ -1,25 +1,41 @@
 # backend/app/api/routers/export.py
 from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pathlib import Path
 from sqlalchemy.orm import Session
-from datetime import datetime
-import json
+from datetime import date as Date
+import shutil
 import tempfile
 
 from app.db import get_db
-from app.models.observation import Observation
 from app.models.survey import Survey
-from app.models.flightline import FlightLine
-from app.models.observation_point import ObservationPoint
-from app.models.observation_polygon import ObservationPolygon
-from app.services.export.shapefile import export_grouped_shapefiles
+from app.services.export.grouping import (
+    date_prefix, group_features, group_features_projected, resolve_survey_epsg, survey_geoms,
+)
+from app.services.postgis import postgis_enabled
 
 router = APIRouter()
 
+
+def _parse_individual_ids(individual_ids: str | None) -> set[str] | None:
+    # 対象個体ID（指定が無ければ全件）
+    if not individual_ids:
+        return None
+    return {s.strip() for s in individual_ids.split(",") if s.strip()} or None
+
+
+def _resolve_epsg(target_epsg: int | None, survey: Survey, geoms) -> int:
+    try:
+        return resolve_survey_epsg(target_epsg, survey, geoms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/shapefile")
 def make_shp(
     survey_id: int,
-    target_epsg: int,
+    target_epsg: int | None = None,
     encoding: str = "CP932",
     individual_ids: str | None = None,  # CSV（任意）
     db: Session = Depends(get_db),
@@ -28,60 +44,25 @@ def make_shp(
     survey = db.get(Survey, survey_id)
     if not survey:
         raise HTTPException(status_code=404, detail="survey not found")
-    date_prefix = survey.date.strftime("%Y%m%d") if hasattr(survey, "date") and survey.date else datetime.utcnow().strftime("%Y%m%d")
 
-    # 対象個体ID（指定が無ければ全件）
-    target_ids: set[str] | None = None
-    if individual_ids:
-        target_ids = {s.strip() for s in individual_ids.split(",") if s.strip()}
+    target_ids = _parse_individual_ids(individual_ids)
+    # アーカイブ済みの調査はファイルから読むため Python 側で変換する
+    projected = postgis_enabled() and survey.archived_at is None
+    if projected:
+        # PostGIS: 変換・GeoJSON 化は DB 側
+        epsg = _resolve_epsg(target_epsg, survey, survey_geoms(db, survey, None))
+        grouped = group_features_projected(db, [survey], target_ids, {survey_id: epsg})[survey_id]
+    else:
+        grouped = group_features(db, [survey], target_ids)[survey_id]
+        epsg = _resolve_epsg(target_epsg, survey, survey_geoms(db, survey, grouped))
 
-    grouped: dict[tuple[str, str, str], list[dict]] = {}
-
-    def add_feat(gtype: str, geom_json: str, obs: Observation):
-        try:
-            geom = json.loads(geom_json)
-        except Exception:
-            return
-        indiv = obs.individual_id or f"IND-{obs.id}"
-        if target_ids and indiv not in target_ids:
-            return
-        key = (date_prefix, indiv, gtype)
-        feat = {
-            "type": "Feature",
-            "geometry": geom,
-            "properties": {
-                "observation_id": obs.id,
-                "survey_id": obs.survey_id,
-                "species": obs.species,
-                "count": obs.count,
-                "behavior": obs.behavior,
-                "started_at": obs.started_at.isoformat() if obs.started_at else None,
-                "ended_at": obs.ended_at.isoformat() if obs.ended_at else None,
-                "notes": obs.notes,
-                "individual_id": indiv,
-            },
-        }
-        grouped.setdefault(key, []).append(feat)
-
-    # LineString
-    ql = db.query(FlightLine, Observation).join(Observation, FlightLine.observation_id == Observation.id).filter(Observation.survey_id == survey_id)
-    for fl, obs in ql.all():
-        add_feat("LineString", fl.geometry, obs)
-
-    # Point
-    qp = db.query(ObservationPoint, Observation).join(Observation, ObservationPoint.observation_id == Observation.id).filter(Observation.survey_id == survey_id)
-    for pt, obs in qp.all():
-        add_feat("Point", pt.geometry, obs)
-
-    # Polygon
-    qg = db.query(ObservationPolygon, Observation).join(Observation, ObservationPolygon.observation_id == Observation.id).filter(Observation.survey_id == survey_id)
-    for pg, obs in qg.all():
-        add_feat("Polygon", pg.geometry, obs)
+    # pyproj / pyshp / shapely は初回の出力時に読み込む
+    from app.services.export.shapefile import export_grouped_shapefiles
 
     # 一時ディレクトリにZIPを作成し、メモリに読み込んで返す（サーバ上に残さない）
     with tempfile.TemporaryDirectory() as tmpdir:
         out = Path(tmpdir) / f"survey_{survey_id}.zip"
-        export_grouped_shapefiles(grouped, out, target_epsg, encoding)
+        export_grouped_shapefiles(grouped, out, epsg, encoding, projected)
         data = out.read_bytes()
     filename = f"survey_{survey_id}.zip"
     headers = {
@@ -89,3 +70,80 @@ def make_shp(
         "Content-Type": "application/zip",
     }
     return Response(content=data, media_type="application/zip", headers=headers)
+
+
+@router.post("/shapefile/bulk")
+def make_shp_bulk(
+    target_epsg: int | None = None,
+    survey_ids: str | None = None,  # CSV（任意）
+    date_from: Date | None = None,
+    date_to: Date | None = None,
+    encoding: str = "CP932",
+    individual_ids: str | None = None,  # CSV（任意）
+    db: Session = Depends(get_db),
+):
+    """
+    複数調査をまとめて Shapefile 出力する。
+    - survey_ids（CSV）または date_from / date_to（調査日の範囲、両端含む）で対象を指定
+    - 調査ごとに <yyyymmdd>_survey_<id>/ サブフォルダを切った1つの zip をストリーミングで返す
+    - 調査単位の読み出し・書き出しはプロセスプールで並列化（ワーカーには調査 id だけを渡す）
+    - target_epsg 未指定時は調査ごとに平面直角座標系を自動選択
+    """
+    if not survey_ids and date_from is None and date_to is None:
+        raise HTTPException(status_code=400, detail="survey_ids or date_from/date_to is required")
+
+    q = db.query(Survey)
+    if survey_ids:
+        try:
+            ids = {int(s) for s in survey_ids.split(",") if s.strip()}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="survey_ids must be CSV of integers")
+        q = q.filter(Survey.id.in_(ids))
+    if date_from is not None:
+        q = q.filter(Survey.date >= date_from)
+    if date_to is not None:
+        q = q.filter(Survey.date <= date_to)
+    surveys = q.order_by(Survey.date.asc(), Survey.id.asc()).all()
+    if not surveys:
+        raise HTTPException(status_code=404, detail="no surveys matched")
+
+    target_ids = _parse_individual_ids(individual_ids)
+    projected = postgis_enabled() and all(s.archived_at is None for s in surveys)
+    # 調査 id だけを渡し、形状の読み出し・まとめ・書き出しは調査ごとにワーカーで行う
+    jobs = [(f"{date_prefix(s)}_survey_{s.id}", s.id) for s in surveys]
+
+    from app.services.export.shapefile import export_bulk_shapefiles
+
+    # 一時ディレクトリは送信完了後に削除
+    tmpdir = tempfile.mkdtemp()
+    try:
+        out = Path(tmpdir) / "surveys.zip"
+        export_bulk_shapefiles(jobs, out, target_epsg, encoding, target_ids, projected)
+    except ValueError as e:
+        # 系を自動選択できない調査があった
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise
+
+    def _iter_file(path: Path, chunk: int = 1024 * 1024):
+        with path.open("rb") as f:
+            while True:
+                data = f.read(chunk)
+                if not data:
+                    break
+                yield data
+
+    first, last = surveys[0], surveys[-1]
+    filename = f"surveys_{date_prefix(first)}-{date_prefix(last)}.zip"
+    headers = {
+        "Content-Disposition": f"attachment; filename=\"{filename}\"",
+        "Content-Length": str(out.stat().st_size),
+    }
+    return StreamingResponse(
+        _iter_file(out),
+        media_type="application/zip",
+        headers=headers,
+        background=BackgroundTask(shutil.rmtree, tmpdir, ignore_errors=True),
+    )
@@ -0,0 +1,156 @@
+# backend/app/api/routers/heatmap.py
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.orm import Session
+from typing import Literal
+import json
+
+from app.db import get_db
+from app.services.cache import RevisionCache
+from app.services.features import iter_feature_rows
+from app.services.revision import get_revisions
+
+router = APIRouter()
+
+# キー: (species, behavior, survey_ids, cell_m, epsg, sigma, densify, revisions)
+_cache = RevisionCache(maxsize=64)
+
+
+def _parse_ids(survey_ids: str) -> tuple[int, ...]:
+    try:
+        ids = {int(s) for s in survey_ids.split(",") if s.strip()}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="survey_ids must be CSV of integers")
+    if not ids:
+        raise HTTPException(status_code=400, detail="survey_ids is empty")
+    return tuple(sorted(ids))
+
+
+def _compute_grid(
+    db: Session,
+    ids: tuple[int, ...],
+    species: str | None,
+    behavior: str | None,
+    target_epsg: int | None,
+    cell_m: float,
+    smooth_sigma_m: float,
+    densify_m: float | None,
+) -> dict | None:
+    # numpy / pyproj は初回の集計時に読み込む
+    import numpy as np
+    from app.services.crs.registry import resolve_epsg, to_projected, to_lonlat
+    from app.services.heatmap.grid import build_grid, grid_corners_lonlat
+
+    pts_lon, pts_lat, lines_ll = [], [], []
+    for gtype, _table, _fid, geom_json, obs in iter_feature_rows(db, ids, ("Point", "LineString")):
+        if species and obs.species != species:
+            continue
+        if behavior and obs.behavior != behavior:
+            continue
+        try:
+            coords = json.loads(geom_json).get("coordinates")
+        except Exception:
+            continue
+        if not coords:
+            continue
+        if gtype == "Point":
+            pts_lon.append(coords[0])
+            pts_lat.append(coords[1])
+        else:
+            lines_ll.append(np.asarray([c[:2] for c in coords], dtype=float))
+    if not pts_lon and not lines_ll:
+        return None
+
+    # 未指定時は対象形状の重心から系を選ぶ
+    geoms = []
+    if target_epsg is None:
+        geoms = [{"coordinates": list(zip(pts_lon, pts_lat))}] + [{"coordinates": a.tolist()} for a in lines_ll]
+    epsg = resolve_epsg(target_epsg, None, geoms)
+    tf, tf_inv = to_projected(epsg), to_lonlat(epsg)
+
+    lines = []
+    for arr in lines_ll:
+        x, y = tf.transform(arr[:, 0], arr[:, 1])
+        lines.append((np.asarray(x), np.asarray(y)))
+    point_xy = []
+    if pts_lon:
+        x, y = tf.transform(np.asarray(pts_lon, dtype=float), np.asarray(pts_lat, dtype=float))
+        point_xy.append((np.asarray(x), np.asarray(y)))
+
+    g = build_grid(point_xy, lines, cell_m, densify_m, smooth_sigma_m)
+    if g is None:
+        return None
+    g["corners"] = grid_corners_lonlat(g, tf_inv)
+    g["target_epsg"] = epsg
+    return g
+
+
+@router.get("")
+@router.get("/")
+def species_heatmap(
+    survey_ids: str,
+    target_epsg: int | None = None,
+    species: str | None = None,
+    behavior: str | None = None,
+    cell_m: float = 100.0,
+    smooth_sigma_m: float = 0.0,
+    densify_m: float | None = None,
+    format: Literal["png", "json"] = "png",
+    db: Session = Depends(get_db),
+):
+    """
+    点と飛翔線（densify_m 間隔で補間した頂点）を平面直角座標のグリッドに集計した活動量マップ。
+    - survey_ids: CSV（複数調査をまとめて集計）
+    - target_epsg 未指定時は対象形状の重心から平面直角座標系を自動選択
+    - densify_m は cell_m の 1/10 以上。グリッド・補間後の頂点数が上限を超える指定は 400
+    - smooth_sigma_m > 0 でガウス平滑化
+    - format=png: RGBA 画像（四隅の経緯度は X-Heatmap-Corners ヘッダ）
+    - format=json: グリッド値（行0が北端）と座標情報
+    """
+    if cell_m <= 0:
+        raise HTTPException(status_code=400, detail="cell_m must be positive")
+    if smooth_sigma_m < 0:
+        raise HTTPException(status_code=400, detail="smooth_sigma_m must be >= 0")
+    if densify_m is not None and densify_m <= 0:
+        raise HTTPException(status_code=400, detail="densify_m must be positive")
+    ids = _parse_ids(survey_ids)
+    revisions = get_revisions(db, ids)
+    missing = [i for i in ids if i not in revisions]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"survey not found: {missing}")
+
+    key = (species, behavior, ids, cell_m, target_epsg, smooth_sigma_m, densify_m,
+           tuple(revisions[i] for i in ids))
+    try:
+        g = _cache.get_or_compute(
+            key,
+            lambda: _compute_grid(db, ids, species, behavior, target_epsg, cell_m, smooth_sigma_m, densify_m) or {},
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not g:
+        raise HTTPException(status_code=404, detail="no features matched")
+
+    meta = {
+        "target_epsg": g["target_epsg"],
+        "cell_m": g["cell_m"],
+        "origin": [g["minx"], g["miny"]],
+        "shape": [g["ny"], g["nx"]],
+        "corners": g["corners"],
+        "max": float(g["grid"].max()),
+    }
+    if format == "json":
+        return {**meta, "values": g["grid"][::-1, :].round(6).tolist()}
+
+    png = g.get("png")
+    if png is None:
+        from app.services.heatmap.grid import render_png
+
+        png = render_png(g["grid"])
+        g["png"] = png
+    headers = {
+        "X-Heatmap-EPSG": str(g["target_epsg"]),
+        "X-Heatmap-Corners": json.dumps(g["corners"]),
+        "X-Heatmap-Max": str(meta["max"]),
+        "Cache-Control": "private, max-age=60",
+    }
+    return Response(content=png, media_type="image/png", headers=headers)
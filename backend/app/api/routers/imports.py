@@ -0,0 +1,61 @@
+# backend/app/api/routers/imports.py
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from sqlalchemy.orm import Session
+from typing import Literal
+
+from app.db import get_db
+from app.models.survey import Survey
+from app.schemas.commons import Behavior
+
+router = APIRouter()
+
+
+@router.post("/{survey_id}")
+def import_legacy(
+    survey_id: int,
+    file: UploadFile = File(...),
+    format: Literal["auto", "shapefile", "geojson", "gpx"] = "auto",
+    source_epsg: int | None = None,
+    encoding: str = "CP932",
+    default_species: str = "unknown",
+    default_behavior: Behavior = "flight",
+    batch_size: int | None = None,  # 未指定時は DEFAULT_BATCH
+    db: Session = Depends(get_db),
+):
+    """
+    過去データを調査に一括取り込みする。
+    - shapefile: zip（export_grouped_shapefiles の出力形式と同じ属性名を解釈）
+    - geojson: FeatureCollection（EPSG:4326 前提。違う場合は source_epsg）
+    - gpx: trk/rte → LineString、wpt → Point
+    属性に種名・行動が無い場合は default_species / default_behavior を使う。
+    """
+    # numpy / pyproj / pyshp は初回の取り込み時に読み込む
+    from app.services.archive import SurveyArchived
+    from app.services.importer.legacy import DEFAULT_BATCH, detect_format, import_features, iter_source
+
+    survey = db.get(Survey, survey_id)
+    if not survey:
+        raise HTTPException(status_code=404, detail="survey not found")
+    if survey.archived_at is not None:
+        raise HTTPException(status_code=409, detail="survey is archived")
+    if batch_size is None:
+        batch_size = DEFAULT_BATCH
+    if batch_size <= 0:
+        raise HTTPException(status_code=400, detail="batch_size must be positive")
+    try:
+        fmt = detect_format(file.filename) if format == "auto" else format
+        source = iter_source(file.file, fmt, encoding, source_epsg)
+        result = import_features(
+            db, survey_id, survey.date, source,
+            default_species=default_species,
+            default_behavior=default_behavior,
+            batch_size=batch_size,
+        )
+    except SurveyArchived as e:
+        # 取り込み中にアーカイブされた（それまでのバッチは取り込み済み）
+        raise HTTPException(status_code=409, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"survey_id": survey_id, "format": fmt, **result}
@@ -1,13 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 import json
 
 from app.db import get_db
-from app.schemas.observation import RecordIn
+from app.schemas.observation import ObservationQuery, RecordIn
+from app.models.survey import Survey
 from app.models.observation import Observation
 from app.models.flightline import FlightLine
 from app.models.observation_point import ObservationPoint
 from app.models.observation_polygon import ObservationPolygon
+from app.services.archive import is_archived, lock_survey
+from app.services.features import feature_collection
+from app.services.postgis import feature_collection_json, mvt_tile, postgis_enabled
+from app.services.revision import bump_revision
+from app.services.snapshot import current_snapshot, ensure_snapshot
+from app.services.timestamps import local_tz, to_storage
 
 router = APIRouter()
 
@@ -21,18 +29,29 @@ def ping():
 def record_observation(payload: RecordIn, db: Session = Depends(get_db)):
     # 1) Observation 保存
     obs_in = payload.observation
+    # 調査行をロックしてから確認する（確認〜commit の間にアーカイブされて行が消えるのを防ぐ）
+    survey = lock_survey(db, obs_in.survey_id)
+    if survey is None:
+        raise HTTPException(status_code=404, detail="survey not found")
+    if survey.archived_at is not None:
+        raise HTTPException(status_code=409, detail="survey is archived")
     obs = Observation(
         survey_id=obs_in.survey_id,
         individual_id=obs_in.individual_id,
         species=obs_in.species,
         count=obs_in.count,
         behavior=obs_in.behavior,
-        started_at=obs_in.started_at,
-        ended_at=obs_in.ended_at,
+        # 保存は naive UTC（タイムゾーン無しで送られた値は UTC とみなす）
+        started_at=to_storage(obs_in.started_at),
+        ended_at=to_storage(obs_in.ended_at),
         notes=obs_in.notes or "",
     )
     db.add(obs)
     db.flush()  # id 採番
+    # 行ロックの無い SQLite 向けに、書き込みロックを得た後で同じトランザクション内でもう一度確認する
+    if is_archived(db, obs_in.survey_id):
+        db.rollback()
+        raise HTTPException(status_code=409, detail="survey is archived")
 
     # 2) 形状保存（Point | LineString | Polygon）
     geom = payload.feature.geometry or {}
@@ -50,6 +69,7 @@ def record_observation(payload: RecordIn, db: Session = Depends(get_db)):
         created = ObservationPolygon(observation_id=obs.id, geometry=geom_str)
 
     db.add(created)
+    bump_revision(db, obs.survey_id)
     db.commit()
     db.refresh(obs)
 
@@ -60,99 +80,118 @@ def record_observation(payload: RecordIn, db: Session = Depends(get_db)):
     }
 
 
+def _parse_bbox(bbox: str | None) -> tuple[float, float, float, float] | None:
+    if not bbox:
+        return None
+    try:
+        vals = tuple(float(v) for v in bbox.split(","))
+    except ValueError:
+        vals = ()
+    if len(vals) != 4:
+        raise HTTPException(status_code=400, detail="bbox must be minx,miny,maxx,maxy")
+    return vals  # type: ignore[return-value]
+
+
 @router.get("/features")
-def list_features(survey_id: int | None = None, db: Session = Depends(get_db)):
+def list_features(
+    request: Request,
+    survey_id: int | None = None,
+    bbox: str | None = None,
+    db: Session = Depends(get_db),
+):
     """
     保存済みの観察＋形状をGeoJSON FeatureCollectionで返す。
     - survey_id が指定されれば絞り込み
+    - bbox（minx,miny,maxx,maxy / EPSG:4326）で外接矩形が交わる形状に絞り込み
     - Point / LineString / Polygon を統合して一括返却
+    - PostGIS 有効時は DB 側で GeoJSON を組み立てる
+    - アーカイブ済みの調査は survey_id 指定時のみアーカイブファイルから返す（未指定の一覧には含めない）
+    - survey_id のみ指定時は、現在の revision のスナップショット（事前圧縮済み）があればそれを返す
     """
-    feats: list[dict] = []
+    bbox_t = _parse_bbox(bbox)
+    if survey_id is not None and bbox_t is None:
+        revision = db.query(Survey.revision).filter(Survey.id == survey_id).scalar()
+        if revision is not None:
+            snap = current_snapshot(survey_id, revision, request.headers.get("accept-encoding", ""))
+            if snap is not None:
+                path, encoding = snap
+                headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+                if encoding:
+                    headers["Content-Encoding"] = encoding
+                return FileResponse(path, media_type="application/json", headers=headers)
+            ensure_snapshot(survey_id)
+
+    if postgis_enabled() and not (survey_id is not None and is_archived(db, survey_id)):
+        return Response(content=feature_collection_json(db, survey_id, bbox_t), media_type="application/json")
+
+    return feature_collection(db, [survey_id] if survey_id is not None else None, bbox_t)
+
+
+@router.post("/query")
+def query_features(q: ObservationQuery, db: Session = Depends(get_db)):
+    """
+    空間（半径・多角形）と時刻（区間の重なり・毎日の時間帯）と種・行動で形状を横断検索する。
+    調査ごとに STRtree と観察区間のインデックスを作り、revision が変わるまで使い回す。
+    - 結果は started_at 順。near 指定時は properties.distance_m（m）付き
+    - 時刻は UTC で比較し、time_of_day だけ tz（既定 Asia/Tokyo）の現地時刻で判定する
+    - 返却の形は /observations/features と同じ FeatureCollection
+    """
+    # shapely / numpy / pyproj は初回の検索時に読み込む
+    from app.services.query.index import get_index, parse_polygon, query_index
 
-    # LineString
-    ql = db.query(FlightLine, Observation).join(Observation, FlightLine.observation_id == Observation.id)
-    if survey_id is not None:
-        ql = ql.filter(Observation.survey_id == survey_id)
-    for fl, obs in ql.all():
-        try:
-            geom = json.loads(fl.geometry)
-        except Exception:
-            continue
-        feats.append({
-            "type": "Feature",
-            "geometry": geom,
-            "properties": {
-                "feature_table": "flightlines",
-                "feature_id": fl.id,
-                "observation_id": obs.id,
-                "survey_id": obs.survey_id,
-                "species": obs.species,
-                "count": obs.count,
-                "behavior": obs.behavior,
-                "started_at": obs.started_at.isoformat() if obs.started_at else None,
-                "ended_at": obs.ended_at.isoformat() if obs.ended_at else None,
-                "notes": obs.notes,
-                "individual_id": (obs.individual_id or f"IND-{obs.id}"),
-            }
-        })
-
-    # Point
-    qp = db.query(ObservationPoint, Observation).join(Observation, ObservationPoint.observation_id == Observation.id)
-    if survey_id is not None:
-        qp = qp.filter(Observation.survey_id == survey_id)
-    for pt, obs in qp.all():
+    polygon = None
+    if q.polygon is not None:
         try:
-            geom = json.loads(pt.geometry)
-        except Exception:
-            continue
-        feats.append({
-            "type": "Feature",
-            "geometry": geom,
-            "properties": {
-                "feature_table": "observation_points",
-                "feature_id": pt.id,
-                "observation_id": obs.id,
-                "survey_id": obs.survey_id,
-                "species": obs.species,
-                "count": obs.count,
-                "behavior": obs.behavior,
-                "started_at": obs.started_at.isoformat() if obs.started_at else None,
-                "ended_at": obs.ended_at.isoformat() if obs.ended_at else None,
-                "notes": obs.notes,
-                "individual_id": (obs.individual_id or f"IND-{obs.id}"),
-            }
-        })
-
-    # Polygon
-    qg = db.query(ObservationPolygon, Observation).join(Observation, ObservationPolygon.observation_id == Observation.id)
-    if survey_id is not None:
-        qg = qg.filter(Observation.survey_id == survey_id)
-    for pg, obs in qg.all():
-        try:
-            geom = json.loads(pg.geometry)
-        except Exception:
-            continue
-        feats.append({
-            "type": "Feature",
-            "geometry": geom,
-            "properties": {
-                "feature_table": "observation_polygons",
-                "feature_id": pg.id,
-                "observation_id": obs.id,
-                "survey_id": obs.survey_id,
-                "species": obs.species,
-                "count": obs.count,
-                "behavior": obs.behavior,
-                "started_at": obs.started_at.isoformat() if obs.started_at else None,
-                "ended_at": obs.ended_at.isoformat() if obs.ended_at else None,
-                "notes": obs.notes,
-                "individual_id": (obs.individual_id or f"IND-{obs.id}"),
-            }
-        })
-
+            polygon = parse_polygon(q.polygon)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if q.start is not None and q.end is not None and q.end < q.start:
+        raise HTTPException(status_code=400, detail="end must be >= start")
+    try:
+        tz = local_tz(q.tz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    sq = db.query(Survey.id, Survey.revision, Survey.area_bbox)
+    if q.survey_ids is not None:
+        ids = set(q.survey_ids)
+        found = {sid for (sid,) in db.query(Survey.id).filter(Survey.id.in_(ids))}
+        missing = sorted(ids - found)
+        if missing:
+            raise HTTPException(status_code=404, detail=f"survey not found: {missing}")
+        sq = sq.filter(Survey.id.in_(ids))
+    else:
+        sq = sq.filter(Survey.archived_at.is_(None))
+    if q.date_from is not None:
+        sq = sq.filter(Survey.date >= q.date_from)
+    if q.date_to is not None:
+        sq = sq.filter(Survey.date <= q.date_to)
+
+    near = (q.near.lon, q.near.lat, q.near.radius_m) if q.near else None
+    tod = (q.time_of_day.from_, q.time_of_day.to) if q.time_of_day else None
+    feats: list[dict] = []
+    for sid, rev, area_bbox in sq.order_by(Survey.id).all():
+        ix = get_index(db, sid, rev or 0, area_bbox)
+        feats.extend(query_index(ix, near, polygon, q.start, q.end, tod, q.species, q.behavior, q.geom_types,
+                                 tz))
+    feats.sort(key=lambda f: (f["properties"]["started_at"] or "", f["properties"]["feature_table"],
+                              f["properties"]["feature_id"]))
+    if q.limit is not None:
+        feats = feats[:q.limit]
     return {"type": "FeatureCollection", "features": feats}
 
 
+@router.get("/tiles/{z}/{x}/{y}.mvt")
+def feature_tile(z: int, x: int, y: int, survey_id: int | None = None, db: Session = Depends(get_db)):
+    """ベクタタイル（PostGIS 有効時のみ。レイヤ名 observations）"""
+    if not postgis_enabled():
+        raise HTTPException(status_code=501, detail="vector tiles require PostGIS")
+    if z < 0 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="invalid tile")
+    data = mvt_tile(db, z, x, y, survey_id)
+    return Response(content=data, media_type="application/vnd.mapbox-vector-tile")
+
+
 @router.delete("/feature")
 def delete_feature(feature_table: str, feature_id: int, db: Session = Depends(get_db)):
     table = feature_table
@@ -168,6 +207,9 @@ def delete_feature(feature_table: str, feature_id: int, db: Session = Depends(ge
     obj = db.get(model, feature_id)
     if not obj:
         raise HTTPException(status_code=404, detail="feature not found")
+    obs = db.get(Observation, obj.observation_id)
     db.delete(obj)
+    if obs is not None:
+        bump_revision(db, obs.survey_id)
     db.commit()
     return {"ok": True}
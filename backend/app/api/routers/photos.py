@@ -1,6 +1,149 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.responses import FileResponse, RedirectResponse
+from sqlalchemy.orm import Session
+from typing import Literal
+import re
+
+from app.db import get_db
+from app.models.photo import Photo
+from app.models.survey import Survey
+from app.schemas.photo import PhotoOut
+
 router = APIRouter()
 
+
 @router.get("/ping")
 def ping():
     return {"ok": True, "router": "photos"}
+
+
+def _survey_or_404(db: Session, survey_id: int) -> Survey:
+    s = db.get(Survey, survey_id)
+    if not s:
+        raise HTTPException(status_code=404, detail="survey not found")
+    return s
+
+
+@router.get("")
+@router.get("/")
+def list_photos(survey_id: int, representatives_only: bool = False, db: Session = Depends(get_db)) -> list[PhotoOut]:
+    q = db.query(Photo).filter(Photo.survey_id == survey_id)
+    if representatives_only:
+        q = q.filter(Photo.burst_of.is_(None))
+    return [
+        PhotoOut(
+            id=p.id,
+            survey_id=p.survey_id,
+            file_path=p.file_path,
+            taken_at=p.taken_at,
+            gps_point=p.gps_point,
+            content_hash=p.content_hash,
+            burst_of=p.burst_of,
+            thumb_url=f"/photos/{p.id}/image/thumb",
+        )
+        for p in q.order_by(Photo.taken_at, Photo.id).all()
+    ]
+
+
+@router.post("/{survey_id}")
+def upload_photos(
+    survey_id: int,
+    files: list[UploadFile] = File(...),
+    skip_duplicates: bool = True,
+    db: Session = Depends(get_db),
+):
+    """
+    写真を取り込む（複数可）。EXIF の撮影日時・GPS と、縮小デコードした画像の dHash を保存する。
+    - dHash が近く撮影時刻も近い写真は同じ連写グループ（burst_of に代表写真の id）
+    - skip_duplicates: 内容が同一の写真は保存せず既存の id を返す
+    """
+    # Pillow / numpy / exifread は初回の写真処理時に読み込む
+    from app.services.photos.store import SurveyPhotoIndex, ingest_photo
+
+    s = _survey_or_404(db, survey_id)
+    if s.archived_at is not None:
+        raise HTTPException(status_code=409, detail="survey is archived")
+    index = SurveyPhotoIndex(db, survey_id)
+    results = []
+    for f in files:
+        try:
+            r = ingest_photo(db, survey_id, f.file.read(), index, skip_duplicates)
+        except ValueError as e:
+            r = {"error": str(e)}
+        results.append({"filename": f.filename, **r})
+    db.commit()
+    return {"survey_id": survey_id, "photos": results}
+
+
+@router.post("/{survey_id}/bursts")
+def rebuild_bursts(
+    survey_id: int,
+    max_distance: int | None = None,  # 未指定時は BURST_MAX_DISTANCE
+    window_s: float | None = None,  # 未指定時は BURST_WINDOW_S
+    db: Session = Depends(get_db),
+):
+    """連写グループを撮影時刻順に作り直す（閾値を変えたとき・ハッシュ未計算の旧データ用）"""
+    from app.services.photos.store import BURST_MAX_DISTANCE, BURST_WINDOW_S, regroup_bursts
+
+    _survey_or_404(db, survey_id)
+    max_distance = BURST_MAX_DISTANCE if max_distance is None else max_distance
+    window_s = BURST_WINDOW_S if window_s is None else window_s
+    if not 0 <= max_distance <= 64:
+        raise HTTPException(status_code=400, detail="max_distance must be 0..64")
+    return {"survey_id": survey_id, **regroup_bursts(db, survey_id, max_distance, window_s)}
+
+
+@router.post("/{survey_id}/link")
+def link_survey_photos(survey_id: int, min_score: float = 0.2, db: Session = Depends(get_db)):
+    """連写グループの代表写真を観察へ紐づける（グループの他の写真も同じ観察へ）"""
+    from app.services.photos.store import link_photos
+
+    _survey_or_404(db, survey_id)
+    return {"survey_id": survey_id, **link_photos(db, survey_id, min_score)}
+
+
+DerivativeSize = Literal["thumb", "preview", "report"]
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+@router.get("/derivatives/{content_hash}/{size}.jpg", name="photo_derivative")
+def photo_derivative(content_hash: str, size: DerivativeSize, db: Session = Depends(get_db)):
+    """縮小版（内容ハッシュの URL なので不変。初回のみ生成）"""
+    if not _SHA256.match(content_hash):
+        raise HTTPException(status_code=404, detail="photo not found")
+    p = db.query(Photo).filter(Photo.content_hash == content_hash).first()
+    if p is None:
+        raise HTTPException(status_code=404, detail="photo not found")
+    from app.services.photos.derivatives import get_derivative
+    from app.services.photos.store import photo_abspath
+
+    try:
+        path = get_derivative(photo_abspath(p), content_hash, size)
+    except OSError:
+        raise HTTPException(status_code=404, detail="photo file not found")
+    return FileResponse(
+        path, media_type="image/jpeg",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
+@router.get("/{photo_id}/image/{size}")
+def photo_image(photo_id: int, size: DerivativeSize, db: Session = Depends(get_db)):
+    """写真 id から縮小版の不変 URL へリダイレクトする"""
+    p = db.get(Photo, photo_id)
+    if p is None:
+        raise HTTPException(status_code=404, detail="photo not found")
+    if not p.content_hash:
+        # ハッシュ未計算の旧データ
+        from app.services.photos.hashing import content_hash as compute_content_hash
+        from app.services.photos.store import photo_abspath
+
+        try:
+            p.content_hash = compute_content_hash(photo_abspath(p).read_bytes())
+        except OSError:
+            raise HTTPException(status_code=404, detail="photo file not found")
+        db.commit()
+    # 相対 URL で返す（/photos/{id}/image/{size} → /photos/derivatives/...）。
+    # リバースプロキシが /api を外して転送しても、ブラウザは元の /api/photos/... を基準に解決する
+    url = f"../../derivatives/{p.content_hash}/{size}.jpg"
+    return RedirectResponse(url, status_code=307, headers={"Cache-Control": "private, max-age=300"})
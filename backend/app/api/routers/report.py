@@ -1,14 +1,24 @@
 # backend/app/api/routers/report.py
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException
 from pathlib import Path
-from app.services.report.word import render_report
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+from app.models.survey import Survey
 
 router = APIRouter()
 
 @router.post("/word")
-def make_report(survey_id: int):
+def make_report(survey_id: int, db: Session = Depends(get_db)):
+    # docxtpl / python-docx は初回の報告書作成時に読み込む
+    from app.services.report.context import report_context
+    from app.services.report.word import render_report
+
+    survey = db.get(Survey, survey_id)
+    if survey is None:
+        raise HTTPException(status_code=404, detail="survey not found")
     tpl = Path("/app/templates/report_template.docx")
     out = Path(f"/app/data/exports/report_{survey_id}.docx")
-    context = {"survey_name":"Sample", "table_observations": [], "species_sections":[]}  # TODO
-    render_report(tpl, out, context)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    render_report(tpl, out, report_context(db, survey))
     return {"download": f"/data/exports/{out.name}"}
@@ -6,6 +6,8 @@ from app.db import get_db
 from app.models.survey import Survey
 from app.schemas.survey import SurveyIn, SurveyOut, SurveyUpdate
 from app.models.observation import Observation
+from app.services.archive import archive_survey, archived_tables, delete_survey_data, restore_survey
+from app.services.snapshot import remove_snapshots
 
 router = APIRouter()
 
@@ -26,6 +28,7 @@ def list_surveys(db: Session = Depends(get_db)) -> list[SurveyOut]:
             date=s.date,
             observers=s.observers or "",
             area_bbox=s.area_bbox,
+            archived_at=s.archived_at,
         )
         for s in rows
     ]
@@ -50,6 +53,7 @@ def create_survey(payload: SurveyIn, db: Session = Depends(get_db)) -> SurveyOut
         date=obj.date,
         observers=obj.observers or "",
         area_bbox=obj.area_bbox,
+        archived_at=obj.archived_at,
     )
 
 
@@ -64,6 +68,7 @@ def get_survey(survey_id: int, db: Session = Depends(get_db)) -> SurveyOut:
         date=s.date,
         observers=s.observers or "",
         area_bbox=s.area_bbox,
+        archived_at=s.archived_at,
     )
 
 
@@ -89,6 +94,7 @@ def update_survey(survey_id: int, payload: SurveyUpdate, db: Session = Depends(g
         date=s.date,
         observers=s.observers or "",
         area_bbox=s.area_bbox,
+        archived_at=s.archived_at,
     )
 
 
@@ -97,8 +103,9 @@ def delete_survey(survey_id: int, db: Session = Depends(get_db)):
     s = db.get(Survey, survey_id)
     if not s:
         raise HTTPException(status_code=404, detail="survey not found")
-    db.delete(s)
-    db.commit()
+    # 子行はチャンクごとにコミットしながら消す（一括カスケードで長いロックを取らない）
+    delete_survey_data(db, s)
+    remove_snapshots(survey_id)
     return {"ok": True}
 
 
@@ -107,5 +114,35 @@ def survey_stats(survey_id: int, db: Session = Depends(get_db)):
     s = db.get(Survey, survey_id)
     if not s:
         raise HTTPException(status_code=404, detail="survey not found")
-    obs_count = db.query(Observation).filter(Observation.survey_id == survey_id).count()
+    if s.archived_at is not None:
+        try:
+            obs_count = len(archived_tables(survey_id, s.revision or 0)["observations"])
+        except FileNotFoundError:
+            # アーカイブ書き出し中（まだテーブルに残っている）
+            obs_count = db.query(Observation).filter(Observation.survey_id == survey_id).count()
+    else:
+        obs_count = db.query(Observation).filter(Observation.survey_id == survey_id).count()
     return {"survey_id": survey_id, "observations_count": obs_count}
+
+
+@router.post("/{survey_id}/archive")
+def archive(survey_id: int, db: Session = Depends(get_db)):
+    """
+    観察・形状・写真メタデータ・リンクを data/archive の圧縮ファイルへ移し、常用テーブルから消す。
+    アーカイブ後も survey_id 指定の読み出しはファイルから返す（書き込みは 409）。
+    """
+    try:
+        return archive_survey(db, survey_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post("/{survey_id}/restore")
+def restore(survey_id: int, db: Session = Depends(get_db)):
+    """アーカイブを常用テーブルへ戻す（観察・写真の id は振り直す）"""
+    try:
+        return restore_survey(db, survey_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
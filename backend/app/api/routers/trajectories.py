@@ -0,0 +1,147 @@
+# backend/app/api/routers/trajectories.py
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+import json
+
+from app.db import get_db
+from app.models.survey import Survey
+from app.services.cache import RevisionCache
+from app.services.features import iter_feature_rows, individual_key, observation_properties
+
+router = APIRouter()
+
+# (survey_id, revision, ...) -> 結果。revision が進めば自然に無効化される
+_cache = RevisionCache(maxsize=256)
+
+
+def _features_by_individual(db: Session, survey_id: int, revision: int) -> dict[str, list[dict]]:
+    def load():
+        grouped: dict[str, list[dict]] = {}
+        for _gtype, _table, _fid, geom_json, obs in iter_feature_rows(db, [survey_id], ("Point", "LineString")):
+            try:
+                geom = json.loads(geom_json)
+            except Exception:
+                continue
+            grouped.setdefault(individual_key(obs), []).append({
+                "type": "Feature",
+                "geometry": geom,
+                "properties": observation_properties(obs),
+            })
+        return grouped
+
+    return _cache.get_or_compute((survey_id, revision, "features"), load)
+
+
+def _get_survey(db: Session, survey_id: int) -> Survey:
+    s = db.get(Survey, survey_id)
+    if not s:
+        raise HTTPException(status_code=404, detail="survey not found")
+    return s
+
+
+def _resolve_epsg(target_epsg: int | None, s: Survey, by_indiv: dict[str, list[dict]]) -> int:
+    # 個体ごとに系が変わらないよう、調査全体（範囲 or 全形状）で判定する
+    geoms = (f["geometry"] for feats in by_indiv.values() for f in feats)
+    from app.services.crs.registry import resolve_epsg
+
+    try:
+        return resolve_epsg(target_epsg, s.area_bbox, geoms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _check_params(mcp_percent: float, kde_cell_m: float, kde_bandwidth_m: float | None):
+    if not (0 < mcp_percent <= 100):
+        raise HTTPException(status_code=400, detail="mcp_percent must be in (0, 100]")
+    if kde_cell_m <= 0:
+        raise HTTPException(status_code=400, detail="kde_cell_m must be positive")
+    if kde_bandwidth_m is not None and kde_bandwidth_m <= 0:
+        raise HTTPException(status_code=400, detail="kde_bandwidth_m must be positive")
+
+
+@router.get("/{survey_id}")
+def list_trajectories(
+    survey_id: int,
+    target_epsg: int | None = None,
+    mcp_percent: float = 100.0,
+    kde_cell_m: float = 50.0,
+    db: Session = Depends(get_db),
+):
+    """
+    調査内の個体ごとの軌跡サマリ（距離・速度・行動圏面積）を返す。
+    軌跡座標や区間配列は含まない（個体別エンドポイントで取得）。
+    target_epsg 未指定時は調査範囲／形状から平面直角座標系を自動選択。
+    """
+    _check_params(mcp_percent, kde_cell_m, None)
+    s = _get_survey(db, survey_id)
+    revision = s.revision or 0
+    by_indiv = _features_by_individual(db, survey_id, revision)
+    epsg = _resolve_epsg(target_epsg, s, by_indiv) if by_indiv else target_epsg
+
+    def compute():
+        items = []
+        if not by_indiv:
+            return items
+        # numpy / pyproj / shapely は初回の解析時に読み込む
+        from app.services.crs.registry import to_projected, to_lonlat
+        from app.services.trajectory.engine import analyze_individual
+
+        tf, tf_inv = to_projected(epsg), to_lonlat(epsg)
+        for indiv, feats in sorted(by_indiv.items()):
+            res = analyze_individual(feats, tf, tf_inv, mcp_percent, kde_cell_m)
+            mcp_out = res["home_range"]["mcp"]
+            kde_out = res["home_range"]["kde"]
+            items.append({
+                "individual_id": indiv,
+                "species": sorted({f["properties"]["species"] for f in feats}),
+                "summary": res["summary"],
+                "mcp_area_m2": mcp_out["area_m2"] if mcp_out else None,
+                "kde_isopleth_area_m2": kde_out["isopleth_area_m2"] if kde_out else None,
+            })
+        return items
+
+    key = (survey_id, revision, "summary", epsg, mcp_percent, kde_cell_m)
+    items = _cache.get_or_compute(key, compute)
+    return {"survey_id": survey_id, "revision": revision, "target_epsg": epsg, "individuals": items}
+
+
+@router.get("/{survey_id}/{individual_id}")
+def get_trajectory(
+    survey_id: int,
+    individual_id: str,
+    target_epsg: int | None = None,
+    mcp_percent: float = 100.0,
+    kde_cell_m: float = 50.0,
+    kde_bandwidth_m: float | None = None,
+    db: Session = Depends(get_db),
+):
+    """
+    個体の軌跡（時刻順 LineString）と区間指標・行動圏（MCP / KDE）を返す。
+    - segments: step_m / dt_s / speed_mps / turning_deg（配列、NaN は null）
+    - home_range.mcp.geometry は EPSG:4326 の Polygon
+    """
+    _check_params(mcp_percent, kde_cell_m, kde_bandwidth_m)
+    s = _get_survey(db, survey_id)
+    revision = s.revision or 0
+
+    by_indiv = _features_by_individual(db, survey_id, revision)
+    feats = by_indiv.get(individual_id)
+    if not feats:
+        raise HTTPException(status_code=404, detail="individual not found")
+    epsg = _resolve_epsg(target_epsg, s, by_indiv)
+
+    def compute():
+        from app.services.crs.registry import to_projected, to_lonlat
+        from app.services.trajectory.engine import analyze_individual
+
+        return analyze_individual(feats, to_projected(epsg), to_lonlat(epsg), mcp_percent, kde_cell_m, kde_bandwidth_m)
+
+    key = (survey_id, revision, "individual", individual_id, epsg, mcp_percent, kde_cell_m, kde_bandwidth_m)
+    result = _cache.get_or_compute(key, compute)
+    return {
+        "survey_id": survey_id,
+        "individual_id": individual_id,
+        "revision": revision,
+        "target_epsg": epsg,
+        **result,
+    }
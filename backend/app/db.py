@@ -6,6 +6,23 @@ import os
 # モデル定義側の Base（app.models.base）を利用してメタデータを統一
 from app.models.base import Base
 
+
+def data_dir() -> Path:
+    """データディレクトリ（RAPTOR_DATA_DIR があればそこ。コンテナでは /app/data、ローカルでは <repo root>/data）"""
+    override = os.getenv("RAPTOR_DATA_DIR")
+    if override:
+        d = Path(override)
+        d.mkdir(parents=True, exist_ok=True)
+        return d
+    container_data = Path("/app/data")
+    if container_data.exists():
+        return container_data
+    # backend/app/db.py → ../../.. = <repo root>
+    d = Path(__file__).resolve().parents[2] / "data"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
 # 1) DATABASE_URL が指定されていれば優先（例: postgresql+psycopg://...）
 # 2) それ以外は従来どおり SQLite を使用
 _database_url_env = os.getenv("DATABASE_URL")
@@ -13,15 +30,7 @@ if _database_url_env:
     SQLALCHEMY_DATABASE_URL = _database_url_env
     _is_sqlite = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
 else:
-    _container_data = Path("/app/data")
-    if _container_data.exists():
-        db_path = _container_data / "app.db"
-    else:
-        # backend/app/db.py → ../../.. = <repo root>
-        repo_root = Path(__file__).resolve().parents[2]
-        db_path = repo_root / "data" / "app.db"
-    # ディレクトリ作成（存在しない場合）
-    db_path.parent.mkdir(parents=True, exist_ok=True)
+    db_path = data_dir() / "app.db"
     SQLALCHEMY_DATABASE_URL = f"sqlite:///{db_path}"
     _is_sqlite = True
 
@@ -61,9 +70,43 @@ def init_db() -> None:
                 if "area_bbox" not in names_surv:
                     # SQLite の JSON は TEXT として扱われるため TEXT で追加
                     conn.exec_driver_sql("ALTER TABLE surveys ADD COLUMN area_bbox TEXT")
+
+                # surveys.revision
+                if "revision" not in names_surv:
+                    conn.exec_driver_sql("ALTER TABLE surveys ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+
+                # surveys.archived_at
+                if "archived_at" not in names_surv:
+                    conn.exec_driver_sql("ALTER TABLE surveys ADD COLUMN archived_at DATETIME")
+
+                # photos.content_hash / phash / burst_of
+                names_photo = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(photos)").fetchall()}
+                if "content_hash" not in names_photo:
+                    conn.exec_driver_sql("ALTER TABLE photos ADD COLUMN content_hash VARCHAR")
+                if "phash" not in names_photo:
+                    conn.exec_driver_sql("ALTER TABLE photos ADD COLUMN phash BIGINT")
+                if "burst_of" not in names_photo:
+                    conn.exec_driver_sql("ALTER TABLE photos ADD COLUMN burst_of INTEGER")
+                conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_photos_content_hash ON photos (content_hash)")
         except Exception:
             # ログは省略（MVP）。失敗しても起動続行。
             pass
+    else:
+        # Postgres は IF NOT EXISTS で後追いカラムを追加
+        try:
+            with engine.begin() as conn:
+                conn.exec_driver_sql("ALTER TABLE surveys ADD COLUMN IF NOT EXISTS revision INTEGER NOT NULL DEFAULT 0")
+                conn.exec_driver_sql("ALTER TABLE surveys ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP")
+                conn.exec_driver_sql("ALTER TABLE photos ADD COLUMN IF NOT EXISTS content_hash VARCHAR")
+                conn.exec_driver_sql("ALTER TABLE photos ADD COLUMN IF NOT EXISTS phash BIGINT")
+                conn.exec_driver_sql("ALTER TABLE photos ADD COLUMN IF NOT EXISTS burst_of INTEGER")
+                conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_photos_content_hash ON photos (content_hash)")
+        except Exception:
+            pass
+
+        # PostGIS が使える場合は geom 列・GiST を用意（空間処理を DB 側で行う）
+        from app.services.postgis import setup_postgis
+        setup_postgis(engine)
 
 
 def get_db():
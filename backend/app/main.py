@@ -1,9 +1,22 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from pathlib import Path
-from app.api.routers import auth, surveys, observations, flightlines, photos, export, report
-from app.db import init_db
+import os
+from app.api.routers import auth, surveys, observations, flightlines, photos, export, report, trajectories, heatmap, imports
+from app.db import data_dir, engine, init_db
+from app.services.snapshot import enable_snapshots
+
+# ワーカーの役割（重い依存は各エンドポイントの初回呼び出しで読み込む）
+#   all    : 全ルーター（既定）
+#   api    : 出力・報告書・取り込みを除く。CRS の事前準備もしない
+#   export : 出力・報告書・取り込みだけ（リバースプロキシで /export 等をこちらへ振る）
+ROLE = os.getenv("RAPTOR_ROLE", "all")
+if ROLE not in ("all", "api", "export"):
+    raise RuntimeError(f"RAPTOR_ROLE must be all|api|export: {ROLE}")
+# 0 で起動時の DDL（create_all / 簡易マイグレーション / PostGIS 準備）を省く。別途 init_db 済みの前提
+INIT_DB = os.getenv("RAPTOR_INIT_DB", "1") != "0"
+# 0 で平面直角座標系の事前準備を省く（初回の変換時に作る）
+WARM_CRS = os.getenv("RAPTOR_WARM_CRS", "0" if ROLE == "api" else "1") != "0"
 
 app = FastAPI(title="Raptor MVP API", version="0.1.0")
 
@@ -23,23 +36,40 @@ def health():
 # 初回起動時にDBスキーマを作成
 @app.on_event("startup")
 def on_startup():
-    init_db()
-
-app.include_router(auth.router,         prefix="/auth",         tags=["auth"])
-app.include_router(surveys.router,      prefix="/surveys",      tags=["surveys"])
-app.include_router(observations.router, prefix="/observations", tags=["observations"])
-app.include_router(flightlines.router,  prefix="/flightlines",  tags=["flightlines"])
-app.include_router(photos.router,       prefix="/photos",       tags=["photos"])
-app.include_router(export.router,       prefix="/export",       tags=["export"])
-app.include_router(report.router,       prefix="/report",       tags=["report"])
-
-# /data を静的配信（エクスポート取得用）
-_container_data = Path("/app/data")
-if _container_data.exists():
-    app.mount("/data", StaticFiles(directory=str(_container_data)), name="data")
-else:
-    # repo 直下の data を配信（ローカル開発）
-    repo_root = Path(__file__).resolve().parents[2]
-    data_dir = repo_root / "data"
-    data_dir.mkdir(parents=True, exist_ok=True)
-    app.mount("/data", StaticFiles(directory=str(data_dir)), name="data")
+    if INIT_DB:
+        init_db()
+    else:
+        # DDL は流さず、PostGIS の geom 列が用意済みかだけ確認する
+        from app.services.postgis import detect_postgis
+        detect_postgis(engine)
+    if WARM_CRS:
+        # 平面直角座標系（6669〜6687）の CRS / Transformer / WKT を先に作っておく
+        from app.services.crs.registry import warm_up as warm_up_crs
+        warm_up_crs()
+    # 書き込み後に調査ごとの FeatureCollection スナップショットを再生成する
+    enable_snapshots()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    # 一括出力のプロセスプール（使われていれば）を止める。未使用ならモジュール自体を読み込まない
+    import sys
+    shp = sys.modules.get("app.services.export.shapefile")
+    if shp is not None:
+        shp.shutdown_pool()
+
+if ROLE in ("all", "api"):
+    app.include_router(auth.router,         prefix="/auth",         tags=["auth"])
+    app.include_router(surveys.router,      prefix="/surveys",      tags=["surveys"])
+    app.include_router(observations.router, prefix="/observations", tags=["observations"])
+    app.include_router(flightlines.router,  prefix="/flightlines",  tags=["flightlines"])
+    app.include_router(photos.router,       prefix="/photos",       tags=["photos"])
+    app.include_router(trajectories.router, prefix="/trajectories", tags=["trajectories"])
+    app.include_router(heatmap.router,      prefix="/heatmap",      tags=["heatmap"])
+if ROLE in ("all", "export"):
+    app.include_router(export.router,       prefix="/export",       tags=["export"])
+    app.include_router(report.router,       prefix="/report",       tags=["report"])
+    app.include_router(imports.router,      prefix="/import",       tags=["import"])
+
+# /data を静的配信（エクスポート取得用。コンテナでは /app/data、ローカルでは repo 直下の data）
+app.mount("/data", StaticFiles(directory=str(data_dir())), name="data")
@@ -1,5 +1,5 @@
 # backend/app/models/photo.py
-from sqlalchemy import Integer, Column, ForeignKey, String, DateTime, JSON
+from sqlalchemy import BigInteger, Integer, Column, ForeignKey, String, DateTime, JSON
 from .base import Base
 
 class Photo(Base):
@@ -10,3 +10,7 @@ class Photo(Base):
     taken_at = Column(DateTime, nullable=True)
     gps_point = Column(JSON, nullable=True)  # {"lon":...,"lat":...} (EPSG:4326)
     exif_raw = Column(JSON, nullable=True)
+    content_hash = Column(String, nullable=True, index=True)  # sha256（保存名・完全一致の重複検出）
+    phash = Column(BigInteger, nullable=True)  # dHash 64bit（符号付きで保存）
+    # 連写グループの代表写真の id（自身が代表なら NULL）。写真と観察の紐づけは代表だけで行う
+    burst_of = Column(Integer, nullable=True)
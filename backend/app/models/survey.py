@@ -1,5 +1,5 @@
 # backend/app/models/survey.py
-from sqlalchemy import Integer, String, Date, JSON, Column
+from sqlalchemy import Integer, String, Date, DateTime, JSON, Column
 from .base import Base
 
 class Survey(Base):
@@ -9,3 +9,7 @@ class Survey(Base):
     date = Column(Date, nullable=False)
     observers = Column(String, default="")  # CSV文字列でMVP対応
     area_bbox = Column(JSON, nullable=True)  # [minx,miny,maxx,maxy] (EPSG:4326)
+    # 観察/形状の書き込みごとに +1。派生データ（軌跡・集計など）のキャッシュキーに使う
+    revision = Column(Integer, nullable=False, default=0, server_default="0")
+    # アーカイブ済み（観察・形状・写真メタデータは data/archive の圧縮ファイルへ移動済み）なら日時
+    archived_at = Column(DateTime, nullable=True)
@@ -1,6 +1,6 @@
 # backend/app/schemas/observation.py
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, Field
+from datetime import date, datetime, time
 from typing import Literal
 from .commons import Behavior, GeoJSONFeature
 
@@ -10,6 +10,7 @@ class ObservationIn(BaseModel):
     species: str
     count: int
     behavior: Behavior
+    # 保存は naive UTC。タイムゾーン付き（フロントは toISOString の "Z"）で送る。無しは UTC とみなす
     started_at: datetime
     ended_at: datetime
     notes: str = ""
@@ -26,3 +27,34 @@ class RecordIn(BaseModel):
         if t not in ("Point", "LineString", "Polygon"):
             raise ValueError("feature.geometry.type must be Point|LineString|Polygon")
         return t  # type: ignore[return-value]
+
+
+class NearFilter(BaseModel):
+    lon: float
+    lat: float
+    radius_m: float = Field(gt=0)
+
+
+class TimeOfDayWindow(BaseModel):
+    # from > to なら日付をまたぐ時間帯（例: 22:00〜02:00）
+    from_: time = Field(alias="from")
+    to: time
+
+
+class ObservationQuery(BaseModel):
+    """POST /observations/query の条件（指定したものをすべて満たす形状を返す）"""
+    survey_ids: list[int] | None = None  # 未指定なら全調査（アーカイブ済みは除く）
+    date_from: date | None = None  # 調査日での絞り込み
+    date_to: date | None = None
+    near: NearFilter | None = None
+    polygon: dict | None = None  # GeoJSON Polygon | MultiPolygon (EPSG:4326)
+    # 観察区間 [started_at, ended_at] との重なり。保存は UTC なので、タイムゾーン無しの値は UTC とみなす
+    start: datetime | None = None
+    end: datetime | None = None
+    # 毎日の時間帯。tz（IANA 名、既定 Asia/Tokyo）の現地時刻で判定する
+    time_of_day: TimeOfDayWindow | None = None
+    tz: str = "Asia/Tokyo"
+    species: list[str] | None = None
+    behavior: list[Behavior] | None = None
+    geom_types: list[Literal["Point", "LineString", "Polygon"]] | None = None
+    limit: int | None = Field(default=None, gt=0)
@@ -0,0 +1,15 @@
+# backend/app/schemas/photo.py
+from pydantic import BaseModel
+from typing import Any, Optional
+import datetime as dt
+
+
+class PhotoOut(BaseModel):
+    id: int
+    survey_id: int
+    file_path: str
+    taken_at: Optional[dt.datetime] = None
+    gps_point: Optional[Any] = None
+    content_hash: Optional[str] = None
+    burst_of: Optional[int] = None  # 連写グループの代表写真 id（自身が代表なら None）
+    thumb_url: Optional[str] = None
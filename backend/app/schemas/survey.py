@@ -17,6 +17,7 @@ class SurveyOut(BaseModel):
     date: dt.date
     observers: str
     area_bbox: Optional[Any] = None
+    archived_at: Optional[dt.datetime] = None
 
 
 class SurveyUpdate(BaseModel):
@@ -0,0 +1,346 @@
+# backend/app/services/archive.py
+# 終了した調査の観察・形状・写真メタデータ・写真リンクを調査ごとの圧縮ファイルへ移し、
+# 常用テーブルから外す。ファイルは gzip の JSON Lines:
+#   1行目 {"format": ..., "version": 1, "survey": {...}, "archived_at": ...}
+#   以降  [table, row] を1行ずつ
+#   最終行 ["__end__", {table: 件数}]（途中で切れたファイルを検出するため）
+# 削除・復元はチャンク単位でコミットし、大きな調査でも長いロックを取らない。
+from __future__ import annotations
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterator
+import gzip
+import json
+import os
+
+from sqlalchemy import Date, DateTime, delete, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.db import data_dir
+from app.models.survey import Survey
+from app.models.observation import Observation
+from app.models.flightline import FlightLine
+from app.models.observation_point import ObservationPoint
+from app.models.observation_polygon import ObservationPolygon
+from app.models.photo import Photo
+from app.models.photolink import PhotoLink
+from app.services.cache import RevisionCache
+from app.services.revision import bump_revision
+
+ARCHIVE_FORMAT = "raptor-survey-archive"
+ARCHIVE_VERSION = 1
+DEFAULT_CHUNK = 1000
+
+GEOM_MODELS = {
+    "flightlines": FlightLine,
+    "observation_points": ObservationPoint,
+    "observation_polygons": ObservationPolygon,
+}
+
+# キー: (survey_id, revision) と ("features", survey_id, revision)
+_cache = RevisionCache(maxsize=16)
+
+
+def archive_path(survey_id: int) -> Path:
+    return data_dir() / "archive" / f"survey_{survey_id}.jsonl.gz"
+
+
+def has_archive(survey_id: int) -> bool:
+    return archive_path(survey_id).exists()
+
+
+class SurveyArchived(Exception):
+    """アーカイブ済み（またはアーカイブ中）の調査への書き込み。ルータで 409 にする"""
+
+
+def is_archived(db: Session, survey_id: int) -> bool:
+    return db.query(Survey.archived_at).filter(Survey.id == survey_id).scalar() is not None
+
+
+def lock_survey(db: Session, survey_id: int) -> Survey | None:
+    """
+    書き込み前に調査行をロックして返す（SELECT ... FOR UPDATE。SQLite では無視される）。
+    archive_survey も同じ行をロックして archived_at を立てるので、
+    ロック後に archived_at を確認すれば commit までの間にアーカイブされることはない。
+    """
+    return db.query(Survey).filter(Survey.id == survey_id).with_for_update().one_or_none()
+
+
+# --- 行 <-> JSON -------------------------------------------------------------------
+
+def _dump_row(model, obj) -> dict:
+    out = {}
+    for col in model.__table__.columns:
+        v = getattr(obj, col.key)
+        if isinstance(v, (datetime, date)):
+            v = v.isoformat()
+        out[col.key] = v
+    return out
+
+
+def _load_row(model, row: dict) -> dict:
+    out = {}
+    for col in model.__table__.columns:
+        if col.key not in row:
+            continue
+        v = row[col.key]
+        if v is not None and isinstance(col.type, DateTime):
+            v = datetime.fromisoformat(v)
+        elif v is not None and isinstance(col.type, Date):
+            v = date.fromisoformat(v)
+        out[col.key] = v
+    return out
+
+
+# --- 対象行の選択 -------------------------------------------------------------------
+
+def _obs_ids(survey_id: int):
+    return select(Observation.id).where(Observation.survey_id == survey_id)
+
+
+def _photo_ids(survey_id: int):
+    return select(Photo.id).where(Photo.survey_id == survey_id)
+
+
+def _iter_survey_rows(db: Session, survey_id: int, chunk: int) -> Iterator[tuple[str, dict]]:
+    """調査に属する全行を (table, row) で返す（親→子の順）"""
+    queries = [("observations", Observation, db.query(Observation).filter(Observation.survey_id == survey_id)
+                .order_by(Observation.id))]
+    for table, model in GEOM_MODELS.items():
+        queries.append((table, model, db.query(model).filter(model.observation_id.in_(_obs_ids(survey_id)))
+                        .order_by(model.id)))
+    queries.append(("photos", Photo, db.query(Photo).filter(Photo.survey_id == survey_id).order_by(Photo.id)))
+    queries.append(("photolinks", PhotoLink, db.query(PhotoLink).filter(or_(
+        PhotoLink.observation_id.in_(_obs_ids(survey_id)),
+        PhotoLink.photo_id.in_(_photo_ids(survey_id)),
+    ))))
+    for table, model, q in queries:
+        for obj in q.yield_per(chunk):
+            yield table, _dump_row(model, obj)
+
+
+def purge_survey_rows(db: Session, survey_id: int, chunk: int = DEFAULT_CHUNK) -> int:
+    """
+    調査の観察・形状・写真・リンクを子→親の順にチャンク単位で削除する（チャンクごとにコミット）。
+    調査行そのものは残す。削除件数を返す。
+    """
+    total = 0
+
+    def drain(model, pk, where) -> None:
+        nonlocal total
+        while True:
+            ids = db.execute(select(pk).where(where).limit(chunk)).scalars().all()
+            if not ids:
+                return
+            db.execute(delete(model).where(pk.in_(ids)))
+            db.commit()
+            total += len(ids)
+
+    obs_ids, photo_ids = _obs_ids(survey_id), _photo_ids(survey_id)
+    # photolinks は複合主キーのため photo_id / observation_id 単位で消す
+    for col, ids_q in ((PhotoLink.observation_id, obs_ids), (PhotoLink.photo_id, photo_ids)):
+        while True:
+            ids = db.execute(
+                select(col).where(col.in_(ids_q)).distinct().limit(chunk)
+            ).scalars().all()
+            if not ids:
+                break
+            total += db.execute(delete(PhotoLink).where(col.in_(ids))).rowcount or 0
+            db.commit()
+    for model in GEOM_MODELS.values():
+        drain(model, model.id, model.observation_id.in_(obs_ids))
+    drain(Photo, Photo.id, Photo.survey_id == survey_id)
+    drain(Observation, Observation.id, Observation.survey_id == survey_id)
+    return total
+
+
+# --- アーカイブ / 復元 ---------------------------------------------------------------
+
+def _survey_dict(survey: Survey) -> dict:
+    d = _dump_row(Survey, survey)
+    d.pop("archived_at", None)
+    d.pop("revision", None)
+    return d
+
+
+def _write_archive(db: Session, survey: Survey, chunk: int) -> dict[str, int]:
+    path = archive_path(survey.id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    counts: dict[str, int] = {}
+    header = {
+        "format": ARCHIVE_FORMAT,
+        "version": ARCHIVE_VERSION,
+        "survey": _survey_dict(survey),
+        "archived_at": survey.archived_at.isoformat(),
+    }
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        for table, row in _iter_survey_rows(db, survey.id, chunk):
+            f.write(json.dumps([table, row], ensure_ascii=False) + "\n")
+            counts[table] = counts.get(table, 0) + 1
+        f.write(json.dumps(["__end__", counts]) + "\n")
+    # 書き切ってから置き換える（読み手は常に完全なファイルだけを見る）
+    os.replace(tmp, path)
+    return counts
+
+
+def read_archive(survey_id: int) -> tuple[dict, dict[str, list[dict]]]:
+    """(header, {table: [row]})。行はモデルの型（datetime 等）に戻して返す"""
+    models = {"observations": Observation, "photos": Photo, "photolinks": PhotoLink, **GEOM_MODELS}
+    tables: dict[str, list[dict]] = {t: [] for t in models}
+    header = None
+    complete = False
+    with gzip.open(archive_path(survey_id), "rt", encoding="utf-8") as f:
+        for line in f:
+            item = json.loads(line)
+            if header is None:
+                header = item
+                if header.get("format") != ARCHIVE_FORMAT:
+                    raise ValueError(f"not a survey archive: {archive_path(survey_id)}")
+                continue
+            table, row = item
+            if table == "__end__":
+                complete = True
+                break
+            tables[table].append(_load_row(models[table], row))
+    if header is None or not complete:
+        raise ValueError(f"archive is truncated: {archive_path(survey_id)}")
+    return header, tables
+
+
+def archive_survey(db: Session, survey_id: int, chunk: int = DEFAULT_CHUNK) -> dict:
+    """
+    調査をアーカイブする。
+    1) archived_at を立てて書き込みを止める  2) 圧縮ファイルを書き出す
+    3) revision を進めて読み出しをファイルへ切り替える  4) 常用テーブルからチャンク削除
+    途中で止まっても再実行すれば続きから進む。
+    """
+    # 書き込み中の記録（lock_survey でロック中）の commit を待ってから archived_at を立てる
+    survey = db.get(Survey, survey_id, with_for_update=True)
+    if survey is None:
+        raise LookupError("survey not found")
+    counts = None
+    if survey.archived_at is None or not has_archive(survey_id):
+        if survey.archived_at is None:
+            survey.archived_at = datetime.utcnow()
+            bump_revision(db, survey_id)
+            db.commit()
+            db.refresh(survey)
+        counts = _write_archive(db, survey, chunk)
+        bump_revision(db, survey_id)
+        db.commit()
+    deleted = purge_survey_rows(db, survey_id, chunk)
+    return {
+        "survey_id": survey_id,
+        "archived_at": survey.archived_at.isoformat(),
+        "path": str(archive_path(survey_id)),
+        "counts": counts,
+        "deleted_rows": deleted,
+    }
+
+
+def restore_survey(db: Session, survey_id: int, chunk: int = DEFAULT_CHUNK) -> dict:
+    """
+    アーカイブを常用テーブルへ戻す。観察・写真の id は振り直し、リンクは新しい id で張り直す。
+    復元中は archived_at を立てたままにして、読み出しはファイルから行う。
+    """
+    survey = db.get(Survey, survey_id)
+    if survey is None:
+        raise LookupError("survey not found")
+    if survey.archived_at is None:
+        raise ValueError("survey is not archived")
+    if not has_archive(survey_id):
+        raise ValueError("archive file not found")
+    _header, tables = read_archive(survey_id)
+
+    # 前回の復元が途中で止まっていた場合の残骸を消す（ファイルが正）
+    purge_survey_rows(db, survey_id, chunk)
+
+    def insert_chunks(model, rows: list[dict]) -> list[int]:
+        new_ids: list[int] = []
+        for i in range(0, len(rows), chunk):
+            batch = rows[i:i + chunk]
+            new_ids.extend(db.execute(
+                insert(model).returning(model.id, sort_by_parameter_order=True), batch,
+            ).scalars().all())
+            db.commit()
+        return new_ids
+
+    def strip_id(row: dict) -> dict:
+        return {k: v for k, v in row.items() if k != "id"}
+
+    obs_rows = tables["observations"]
+    obs_map = dict(zip(
+        (r["id"] for r in obs_rows),
+        insert_chunks(Observation, [{**strip_id(r), "survey_id": survey_id} for r in obs_rows]),
+    ))
+    for table, model in GEOM_MODELS.items():
+        rows = [{**strip_id(r), "observation_id": obs_map[r["observation_id"]]}
+                for r in tables[table] if r["observation_id"] in obs_map]
+        insert_chunks(model, rows)
+    photo_rows = tables["photos"]
+    photo_map = dict(zip(
+        (r["id"] for r in photo_rows),
+        insert_chunks(Photo, [{**strip_id(r), "survey_id": survey_id, "burst_of": None} for r in photo_rows]),
+    ))
+    # 連写グループの代表写真 id も振り直す
+    bursts = [
+        {"id": photo_map[r["id"]], "burst_of": photo_map[r["burst_of"]]}
+        for r in photo_rows if r.get("burst_of") in photo_map
+    ]
+    for i in range(0, len(bursts), chunk):
+        db.execute(update(Photo), bursts[i:i + chunk])
+        db.commit()
+    links = [
+        {**r, "photo_id": photo_map[r["photo_id"]], "observation_id": obs_map[r["observation_id"]]}
+        for r in tables["photolinks"]
+        if r["photo_id"] in photo_map and r["observation_id"] in obs_map
+    ]
+    for i in range(0, len(links), chunk):
+        db.execute(insert(PhotoLink), links[i:i + chunk])
+        db.commit()
+
+    survey.archived_at = None
+    bump_revision(db, survey_id)
+    db.commit()
+    archive_path(survey_id).unlink(missing_ok=True)
+    return {
+        "survey_id": survey_id,
+        "counts": {t: len(rows) for t, rows in tables.items() if rows},
+    }
+
+
+def delete_survey_data(db: Session, survey: Survey, chunk: int = DEFAULT_CHUNK) -> None:
+    """調査を削除する（子行はチャンク削除、アーカイブファイルも消す）"""
+    survey_id = survey.id
+    purge_survey_rows(db, survey_id, chunk)
+    db.delete(survey)
+    db.commit()
+    archive_path(survey_id).unlink(missing_ok=True)
+
+
+# --- 読み出し（read-through） -------------------------------------------------------
+
+def archived_tables(survey_id: int, revision: int) -> dict[str, list[dict]]:
+    return _cache.get_or_compute((survey_id, revision), lambda: read_archive(survey_id)[1])
+
+
+def archived_feature_rows(survey_id: int, revision: int) -> list[tuple[str, str, int, str, Observation]]:
+    """
+    アーカイブから iter_feature_rows と同じ (geom_type, feature_table, feature_id, geometry_json, obs) を作る。
+    obs はセッションに属さない Observation。
+    """
+    def build():
+        tables = archived_tables(survey_id, revision)
+        obs_by_id = {r["id"]: Observation(**r) for r in tables["observations"]}
+        rows = []
+        for gtype, table in (("LineString", "flightlines"), ("Point", "observation_points"),
+                             ("Polygon", "observation_polygons")):
+            for r in tables[table]:
+                obs = obs_by_id.get(r["observation_id"])
+                if obs is not None:
+                    rows.append((gtype, table, r["id"], r["geometry"], obs))
+        return rows
+
+    return _cache.get_or_compute(("features", survey_id, revision), build)
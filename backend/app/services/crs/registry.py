@@ -0,0 +1,194 @@
+# backend/app/services/crs/registry.py
+# JGD2011 平面直角座標系（EPSG:6669〜6687、I〜XIX系）の CRS / Transformer / .prj WKT を
+# プロセス内で共有するレジストリと、経緯度からの系番号の自動選択。
+#
+# 系は平成14年国土交通省告示第9号の区分（都道府県、北海道は市町村・振興局、島嶼は経緯度）で決まる。
+# 行政界そのものは持たず、市区町村役所と地名の参照点（jgd2011_zone_refs.csv、
+# scripts/build_jgd_zone_table.py で生成）のうち最も近い点の都道府県・系を採る。
+# 都府県境から数 km 以内では隣県の点が近いことがある（確実に指定したい場合は target_epsg を明示する）。
+from __future__ import annotations
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, Optional
+
+import numpy as np
+from pyproj import CRS, Transformer
+from pyproj.exceptions import CRSError
+
+JGD2011_ZONES = {zone: 6668 + zone for zone in range(1, 20)}  # 系番号 -> EPSG
+JGD2011_EPSG_CODES = tuple(JGD2011_ZONES.values())
+
+# 系を判定する範囲（度）。範囲外は None
+_LON0, _LON1 = 122.0, 154.5
+_LAT0, _LAT1 = 20.0, 46.0
+
+ZONE_TABLE_PATH = Path(__file__).with_name("jgd2011_zone_refs.csv")
+
+# 都道府県コード -> 系番号（北海道は参照点ごとの系、島嶼は _island_zone で上書き）
+PREF_ZONES = {
+    1: 12, 2: 10, 3: 10, 4: 10, 5: 10, 6: 10, 7: 9, 8: 9, 9: 9, 10: 9,
+    11: 9, 12: 9, 13: 9, 14: 9, 15: 8, 16: 7, 17: 7, 18: 6, 19: 8, 20: 8,
+    21: 7, 22: 8, 23: 7, 24: 6, 25: 6, 26: 6, 27: 6, 28: 5, 29: 6, 30: 6,
+    31: 5, 32: 3, 33: 5, 34: 3, 35: 3, 36: 4, 37: 4, 38: 4, 39: 4, 40: 2,
+    41: 2, 42: 1, 43: 2, 44: 2, 45: 2, 46: 2, 47: 15,
+}
+
+_lock = Lock()
+_zone_table: Optional[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+
+
+@lru_cache(maxsize=64)
+def get_crs(epsg: int) -> CRS:
+    return CRS.from_epsg(epsg)
+
+
+@lru_cache(maxsize=64)
+def get_transformer(src_epsg: int, dst_epsg: int) -> Transformer:
+    return Transformer.from_crs(get_crs(src_epsg), get_crs(dst_epsg), always_xy=True)
+
+
+def to_projected(epsg: int) -> Transformer:
+    """EPSG:4326 → epsg"""
+    return get_transformer(4326, epsg)
+
+
+def to_lonlat(epsg: int) -> Transformer:
+    """epsg → EPSG:4326"""
+    return get_transformer(epsg, 4326)
+
+
+@lru_cache(maxsize=64)
+def get_prj_wkt(epsg: int) -> str:
+    """Shapefile の .prj に書く WKT（ESRI 形式は使わず pyproj 既定の WKT）"""
+    return get_crs(epsg).to_wkt()
+
+
+def _zone_table_arrays() -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """参照点表 (lon, lat, 都道府県コード, 系番号)"""
+    global _zone_table
+    if _zone_table is None:
+        with _lock:
+            if _zone_table is None:
+                data = np.loadtxt(ZONE_TABLE_PATH, delimiter=",", comments="#", skiprows=3)
+                _zone_table = (data[:, 0], data[:, 1], data[:, 2].astype(np.int8), data[:, 3].astype(np.int8))
+    return _zone_table
+
+
+def _tokyo_island_zone(lon: float) -> int:
+    # 東京都のうち北緯28度以南: 東経140度30分以西 XVIII、143度以東 XIX、その間 XIV
+    if lon < 140.5:
+        return 18
+    return 19 if lon >= 143.0 else 14
+
+
+def _island_zone(pref: int, lon: float, lat: float) -> Optional[int]:
+    """経緯度で区分される島嶼（問い合わせ点の座標で判定）。該当しなければ None"""
+    if pref == 13 and lat < 28.0:
+        return _tokyo_island_zone(lon)
+    if pref == 47:
+        # 東経126度以西 XVI、130度以東 XVII、その間 XV
+        return 16 if lon < 126.0 else 17 if lon >= 130.0 else 15
+    if pref == 46 and 27.0 <= lat <= 32.0 and 128.3 <= lon <= (130.0 + 13 / 60 if lat < 29.0 else 130.0):
+        # 鹿児島県の北緯27〜32度・東経128度18分〜130度の島（奄美群島は130度13分まで）は I 系
+        return 1
+    return None
+
+
+def zone_for_lonlat(lon: float, lat: float) -> Optional[int]:
+    """経緯度 → 系番号（範囲外は None）"""
+    if not (_LON0 <= lon < _LON1 and _LAT0 <= lat < _LAT1):
+        return None
+    if lat < 28.0 and lon >= 132.0:
+        # 北緯28度以南・東経132度以東の陸地は東京都の島だけ（沖ノ鳥島・南鳥島は参照点から遠い）
+        return _tokyo_island_zone(lon)
+    lons, lats, prefs, zones = _zone_table_arrays()
+    dx = (lons - lon) * np.cos(np.radians(lat))
+    i = int(np.argmin(dx * dx + (lats - lat) ** 2))
+    island = _island_zone(int(prefs[i]), lon, lat)
+    return island if island is not None else int(zones[i])
+
+
+def epsg_for_lonlat(lon: float, lat: float) -> Optional[int]:
+    zone = zone_for_lonlat(lon, lat)
+    return JGD2011_ZONES[zone] if zone else None
+
+
+def _bbox_center(area_bbox) -> Optional[tuple[float, float]]:
+    try:
+        minx, miny, maxx, maxy = (float(v) for v in area_bbox[:4])
+    except Exception:
+        return None
+    return (minx + maxx) / 2.0, (miny + maxy) / 2.0
+
+
+def _coords_center(geometries: Iterable[dict]) -> Optional[tuple[float, float]]:
+    # 頂点の平均（形状ごとの重み付けはしない。系の判定には十分）
+    xs: list[float] = []
+    ys: list[float] = []
+
+    def walk(c):
+        if not c:
+            return
+        if isinstance(c[0], (int, float)):
+            xs.append(float(c[0]))
+            ys.append(float(c[1]))
+        else:
+            for cc in c:
+                walk(cc)
+
+    for g in geometries:
+        if g:
+            walk(g.get("coordinates"))
+    if not xs:
+        return None
+    return float(np.mean(xs)), float(np.mean(ys))
+
+
+def select_epsg(area_bbox=None, geometries: Iterable[dict] = ()) -> Optional[int]:
+    """
+    調査範囲（area_bbox: [minx,miny,maxx,maxy] EPSG:4326）の中心、
+    無ければ形状の頂点重心から平面直角座標系の EPSG を選ぶ。判定できなければ None
+    """
+    center = _bbox_center(area_bbox) if area_bbox else None
+    if center is None:
+        center = _coords_center(geometries)
+    if center is None:
+        return None
+    return epsg_for_lonlat(*center)
+
+
+def warm_up(epsg_codes: Iterable[int] = JGD2011_EPSG_CODES) -> None:
+    """起動時に全系の CRS / Transformer / WKT と系番号の参照点表を読み込んでおく"""
+    _zone_table_arrays()
+    for code in epsg_codes:
+        to_projected(code)
+        to_lonlat(code)
+        get_prj_wkt(code)
+
+
+@lru_cache(maxsize=64)
+def check_projected_epsg(epsg: int) -> int:
+    """距離・面積をメートルで計算できる投影座標系（軸の単位がメートル）の EPSG か確認する。それ以外は ValueError"""
+    try:
+        crs = get_crs(epsg)
+    except CRSError:
+        raise ValueError(f"unknown EPSG code: {epsg}")
+    if not crs.is_projected:
+        raise ValueError(f"EPSG:{epsg} is not a projected CRS; use a metre-based one such as 6677")
+    if any(a.unit_name not in ("metre", "meter") for a in crs.axis_info):
+        raise ValueError(f"EPSG:{epsg} does not use metre units")
+    return epsg
+
+
+def resolve_epsg(target_epsg: Optional[int], area_bbox=None, geometries: Iterable[dict] = ()) -> int:
+    """
+    target_epsg が指定されていればそれを（メートル単位の投影座標系に限る）、無ければ自動選択。
+    不正な EPSG・判定不能なら ValueError
+    """
+    if target_epsg:
+        return check_projected_epsg(int(target_epsg))
+    epsg = select_epsg(area_bbox, geometries)
+    if epsg is None:
+        raise ValueError("could not determine JGD2011 zone; specify target_epsg")
+    return epsg
@@ -1,15 +1,44 @@
 # backend/app/services/exif/reader.py
 from PIL import Image
-import ExifRead
+import exifread
 from datetime import datetime
 from typing import Optional, Tuple
 
+from app.services.timestamps import JST, to_storage
+
 EXIF_DT_KEYS = ["EXIF DateTimeOriginal", "EXIF DateTimeDigitized", "Image DateTime"]
+# 各日時タグに対応する UTC オフセット（EXIF 2.31。記録しないカメラが多い）
+EXIF_OFFSET_KEYS = {
+    "EXIF DateTimeOriginal": "EXIF OffsetTimeOriginal",
+    "EXIF DateTimeDigitized": "EXIF OffsetTimeDigitized",
+    "Image DateTime": "EXIF OffsetTime",
+}
+
+
+def taken_at_from_exif(exif_raw: Optional[dict]) -> Optional[datetime]:
+    """
+    parse_exif の exif_raw → 保存用の撮影日時（naive UTC。services/timestamps.py）。
+    EXIF の日時はカメラの現地時刻なので、オフセットタグが無ければ JST とみなす。
+    """
+    for k in EXIF_DT_KEYS:
+        if not (exif_raw or {}).get(k):
+            continue
+        try:
+            dt = datetime.strptime(str(exif_raw[k]).strip(), "%Y:%m:%d %H:%M:%S")
+        except ValueError:
+            continue
+        offset = (exif_raw.get(EXIF_OFFSET_KEYS[k]) or "").strip()
+        try:
+            tz = datetime.strptime(offset, "%z").tzinfo if offset else JST
+        except ValueError:
+            tz = JST
+        return to_storage(dt, tz)
+    return None
 
 def parse_exif(path: str):
     # 生EXIF（補助）
     with open(path, 'rb') as f:
-        tags = ExifRead.process_file(f, details=False)
+        tags = exifread.process_file(f, details=False)
     # PillowでGPS
     img = Image.open(path)
     gps_info = img.getexif().get_ifd(0x8825) if hasattr(img, 'getexif') else None
@@ -30,7 +59,7 @@ def parse_exif(path: str):
         lat = _to_deg(gps_info.get(2), gps_info.get(1))
         lon = _to_deg(gps_info.get(4), gps_info.get(3))
 
-    # 撮影日時（JSTに正規化は上位で）
+    # 撮影日時（カメラの現地時刻のまま。保存用の UTC には taken_at_from_exif で直す）
     taken_at = None
     for k in EXIF_DT_KEYS:
         if k in tags:
@@ -43,5 +72,6 @@ def parse_exif(path: str):
     return {
         "taken_at": taken_at.isoformat() if taken_at else None,
         "gps_point": {"lon": lon, "lat": lat} if (lon and lat) else None,
-        "exif_raw": {k: str(v) for k, v in tags.items() if k in EXIF_DT_KEYS}
+        "exif_raw": {k: str(v) for k, v in tags.items()
+                     if k in EXIF_DT_KEYS or k in EXIF_OFFSET_KEYS.values()}
     }
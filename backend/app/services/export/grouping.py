@@ -0,0 +1,116 @@
+# backend/app/services/export/grouping.py
+# Shapefile 出力の前段: 調査の形状を (日付, 個体, 形状種別) ごとにまとめ、出力する平面直角座標系を決める。
+# API プロセスと一括出力のワーカープロセスの両方から使う（ワーカーは調査 id だけ受け取り自分で DB を読む）。
+from datetime import datetime
+import json
+
+from sqlalchemy.orm import Session
+
+from app.models.survey import Survey
+from app.services.features import iter_feature_rows, individual_key, observation_properties
+from app.services.postgis import projected_feature_rows, survey_center
+
+
+def date_prefix(survey: Survey) -> str:
+    return survey.date.strftime("%Y%m%d") if hasattr(survey, "date") and survey.date else datetime.utcnow().strftime("%Y%m%d")
+
+
+def group_features(
+    db: Session,
+    surveys: list[Survey],
+    target_ids: set[str] | None,
+) -> dict[int, dict[tuple[str, str, str], list[dict]]]:
+    """
+    調査ごとに {(date_prefix, individual_id, geom_type) -> [Feature]} を作る。
+    複数調査でも形状テーブルごとに1クエリで取得する。
+    """
+    prefixes = {s.id: date_prefix(s) for s in surveys}
+    out: dict[int, dict[tuple[str, str, str], list[dict]]] = {sid: {} for sid in prefixes}
+    for gtype, _table, _fid, geom_json, obs in iter_feature_rows(db, prefixes.keys()):
+        try:
+            geom = json.loads(geom_json)
+        except Exception:
+            continue
+        indiv = individual_key(obs)
+        if target_ids and indiv not in target_ids:
+            continue
+        key = (prefixes[obs.survey_id], indiv, gtype)
+        feat = {"type": "Feature", "geometry": geom, "properties": observation_properties(obs)}
+        out[obs.survey_id].setdefault(key, []).append(feat)
+    return out
+
+
+def group_features_projected(
+    db: Session,
+    surveys: list[Survey],
+    target_ids: set[str] | None,
+    epsg_by_survey: dict[int, int],
+) -> dict[int, dict[tuple[str, str, str], list[dict]]]:
+    """group_features の PostGIS 版。geometry は DB 側で調査ごとの EPSG に変換済み"""
+    prefixes = {s.id: date_prefix(s) for s in surveys}
+    out: dict[int, dict[tuple[str, str, str], list[dict]]] = {sid: {} for sid in prefixes}
+    for (gtype, _fid, geom_json, obs_id, sid, indiv_raw, species, count, behavior,
+         started_at, ended_at, notes) in projected_feature_rows(db, epsg_by_survey):
+        indiv = indiv_raw or f"IND-{obs_id}"
+        if target_ids and indiv not in target_ids:
+            continue
+        feat = {
+            "type": "Feature",
+            "geometry": json.loads(geom_json),
+            "properties": {
+                "observation_id": obs_id,
+                "survey_id": sid,
+                "species": species,
+                "count": count,
+                "behavior": behavior,
+                "started_at": started_at.isoformat() if started_at else None,
+                "ended_at": ended_at.isoformat() if ended_at else None,
+                "notes": notes,
+                "individual_id": indiv,
+            },
+        }
+        out[sid].setdefault((prefixes[sid], indiv, gtype), []).append(feat)
+    return out
+
+
+def survey_geoms(db: Session, survey: Survey, grouped: dict | None):
+    # 系の自動選択に使う形状（PostGIS 時は DB で求めた中心点のみ）
+    if grouped is not None:
+        return (f["geometry"] for feats in grouped.values() for f in feats)
+    center = survey_center(db, survey.id)
+    return [{"type": "Point", "coordinates": list(center)}] if center else []
+
+
+def resolve_survey_epsg(target_epsg: int | None, survey: Survey, geoms) -> int:
+    """未指定時は調査範囲（area_bbox）→ 形状の重心の順で平面直角座標系を自動選択。判定不能なら ValueError"""
+    from app.services.crs.registry import resolve_epsg
+
+    try:
+        return resolve_epsg(target_epsg, survey.area_bbox, geoms)
+    except ValueError as e:
+        raise ValueError(f"survey {survey.id}: {e}")
+
+
+def group_survey(
+    db: Session,
+    survey: Survey,
+    target_epsg: int | None,
+    target_ids: set[str] | None,
+    projected: bool,
+) -> tuple[dict, int | None]:
+    """
+    1調査分の (grouped, epsg)。形状が無ければ ({}, None)。
+    projected=True なら PostGIS で変換済みの座標を返す（アーカイブ済み調査には使えない）
+    """
+    if projected:
+        geoms = survey_geoms(db, survey, None)
+        if not geoms and not survey.area_bbox:
+            return {}, None
+        epsg = resolve_survey_epsg(target_epsg, survey, geoms)
+        grouped = group_features_projected(db, [survey], target_ids, {survey.id: epsg})[survey.id]
+    else:
+        grouped = group_features(db, [survey], target_ids)[survey.id]
+        if not grouped:
+            return {}, None
+        epsg = resolve_survey_epsg(target_epsg, survey, survey_geoms(db, survey, grouped))
+    return grouped, (epsg if grouped else None)
@@ -1,9 +1,21 @@
 # backend/app/services/export/shapefile.py
 import shapefile  # pyshp
-from pyproj import CRS, Transformer
+from pyproj import Transformer
 from shapely.geometry import shape, LineString, Point, Polygon, mapping
+from shapely.geometry.polygon import orient
 from pathlib import Path
 from typing import Iterable, Tuple
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from threading import Lock
+import os
+import zipfile
+
+import numpy as np
+
+from app.services.crs.registry import to_projected, get_prj_wkt, warm_up
+from app.services.timestamps import iso_utc
 
 # target_epsg: 例 6677 (JGD2011 / 平面直角9系)
 
@@ -11,9 +23,8 @@ def export_shapefiles(line_features: Iterable[dict], point_features: Iterable[di
     out_dir = out_zip.parent / (out_zip.stem)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    src_crs = CRS.from_epsg(4326)
-    dst_crs = CRS.from_epsg(target_epsg)
-    tf = Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+    tf = to_projected(target_epsg)
+    prj_wkt = get_prj_wkt(target_epsg)
 
     def _write_shp(path_base: Path, geom_type: str, fields: Tuple[Tuple[str,str,int,int], ...], rows: Iterable[Tuple]):
         w = shapefile.Writer(str(path_base), shapeType=getattr(shapefile, geom_type))
@@ -25,7 +36,7 @@ def export_shapefiles(line_features: Iterable[dict], point_features: Iterable[di
             w.record(*attrs)
         w.close()
         # .prj
-        (path_base.with_suffix('.prj')).write_text(dst_crs.to_wkt())
+        (path_base.with_suffix('.prj')).write_text(prj_wkt)
 
     # Lines
     line_path = out_dir / "flightlines"
@@ -59,24 +70,36 @@ def export_shapefiles(line_features: Iterable[dict], point_features: Iterable[di
     Path(str(out_dir) + '.zip').replace(out_zip)
 
 
-def export_grouped_shapefiles(
+def _tf_coords(tf: Transformer | None, coords) -> list[tuple[float, float]]:
+    # 頂点ごとに transform を呼ばず、配列でまとめて変換（tf=None は変換済み）
+    arr = np.asarray([c[:2] for c in coords], dtype=float)
+    if arr.size == 0:
+        return []
+    if tf is None:
+        return [tuple(c) for c in arr.tolist()]
+    xs, ys = tf.transform(arr[:, 0], arr[:, 1])
+    return list(zip(np.asarray(xs).tolist(), np.asarray(ys).tolist()))
+
+
+def write_grouped_shapefiles(
     grouped: dict,
-    out_zip: Path,
+    out_dir: Path,
     target_epsg: int,
     encoding: str = "CP932",
-):
+    projected: bool = False,
+) -> int:
     """
     grouped: {(date_prefix:str, individual_id:str, geom_type:str) -> list[Feature]}
       - geom_type: "Point" | "LineString" | "Polygon"
       - Feature: {"geometry": GeoJSON, "properties": {...}}
-    出力: yyyymmdd_<individual>_<type>.shp をまとめて zip
+      - projected=True の場合、geometry は既に target_epsg の座標（PostGIS で変換済み）
+    出力: out_dir に yyyymmdd_<individual>_<type>.shp を書き出す（zip 化はしない）
+    返り値: 書き出したレイヤ数
     """
-    out_dir = out_zip.parent / (out_zip.stem)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    src_crs = CRS.from_epsg(4326)
-    dst_crs = CRS.from_epsg(target_epsg)
-    tf = Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+    tf = None if projected else to_projected(target_epsg)
+    prj_wkt = get_prj_wkt(target_epsg)
 
     def _write(path_base: Path, geom_type: str, fields: Tuple[Tuple[str,str,int,int], ...], rows: Iterable[Tuple]):
         w = shapefile.Writer(str(path_base), shapeType=getattr(shapefile, geom_type))
@@ -87,57 +110,60 @@ def export_grouped_shapefiles(
             w.shape(geom)
             w.record(*attrs)
         w.close()
-        (path_base.with_suffix('.prj')).write_text(dst_crs.to_wkt())
+        (path_base.with_suffix('.prj')).write_text(prj_wkt)
 
-    for (date_prefix, individual, gtype), feats in grouped.items():
-        # 共通フィールド（DBF制約に配慮して短名）
-        # obs_id N, species C(50), count N, behav C(10), indiv C(50), started C(19), ended C(19)
-        common_fields = (
-            ("obs_id", "N", 18, 0),
-            ("species", "C", 50, 0),
-            ("count", "N", 10, 0),
-            ("behav", "C", 10, 0),
-            ("indiv", "C", 50, 0),
-            ("started", "C", 25, 0),
-            ("ended", "C", 25, 0),
+    # 共通フィールド（DBF制約に配慮して短名）
+    # obs_id N, species C(50), count N, behav C(10), indiv C(50), started C(19), ended C(19)
+    common_fields = (
+        ("obs_id", "N", 18, 0),
+        ("species", "C", 50, 0),
+        ("count", "N", 10, 0),
+        ("behav", "C", 10, 0),
+        ("indiv", "C", 50, 0),
+        ("started", "C", 25, 0),
+        ("ended", "C", 25, 0),
+    )
+
+    def _utc_field(value: str | None) -> str:
+        # 保存値は naive UTC。取り込み（タイムゾーン無しは JST とみなす）で戻せるよう "Z" を付ける
+        if not value:
+            return ""
+        try:
+            return iso_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
+        except ValueError:
+            return value[:25]
+
+    def _attrs(feat: dict) -> tuple:
+        props = feat["properties"]
+        return (
+            props.get("observation_id"),
+            props.get("species"),
+            props.get("count"),
+            props.get("behavior"),
+            props.get("individual_id"),
+            _utc_field(props.get("started_at")),
+            _utc_field(props.get("ended_at")),
         )
 
+    written = 0
+    for (date_prefix, individual, gtype), feats in grouped.items():
         rows = []
         if gtype == "LineString":
             for feat in feats:
                 geom_ll = shape(feat["geometry"])  # LineString EPSG:4326
-                coords = [tf.transform(x, y) for x, y in geom_ll.coords]
                 geom = shapefile.Shape(shapeType=shapefile.POLYLINE)
-                geom.points = coords
-                attrs = (
-                    feat["properties"].get("observation_id"),
-                    feat["properties"].get("species"),
-                    feat["properties"].get("count"),
-                    feat["properties"].get("behavior"),
-                    feat["properties"].get("individual_id"),
-                    (feat["properties"].get("started_at") or "")[:25],
-                    (feat["properties"].get("ended_at") or "")[:25],
-                )
-                rows.append((geom, attrs))
+                geom.points = _tf_coords(tf, geom_ll.coords)
+                geom.parts = [0]
+                rows.append((geom, _attrs(feat)))
             fname = f"{date_prefix}_{individual}_line"
             _write(out_dir / fname, "POLYLINE", common_fields, rows)
 
         elif gtype == "Point":
             for feat in feats:
                 pt = shape(feat["geometry"])  # Point
-                x, y = tf.transform(pt.x, pt.y)
                 geom = shapefile.Shape(shapeType=shapefile.POINT)
-                geom.points = [(x, y)]
-                attrs = (
-                    feat["properties"].get("observation_id"),
-                    feat["properties"].get("species"),
-                    feat["properties"].get("count"),
-                    feat["properties"].get("behavior"),
-                    feat["properties"].get("individual_id"),
-                    (feat["properties"].get("started_at") or "")[:25],
-                    (feat["properties"].get("ended_at") or "")[:25],
-                )
-                rows.append((geom, attrs))
+                geom.points = _tf_coords(tf, [(pt.x, pt.y)])
+                rows.append((geom, _attrs(feat)))
             fname = f"{date_prefix}_{individual}_point"
             _write(out_dir / fname, "POINT", common_fields, rows)
 
@@ -145,24 +171,110 @@ def export_grouped_shapefiles(
             for feat in feats:
                 poly = shape(feat["geometry"])  # Polygon
                 geom = shapefile.Shape(shapeType=shapefile.POLYGON)
-                # 単純化: 外輪のみ（穴は考慮しない）
-                coords = list(poly.exterior.coords)
-                coords_tf = [tf.transform(x, y) for x, y in coords]
-                geom.points = coords_tf
-                attrs = (
-                    feat["properties"].get("observation_id"),
-                    feat["properties"].get("species"),
-                    feat["properties"].get("count"),
-                    feat["properties"].get("behavior"),
-                    feat["properties"].get("individual_id"),
-                    (feat["properties"].get("started_at") or "")[:25],
-                    (feat["properties"].get("ended_at") or "")[:25],
-                )
-                rows.append((geom, attrs))
+                # 単純化: 外輪のみ（穴は考慮しない）。Shapefile の外輪は時計回り
+                geom.points = _tf_coords(tf, orient(poly, sign=-1.0).exterior.coords)
+                geom.parts = [0]
+                rows.append((geom, _attrs(feat)))
             fname = f"{date_prefix}_{individual}_polygon"
             _write(out_dir / fname, "POLYGON", common_fields, rows)
+        else:
+            continue
+        written += 1
+    return written
+
+
+def export_grouped_shapefiles(
+    grouped: dict,
+    out_zip: Path,
+    target_epsg: int,
+    encoding: str = "CP932",
+    projected: bool = False,
+):
+    """
+    grouped を Shapefile 群に書き出して zip にまとめる（形式は write_grouped_shapefiles を参照）
+    出力: yyyymmdd_<individual>_<type>.shp をまとめて zip
+    """
+    out_dir = out_zip.parent / (out_zip.stem)
+    write_grouped_shapefiles(grouped, out_dir, target_epsg, encoding, projected)
 
     # zip化
     import shutil
     shutil.make_archive(str(out_dir), 'zip', root_dir=out_dir)
     Path(str(out_dir) + '.zip').replace(out_zip)
+
+
+# --- 複数調査の一括出力（プロセスプール） ---------------------------------
+# ワーカーには調査 id だけを渡し、形状の読み出し・個体ごとのまとめ・書き出しをワーカー側で行う
+# （API プロセスで組んだ大きな dict を pickle して渡さない）。
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # ワーカーは使い回す（各ワーカー内で CRS レジストリを温めておく）
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=get_context("spawn"),
+                initializer=warm_up,
+            )
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """アプリ終了時に呼ぶ（ワーカープロセスを止める）"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _write_survey_job(args: tuple) -> int:
+    """1調査分を out_dir に書き出す（ワーカープロセスでも API プロセスでも動く）。返り値はレイヤ数"""
+    from app.db import SessionLocal
+    from app.models.survey import Survey
+    from app.services.export.grouping import group_survey
+
+    survey_id, out_dir, target_epsg, encoding, target_ids, projected = args
+    with SessionLocal() as db:
+        survey = db.get(Survey, survey_id)
+        if survey is None:
+            return 0
+        grouped, epsg = group_survey(db, survey, target_epsg, target_ids, projected)
+    if not grouped:
+        # 形状の無い調査はフォルダを作らない
+        return 0
+    return write_grouped_shapefiles(grouped, Path(out_dir), epsg, encoding, projected)
+
+
+def export_bulk_shapefiles(
+    jobs: list[tuple[str, int]],
+    out_zip: Path,
+    target_epsg: int | None = None,
+    encoding: str = "CP932",
+    target_ids: set[str] | None = None,
+    projected: bool = False,
+) -> int:
+    """
+    jobs: [(subdir_name, survey_id), ...]
+    各調査を subdir_name/ 以下に書き出し、1つの zip にまとめる。返り値は書き出したレイヤ数。
+    書き出しは調査単位でプロセスプールに分散する（2件以上の場合。1件なら同じプロセスで書く）。
+    target_epsg 未指定時は調査ごとに自動選択（判定できない調査があれば ValueError）。
+    """
+    work_dir = out_zip.parent / out_zip.stem
+    work_dir.mkdir(parents=True, exist_ok=True)
+    args = [(sid, str(work_dir / sub), target_epsg, encoding, target_ids, projected) for sub, sid in jobs]
+    if len(args) > 1:
+        written = sum(_get_pool().map(_write_survey_job, args))
+    else:
+        written = sum(_write_survey_job(a) for a in args)
+
+    with zipfile.ZipFile(out_zip, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted(work_dir.rglob("*")):
+            if path.is_file():
+                zf.write(path, path.relative_to(work_dir).as_posix())
+    return written
@@ -0,0 +1,135 @@
+# backend/app/services/features.py
+from typing import Iterable, Iterator
+import json
+
+from sqlalchemy.orm import Session
+
+from app.models.survey import Survey
+from app.models.observation import Observation
+from app.models.flightline import FlightLine
+from app.models.observation_point import ObservationPoint
+from app.models.observation_polygon import ObservationPolygon
+
+# (GeoJSON の type, テーブル名, モデル)
+FEATURE_TABLES = (
+    ("LineString", "flightlines", FlightLine),
+    ("Point", "observation_points", ObservationPoint),
+    ("Polygon", "observation_polygons", ObservationPolygon),
+)
+
+
+def iter_feature_rows(
+    db: Session,
+    survey_ids: Iterable[int] | None = None,
+    geom_types: Iterable[str] | None = None,
+) -> Iterator[tuple[str, str, int, str, Observation]]:
+    """
+    形状テーブルと観察を結合して (geom_type, feature_table, feature_id, geometry_json, obs) を返す。
+    - survey_ids を指定すれば絞り込み（None で全件。アーカイブ済み調査は含まない）
+    - geom_types を指定すれば該当形状のみ
+    - 指定した調査がアーカイブ済みならアーカイブファイルから読む（obs はセッション外のオブジェクト）
+    """
+    ids = list(survey_ids) if survey_ids is not None else None
+    types = set(geom_types) if geom_types is not None else None
+    archived: dict[int, int] = {}
+    if ids:
+        from app.services.archive import has_archive
+
+        archived = {
+            sid: rev or 0
+            for sid, rev in db.query(Survey.id, Survey.revision)
+            .filter(Survey.id.in_(ids), Survey.archived_at.isnot(None)).all()
+            if has_archive(sid)
+        }
+        ids = [i for i in ids if i not in archived]
+    for gtype, table, model in FEATURE_TABLES:
+        if types is not None and gtype not in types:
+            continue
+        if ids is None or ids:
+            q = db.query(model, Observation).join(Observation, model.observation_id == Observation.id)
+            if ids is not None:
+                q = q.filter(Observation.survey_id.in_(ids))
+            else:
+                # アーカイブ中・復元中の調査の常用テーブルの行（途中まで消した／戻した状態）を混ぜない
+                q = q.join(Survey, Survey.id == Observation.survey_id).filter(Survey.archived_at.is_(None))
+            for row, obs in q.all():
+                yield gtype, table, row.id, row.geometry, obs
+        for sid, rev in archived.items():
+            yield from _archived_rows(sid, rev, gtype)
+
+
+def _archived_rows(survey_id: int, revision: int, gtype: str):
+    from app.services.archive import archived_feature_rows
+
+    return (r for r in archived_feature_rows(survey_id, revision) if r[0] == gtype)
+
+
+def individual_key(obs: Observation) -> str:
+    return obs.individual_id or f"IND-{obs.id}"
+
+
+def observation_properties(obs: Observation) -> dict:
+    """GeoJSON Feature の properties（観察の共通属性）"""
+    return {
+        "observation_id": obs.id,
+        "survey_id": obs.survey_id,
+        "species": obs.species,
+        "count": obs.count,
+        "behavior": obs.behavior,
+        "started_at": obs.started_at.isoformat() if obs.started_at else None,
+        "ended_at": obs.ended_at.isoformat() if obs.ended_at else None,
+        "notes": obs.notes,
+        "individual_id": individual_key(obs),
+    }
+
+
+def geometry_bounds(geom: dict) -> tuple[float, float, float, float] | None:
+    """GeoJSON 形状の外接矩形 (minx, miny, maxx, maxy)"""
+    xs: list[float] = []
+    ys: list[float] = []
+
+    def walk(c):
+        if not c:
+            return
+        if isinstance(c[0], (int, float)):
+            xs.append(c[0])
+            ys.append(c[1])
+        else:
+            for cc in c:
+                walk(cc)
+
+    walk(geom.get("coordinates"))
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def bbox_intersects(a: tuple[float, float, float, float], b: tuple[float, float, float, float]) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def feature_collection(
+    db: Session,
+    survey_ids: Iterable[int] | None = None,
+    bbox: tuple[float, float, float, float] | None = None,
+) -> dict:
+    """
+    観察＋形状の GeoJSON FeatureCollection（properties に feature_table / feature_id を含む）。
+    bbox（EPSG:4326）指定時は外接矩形が交わる形状のみ。
+    """
+    feats: list[dict] = []
+    for _gtype, table, fid, geom_json, obs in iter_feature_rows(db, survey_ids):
+        try:
+            geom = json.loads(geom_json)
+        except Exception:
+            continue
+        if bbox is not None:
+            b = geometry_bounds(geom)
+            if b is None or not bbox_intersects(b, bbox):
+                continue
+        feats.append({
+            "type": "Feature",
+            "geometry": geom,
+            "properties": {"feature_table": table, "feature_id": fid, **observation_properties(obs)},
+        })
+    return {"type": "FeatureCollection", "features": feats}
@@ -0,0 +1,175 @@
+# backend/app/services/heatmap/grid.py
+from __future__ import annotations
+from io import BytesIO
+from typing import Iterable, Optional
+
+import numpy as np
+from pyproj import Transformer
+
+MAX_GRID_CELLS = 2048  # 1辺あたりのセル数上限
+MIN_DENSIFY_RATIO = 0.1  # 補間間隔の下限（cell_m に対する比）
+MAX_DENSIFIED_VERTICES = 5_000_000  # 補間後の頂点数の上限（補間前に見積もって断る）
+
+
+def _segment_divisions(x: np.ndarray, y: np.ndarray, step_m: float) -> np.ndarray:
+    # 区間ごとの分割数（1以上）
+    seg_len = np.hypot(np.diff(x), np.diff(y))
+    return np.maximum(1, np.ceil(seg_len / step_m).astype(np.int64))
+
+
+def densified_size(x: np.ndarray, y: np.ndarray, step_m: float) -> int:
+    """densify_line が返す頂点数（配列を作らずに求める）"""
+    if len(x) < 2 or step_m <= 0:
+        return len(x)
+    return int(_segment_divisions(x, y, step_m).sum()) + 1
+
+
+def densify_line(x: np.ndarray, y: np.ndarray, step_m: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    投影座標の折れ線を step_m 間隔程度で補間した頂点列にする（元の頂点も含む）。
+    区間ごとの分割数を求め、np.repeat で一括補間する。
+    """
+    if len(x) < 2 or step_m <= 0:
+        return x, y
+    dx, dy = np.diff(x), np.diff(y)
+    n_div = _segment_divisions(x, y, step_m)
+    seg_idx = np.repeat(np.arange(len(n_div)), n_div)
+    # 区間内の位置（0 <= frac < 1）
+    starts = np.concatenate(([0], np.cumsum(n_div)[:-1]))
+    frac = (np.arange(n_div.sum()) - np.repeat(starts, n_div)) / np.repeat(n_div, n_div)
+    xs = x[seg_idx] + dx[seg_idx] * frac
+    ys = y[seg_idx] + dy[seg_idx] * frac
+    return np.append(xs, x[-1]), np.append(ys, y[-1])
+
+
+def grid_extent(xs: np.ndarray, ys: np.ndarray, cell_m: float) -> Optional[tuple[float, float, int, int]]:
+    """セル境界を cell_m の整数倍に揃えた (minx, miny, nx, ny)。同じ条件なら同じグリッドになる"""
+    if xs.size == 0:
+        return None
+    minx = np.floor(xs.min() / cell_m) * cell_m
+    miny = np.floor(ys.min() / cell_m) * cell_m
+    nx = int(np.floor((xs.max() - minx) / cell_m)) + 1
+    ny = int(np.floor((ys.max() - miny) / cell_m)) + 1
+    return float(minx), float(miny), nx, ny
+
+
+def bin_counts(xs: np.ndarray, ys: np.ndarray, minx: float, miny: float, nx: int, ny: int, cell_m: float) -> np.ndarray:
+    """点をセルに集計した (ny, nx) の件数グリッド（行0が南端）"""
+    ix = np.clip(((xs - minx) // cell_m).astype(np.int64), 0, nx - 1)
+    iy = np.clip(((ys - miny) // cell_m).astype(np.int64), 0, ny - 1)
+    flat = np.bincount(iy * nx + ix, minlength=nx * ny)
+    return flat.reshape(ny, nx).astype(float)
+
+
+def gaussian_smooth(grid: np.ndarray, sigma_cells: float) -> np.ndarray:
+    """分離可能なガウスカーネルで平滑化（x/y の1次元畳み込みを順に適用）"""
+    if sigma_cells <= 0:
+        return grid
+    r = max(1, int(np.ceil(3 * sigma_cells)))
+    k = np.exp(-0.5 * (np.arange(-r, r + 1) / sigma_cells) ** 2)
+    k /= k.sum()
+
+    def _conv(a: np.ndarray, axis: int) -> np.ndarray:
+        pad = [(0, 0), (0, 0)]
+        pad[axis] = (r, r)
+        p = np.pad(a, pad)
+        n = a.shape[axis]
+        out = np.zeros_like(a)
+        for j, w in enumerate(k):
+            out += w * (p[:, j:j + n] if axis == 1 else p[j:j + n, :])
+        return out
+
+    return _conv(_conv(grid, 1), 0)
+
+
+def build_grid(
+    point_xy: Iterable[tuple[np.ndarray, np.ndarray]],
+    line_xy: Iterable[tuple[np.ndarray, np.ndarray]],
+    cell_m: float,
+    densify_m: Optional[float] = None,
+    sigma_m: float = 0.0,
+) -> Optional[dict]:
+    """
+    点と（補間した）飛翔線頂点をグリッドに集計する。
+    point_xy / line_xy は投影座標の (x配列, y配列) の列。
+    グリッドの大きさ・補間後の頂点数は補間前に見積もり、上限を超えれば ValueError。
+    返り値: {"grid": ndarray(ny,nx), "minx","miny","cell_m","nx","ny"}
+    """
+    if densify_m is not None and densify_m < cell_m * MIN_DENSIFY_RATIO:
+        raise ValueError(f"densify_m must be >= {cell_m * MIN_DENSIFY_RATIO:g} (cell_m * {MIN_DENSIFY_RATIO:g})")
+    step = densify_m if densify_m is not None else cell_m / 2.0
+    points = list(point_xy)
+    lines = list(line_xy)
+    if not points and not lines:
+        return None
+    # 補間しても範囲は元の頂点の外に出ない
+    raw_x = np.concatenate([x for x, _y in points + lines])
+    raw_y = np.concatenate([y for _x, y in points + lines])
+    if raw_x.size == 0:
+        return None
+
+    # 平滑化のにじみ分だけ外側に余白を取る
+    margin = 3.0 * sigma_m
+    ext = grid_extent(np.array([raw_x.min() - margin, raw_x.max() + margin]),
+                      np.array([raw_y.min() - margin, raw_y.max() + margin]), cell_m)
+    if ext is None:
+        return None
+    minx, miny, nx, ny = ext
+    if nx > MAX_GRID_CELLS or ny > MAX_GRID_CELLS:
+        raise ValueError(f"grid too large ({nx}x{ny}); increase cell_m")
+    n_vertices = sum(len(x) for x, _y in points) + sum(densified_size(x, y, step) for x, y in lines)
+    if n_vertices > MAX_DENSIFIED_VERTICES:
+        raise ValueError(f"too many densified vertices ({n_vertices}); increase densify_m or cell_m")
+
+    xs_list, ys_list = [x for x, _y in points], [y for _x, y in points]
+    for x, y in lines:
+        dx, dy = densify_line(x, y, step)
+        xs_list.append(dx)
+        ys_list.append(dy)
+    xs = np.concatenate(xs_list)
+    ys = np.concatenate(ys_list)
+
+    grid = bin_counts(xs, ys, minx, miny, nx, ny, cell_m)
+    grid = gaussian_smooth(grid, sigma_m / cell_m)
+    return {"grid": grid, "minx": minx, "miny": miny, "cell_m": cell_m, "nx": nx, "ny": ny}
+
+
+def grid_corners_lonlat(g: dict, tf_inv: Transformer) -> list[list[float]]:
+    """グリッド四隅の経緯度（左上・右上・右下・左下。MapLibre の image source の順）"""
+    minx, miny = g["minx"], g["miny"]
+    maxx = minx + g["nx"] * g["cell_m"]
+    maxy = miny + g["ny"] * g["cell_m"]
+    xs = np.array([minx, maxx, maxx, minx])
+    ys = np.array([maxy, maxy, miny, miny])
+    lon, lat = tf_inv.transform(xs, ys)
+    return [[float(a), float(b)] for a, b in zip(lon, lat)]
+
+
+def _colormap() -> np.ndarray:
+    # 透明 → 黄 → 橙 → 赤 の 256 段 RGBA
+    t = np.linspace(0.0, 1.0, 256)
+    r = np.full(256, 255.0)
+    g = np.clip(255 * (1.0 - t) + 40 * t, 0, 255)
+    b = np.clip(120 * (1.0 - t * 2), 0, 255)
+    a = np.clip(60 + 195 * t, 0, 255)
+    lut = np.stack([r, g, b, a], axis=1).astype(np.uint8)
+    lut[0] = (0, 0, 0, 0)
+    return lut
+
+
+_LUT = _colormap()
+
+
+def render_png(grid: np.ndarray) -> bytes:
+    """件数/密度グリッドを PNG（RGBA、北が上）にする。値は最大値で正規化"""
+    from PIL import Image
+
+    vmax = float(grid.max()) if grid.size else 0.0
+    if vmax > 0:
+        idx = np.clip(np.ceil(grid / vmax * 255), 0, 255).astype(np.uint8)
+    else:
+        idx = np.zeros(grid.shape, dtype=np.uint8)
+    rgba = _LUT[idx[::-1, :]]  # 行0 を北端に
+    buf = BytesIO()
+    Image.fromarray(rgba).save(buf, format="PNG", optimize=False)
+    return buf.getvalue()
@@ -0,0 +1,473 @@
+# backend/app/services/importer/legacy.py
+# 過去データ（Shapefile zip / GeoJSON / GPX）の一括取り込み。
+# - 読み込みはジェネレータで逐次（pyshp の iterShapeRecords、GPX は iterparse）
+# - 座標変換はバッチ単位で配列にまとめて1回
+# - DB 書き込みは Postgres なら COPY、それ以外は executemany
+# - 時刻は記録 API と同じ naive UTC で保存（タイムゾーン無しの値は現地時刻 JST とみなす。services/timestamps.py）
+from __future__ import annotations
+from datetime import datetime, date as Date, time as Time
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional
+import json
+import math
+import tempfile
+import xml.etree.ElementTree as ET
+import zipfile
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.models.observation import Observation
+from app.models.flightline import FlightLine
+from app.models.observation_point import ObservationPoint
+from app.models.observation_polygon import ObservationPolygon
+from app.services.archive import SurveyArchived, is_archived, lock_survey
+from app.services.crs.registry import get_transformer
+from app.services.revision import bump_revision
+from app.services.timestamps import JST, to_storage
+
+BEHAVIORS = ("flight", "circle", "rest")
+DEFAULT_BATCH = 2000
+
+# 属性名の対応（export_grouped_shapefiles の短縮名と list_features の名前の両方を受ける）
+_FIELD_ALIASES = {
+    "species": ("species", "種名", "spp"),
+    "count": ("count", "個体数", "n"),
+    "behavior": ("behavior", "behav", "行動"),
+    "individual_id": ("individual_id", "indiv", "個体ID"),
+    "started_at": ("started_at", "started", "start", "time"),
+    "ended_at": ("ended_at", "ended", "end"),
+    "notes": ("notes", "note", "備考", "desc", "name"),
+}
+
+
+# --- 読み込み（各 reader は (geometry, properties, src_epsg) を返す） ----------
+
+def _split_multi(geom: dict) -> Iterator[dict]:
+    """Multi* / GeometryCollection を単一形状に分解。Polygon は外輪のみ"""
+    t = geom.get("type")
+    coords = geom.get("coordinates")
+    if t in ("Point", "LineString"):
+        yield {"type": t, "coordinates": coords}
+    elif t == "Polygon":
+        if coords:
+            yield {"type": "Polygon", "coordinates": [coords[0]]}
+    elif t == "MultiPoint":
+        for c in coords or []:
+            yield {"type": "Point", "coordinates": c}
+    elif t == "MultiLineString":
+        for c in coords or []:
+            yield {"type": "LineString", "coordinates": c}
+    elif t == "MultiPolygon":
+        for c in coords or []:
+            if c:
+                yield {"type": "Polygon", "coordinates": [c[0]]}
+    elif t == "GeometryCollection":
+        for g in geom.get("geometries") or []:
+            yield from _split_multi(g)
+
+
+def _epsg_from_prj(prj_path: Path) -> Optional[int]:
+    if not prj_path.exists():
+        return None
+    try:
+        from pyproj import CRS
+        return CRS.from_wkt(prj_path.read_text(errors="ignore")).to_epsg(min_confidence=70)
+    except Exception:
+        return None
+
+
+def iter_shapefile_zip(fileobj: IO[bytes], encoding: str = "CP932", source_epsg: Optional[int] = None):
+    """zip 内のすべての .shp を順に読む（.prj があれば座標系を判定）"""
+    import shapefile  # pyshp
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with zipfile.ZipFile(fileobj) as zf:
+            zf.extractall(tmpdir)
+        for shp_path in sorted(Path(tmpdir).rglob("*.shp")):
+            epsg = source_epsg or _epsg_from_prj(shp_path.with_suffix(".prj")) or 4326
+            cpg = shp_path.with_suffix(".cpg")
+            enc = cpg.read_text().strip() if cpg.exists() else encoding
+            with shapefile.Reader(str(shp_path), encoding=enc, encodingErrors="replace") as r:
+                names = [f[0] for f in r.fields[1:]]
+                for sr in r.iterShapeRecords():
+                    if sr.shape.shapeType == shapefile.NULL:
+                        continue
+                    props = dict(zip(names, sr.record))
+                    props.setdefault("_layer", shp_path.stem)
+                    shp = sr.shape
+                    if shp.points and not shp.parts and shp.shapeType != shapefile.POINT:
+                        # parts 未設定で書かれた旧エクスポート（全頂点を1パートとみなす）
+                        shp.parts = [0]
+                    for g in _split_multi(shp.__geo_interface__):
+                        yield g, props, epsg
+
+
+def iter_geojson(fileobj: IO[bytes], source_epsg: Optional[int] = None):
+    """FeatureCollection / Feature / 単独 Geometry"""
+    doc = json.load(fileobj)
+    epsg = source_epsg or 4326
+    if doc.get("type") == "FeatureCollection":
+        feats = doc.get("features") or []
+    elif doc.get("type") == "Feature":
+        feats = [doc]
+    else:
+        feats = [{"type": "Feature", "geometry": doc, "properties": {}}]
+    for f in feats:
+        if not f.get("geometry"):
+            continue
+        for g in _split_multi(f["geometry"]):
+            yield g, dict(f.get("properties") or {}), epsg
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def iter_gpx(fileobj: IO[bytes]):
+    """
+    GPX を iterparse で逐次読む（処理済みの要素は clear してメモリを抑える）。
+    - wpt → Point（time を開始/終了時刻に）
+    - trkseg / rte → LineString（点の time の最小/最大を開始/終了時刻に、trk/rte の name を備考に）
+    """
+    stack: list[str] = []
+    root = None
+    name: Optional[str] = None
+    pts: list[list[float]] = []
+    times: list[str] = []
+    for event, elem in ET.iterparse(fileobj, events=("start", "end")):
+        tag = _local(elem.tag)
+        if event == "start":
+            if root is None:
+                root = elem
+            stack.append(tag)
+            if tag in ("trk", "rte"):
+                name = None
+            if tag in ("trkseg", "rte"):
+                pts, times = [], []
+            continue
+
+        stack.pop()
+        parent = stack[-1] if stack else None
+        if tag in ("trkpt", "rtept", "wpt"):
+            try:
+                lon, lat = float(elem.get("lon")), float(elem.get("lat"))
+            except (TypeError, ValueError):
+                elem.clear()
+                continue
+            t = None
+            nm = None
+            for child in elem:
+                ctag = _local(child.tag)
+                if ctag == "time":
+                    t = (child.text or "").strip() or None
+                elif ctag == "name":
+                    nm = (child.text or "").strip()
+            if tag == "wpt":
+                props = {"started_at": t, "ended_at": t, "notes": nm or ""}
+                yield {"type": "Point", "coordinates": [lon, lat]}, props, 4326
+            else:
+                pts.append([lon, lat])
+                if t:
+                    times.append(t)
+            elem.clear()
+        elif tag == "name" and parent in ("trk", "rte"):
+            name = (elem.text or "").strip() or None
+        elif tag in ("trkseg", "rte"):
+            if len(pts) >= 2:
+                props = {
+                    "started_at": min(times) if times else None,
+                    "ended_at": max(times) if times else None,
+                    "notes": name or "",
+                }
+                yield {"type": "LineString", "coordinates": pts}, props, 4326
+            pts, times = [], []
+            elem.clear()
+        if parent == "gpx" and root is not None:
+            # トップレベル要素（trk / rte / wpt）を処理し終えたら捨てる
+            root.clear()
+
+
+def detect_format(filename: str) -> str:
+    suffix = Path(filename or "").suffix.lower()
+    if suffix == ".zip":
+        return "shapefile"
+    if suffix in (".geojson", ".json"):
+        return "geojson"
+    if suffix == ".gpx":
+        return "gpx"
+    raise ValueError(f"unsupported file type: {filename}")
+
+
+def iter_source(fileobj: IO[bytes], fmt: str, encoding: str = "CP932", source_epsg: Optional[int] = None):
+    if fmt == "shapefile":
+        return iter_shapefile_zip(fileobj, encoding, source_epsg)
+    if fmt == "geojson":
+        return iter_geojson(fileobj, source_epsg)
+    if fmt == "gpx":
+        return iter_gpx(fileobj)
+    raise ValueError(f"unsupported format: {fmt}")
+
+
+# --- 座標変換（バッチ） --------------------------------------------------------
+
+def _flatten(geom: dict) -> list:
+    t = geom["type"]
+    c = geom["coordinates"]
+    if t == "Point":
+        return [c]
+    if t == "LineString":
+        return c
+    return c[0]  # Polygon 外輪
+
+
+def _clean(geom: dict) -> dict:
+    """頂点を有限の float 2次元に揃えた形状。数値でない・頂点数が足りない場合は ValueError"""
+    coords = []
+    for c in _flatten(geom):
+        x, y = float(c[0]), float(c[1])
+        if not (math.isfinite(x) and math.isfinite(y)):
+            raise ValueError("non-finite coordinate")
+        coords.append([x, y])
+    if len(coords) < {"Point": 1, "LineString": 2, "Polygon": 3}[geom["type"]]:
+        raise ValueError("too few vertices")
+    return _rebuild(geom, coords)
+
+
+def _rebuild(geom: dict, coords: list) -> dict:
+    t = geom["type"]
+    if t == "Point":
+        return {"type": "Point", "coordinates": coords[0]}
+    if t == "LineString":
+        return {"type": "LineString", "coordinates": coords}
+    return {"type": "Polygon", "coordinates": [coords]}
+
+
+def reproject_batch(items: list[tuple[dict, dict, int]]) -> list[tuple[dict, dict]]:
+    """
+    同じ座標系の形状の頂点をまとめて1回で EPSG:4326 に変換する（_clean 済みの形状を渡す）。
+    変換できなかった（inf になった）形状は除く
+    """
+    out: list[Optional[tuple[dict, dict]]] = [None] * len(items)
+    by_epsg: dict[int, list[int]] = {}
+    for i, (_g, _p, epsg) in enumerate(items):
+        by_epsg.setdefault(epsg, []).append(i)
+
+    for epsg, idxs in by_epsg.items():
+        if epsg == 4326:
+            for i in idxs:
+                out[i] = (items[i][0], items[i][1])
+            continue
+        flats = [_flatten(items[i][0]) for i in idxs]
+        lengths = [len(f) for f in flats]
+        arr = np.asarray([c for f in flats for c in f], dtype=float)
+        tf = get_transformer(epsg, 4326)
+        xs, ys = tf.transform(arr[:, 0], arr[:, 1])
+        xy = np.column_stack((xs, ys)).round(8)
+        ok = np.isfinite(xy).all(axis=1)
+        xy_list = xy.tolist()
+        pos = 0
+        for i, n in zip(idxs, lengths):
+            if ok[pos:pos + n].all():
+                out[i] = (_rebuild(items[i][0], xy_list[pos:pos + n]), items[i][1])
+            pos += n
+    return [o for o in out if o is not None]
+
+
+# --- 属性の対応付け ------------------------------------------------------------
+
+def _pick(props: dict, key: str):
+    for alias in _FIELD_ALIASES[key]:
+        v = props.get(alias)
+        if v not in (None, ""):
+            return v
+    return None
+
+
+def _parse_dt(value, fallback_date: Date) -> Optional[datetime]:
+    """属性の時刻 → 保存用の naive UTC（タイムゾーン付きは UTC に変換、無しは JST とみなす）"""
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, Date):
+        dt = datetime.combine(value, Time())
+    else:
+        s = str(value).strip().replace("Z", "+00:00")
+        try:
+            dt = datetime.fromisoformat(s)
+        except ValueError:
+            try:
+                # 時刻のみ（"10:21" 等）は調査日に付与
+                dt = datetime.combine(fallback_date, Time.fromisoformat(s))
+            except ValueError:
+                return None
+    return to_storage(dt, JST)
+
+
+def map_observation(
+    props: dict,
+    survey_id: int,
+    survey_date: Date,
+    default_species: str,
+    default_behavior: str,
+) -> dict:
+    """読み込んだ属性 → observations の列"""
+    started = _parse_dt(_pick(props, "started_at"), survey_date) or to_storage(datetime.combine(survey_date, Time()), JST)
+    ended = _parse_dt(_pick(props, "ended_at"), survey_date) or started
+    if ended < started:
+        ended = started
+    behavior = str(_pick(props, "behavior") or default_behavior)
+    if behavior not in BEHAVIORS:
+        behavior = default_behavior
+    try:
+        count = int(float(_pick(props, "count") or 1))
+    except (TypeError, ValueError):
+        count = 1
+    indiv = _pick(props, "individual_id")
+    return {
+        "survey_id": survey_id,
+        "individual_id": str(indiv) if indiv is not None else None,
+        "species": str(_pick(props, "species") or default_species),
+        "count": count,
+        "behavior": behavior,
+        "started_at": started,
+        "ended_at": ended,
+        "notes": str(_pick(props, "notes") or ""),
+    }
+
+
+# --- 書き込み ------------------------------------------------------------------
+
+_GEOM_MODELS = {
+    "Point": ObservationPoint,
+    "LineString": FlightLine,
+    "Polygon": ObservationPolygon,
+}
+
+
+def _copy_rows(cur, table: str, columns: list[str], rows: Iterable[tuple]) -> None:
+    with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as cp:
+        for row in rows:
+            cp.write_row(row)
+
+
+def _load_batch_postgres(db: Session, obs_rows: list[dict], geoms: list[dict]) -> None:
+    # 観察 ID を先に採番してから COPY（RETURNING が使えないため）
+    raw = db.connection().connection.driver_connection
+    with raw.cursor() as cur:
+        cur.execute(
+            "SELECT nextval(pg_get_serial_sequence('observations', 'id')) FROM generate_series(1, %s)",
+            (len(obs_rows),),
+        )
+        ids = [r[0] for r in cur.fetchall()]
+        obs_cols = ["id", "survey_id", "individual_id", "species", "count", "behavior", "started_at", "ended_at", "notes"]
+        _copy_rows(cur, "observations", obs_cols,
+                   ((oid, *(o[c] for c in obs_cols[1:])) for oid, o in zip(ids, obs_rows)))
+        for gtype, model in _GEOM_MODELS.items():
+            rows = [(oid, json.dumps(g, ensure_ascii=False)) for oid, g in zip(ids, geoms) if g["type"] == gtype]
+            if not rows:
+                continue
+            cols = ["observation_id", "geometry"]
+            if gtype == "LineString":
+                cols.append("length_m")
+                rows = [(a, b, 0.0) for a, b in rows]
+            _copy_rows(cur, model.__tablename__, cols, rows)
+
+
+def _load_batch_generic(db: Session, obs_rows: list[dict], geoms: list[dict]) -> None:
+    ids = db.execute(
+        insert(Observation).returning(Observation.id, sort_by_parameter_order=True),
+        obs_rows,
+    ).scalars().all()
+    for gtype, model in _GEOM_MODELS.items():
+        rows = [
+            {"observation_id": oid, "geometry": json.dumps(g, ensure_ascii=False)}
+            for oid, g in zip(ids, geoms) if g["type"] == gtype
+        ]
+        if gtype == "LineString":
+            for r in rows:
+                r["length_m"] = 0.0
+        if rows:
+            db.execute(insert(model), rows)
+
+
+def _archived_message(stats: dict) -> str:
+    return f"survey is archived ({stats['observations']} observations were imported before it)"
+
+
+def import_features(
+    db: Session,
+    survey_id: int,
+    survey_date: Date,
+    source: Iterable[tuple[dict, dict, int]],
+    default_species: str = "unknown",
+    default_behavior: str = "flight",
+    batch_size: int = DEFAULT_BATCH,
+) -> dict:
+    """
+    source（reader の出力）を batch_size 件ずつ変換・書き込みしてコミットする。
+    座標が壊れている（数値でない・頂点不足・変換不能）形状は飛ばして skipped に数える。
+    バッチごとに調査行をロックして確認し、途中でアーカイブされたらそのバッチを捨てて
+    SurveyArchived（調査が消えていたら LookupError）で止める。
+    途中で失敗した場合、それまでのバッチは取り込み済みになる。
+    """
+    use_copy = db.get_bind().dialect.name == "postgresql"
+    stats = {"observations": 0, "Point": 0, "LineString": 0, "Polygon": 0, "skipped": 0}
+
+    def flush(batch: list[tuple[dict, dict, int]]):
+        valid = []
+        for g, p, epsg in batch:
+            try:
+                if g["type"] not in _GEOM_MODELS:
+                    raise ValueError
+                g = _clean(g)
+            except Exception:
+                stats["skipped"] += 1
+                continue
+            valid.append((g, p, epsg))
+        projected = reproject_batch(valid) if valid else []
+        stats["skipped"] += len(valid) - len(projected)
+        if not projected:
+            return
+        obs_rows = [map_observation(p, survey_id, survey_date, default_species, default_behavior) for _g, p in projected]
+        geoms = [g for g, _p in projected]
+        # 調査行をロックしてから確認する（確認〜commit の間にアーカイブされて行が消えるのを防ぐ）
+        survey = lock_survey(db, survey_id)
+        if survey is None:
+            db.rollback()
+            raise LookupError("survey not found")
+        if survey.archived_at is not None:
+            db.rollback()
+            raise SurveyArchived(_archived_message(stats))
+        if use_copy:
+            _load_batch_postgres(db, obs_rows, geoms)
+        else:
+            _load_batch_generic(db, obs_rows, geoms)
+        # 行ロックの無い SQLite 向けに、書き込みロックを得た後で同じトランザクション内でもう一度確認する
+        if is_archived(db, survey_id):
+            db.rollback()
+            raise SurveyArchived(_archived_message(stats))
+        bump_revision(db, survey_id)
+        db.commit()
+        stats["observations"] += len(obs_rows)
+        for g in geoms:
+            stats[g["type"]] += 1
+
+    batch: list[tuple[dict, dict, int]] = []
+    for item in source:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    return {
+        "observations": stats["observations"],
+        "points": stats["Point"],
+        "lines": stats["LineString"],
+        "polygons": stats["Polygon"],
+        "skipped": stats["skipped"],
+    }
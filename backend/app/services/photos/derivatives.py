@@ -0,0 +1,85 @@
+# backend/app/services/photos/derivatives.py
+# 写真の縮小版（地図のサムネイル・プレビュー・報告書用）
+# - 初回要求時に生成し data/derivatives/<sha256>_<size>.jpg に置く（内容ハッシュ名なので不変）
+# - JPEG は draft で DCT 段階から縮小デコードしてから仕上げの縮小をする
+# - 生成はスレッドプールで行い、同じ縮小版への同時要求は1回の生成を共有する
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock, RLock
+import os
+
+from PIL import Image, ImageOps
+
+from app.db import data_dir
+
+# 長辺のピクセル数
+SIZES = {
+    "thumb": 256,
+    "preview": 1024,
+    "report": 1600,  # 報告書の写真幅 135mm @ 300dpi 程度
+}
+JPEG_QUALITY = {"thumb": 80, "preview": 85, "report": 90}
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = Lock()
+_inflight: dict[Path, Future] = {}
+_inflight_lock = RLock()  # 完了済み Future の add_done_callback は即時に呼ばれるため
+
+
+def derivative_dir() -> Path:
+    d = data_dir() / "derivatives"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def derivative_path(content_hash: str, size: str) -> Path:
+    return derivative_dir() / f"{content_hash}_{size}.jpg"
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    # Pillow のデコード・縮小は GIL を離すのでスレッドで並列に動く
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=int(os.getenv("RAPTOR_DERIVATIVE_WORKERS", str(min(4, os.cpu_count() or 1)))),
+                thread_name_prefix="derivative",
+            )
+        return _pool
+
+
+def render_derivative(src: Path, out: Path, size: str) -> Path:
+    edge = SIZES[size]
+    with Image.open(src) as img:
+        # 要求サイズ以上を保つ最小の 1/2^n でデコード（JPEG 以外は何もしない）
+        img.draft("RGB", (edge, edge))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        tmp = out.with_name(f"{out.name}.{os.getpid()}.tmp")
+        img.save(tmp, "JPEG", quality=JPEG_QUALITY[size], optimize=True, progressive=size != "thumb")
+    os.replace(tmp, out)
+    return out
+
+
+def get_derivative(src: Path, content_hash: str, size: str) -> Path:
+    """縮小版のパス（無ければ生成して待つ）。size は SIZES のキー"""
+    if size not in SIZES:
+        raise ValueError(f"unknown size: {size}")
+    out = derivative_path(content_hash, size)
+    if out.exists():
+        return out
+    with _inflight_lock:
+        fut = _inflight.get(out)
+        if fut is None:
+            fut = _get_pool().submit(render_derivative, src, out, size)
+            _inflight[out] = fut
+            fut.add_done_callback(lambda _f, key=out: _forget(key))
+    return fut.result()
+
+
+def _forget(key: Path) -> None:
+    with _inflight_lock:
+        _inflight.pop(key, None)
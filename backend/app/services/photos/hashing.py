@@ -0,0 +1,96 @@
+# backend/app/services/photos/hashing.py
+# 写真の同一性判定
+# - content_hash: ファイル内容の sha256（完全一致の重複検出・保存名）
+# - phash: 縮小デコード（Pillow draft）した画像の dHash 64bit（連写のほぼ同一フレーム検出）
+from __future__ import annotations
+from io import BytesIO
+import hashlib
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8  # 8x8 = 64bit
+_U64_SIGN = 1 << 63
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def dhash(data: bytes) -> int:
+    """
+    difference hash（横方向の隣接画素の大小 64bit、符号なし）。
+    JPEG は draft で DCT 段階から縮小してデコードするため、原寸を展開しない。
+    """
+    with Image.open(BytesIO(data)) as img:
+        img.draft("L", (HASH_SIZE * 16, HASH_SIZE * 16))
+        small = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+        px = np.asarray(small, dtype=np.int16)
+    bits = (px[:, 1:] > px[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+# DB は符号付き 64bit 整数で持つ
+def to_db(h: int) -> int:
+    return h - (1 << 64) if h >= _U64_SIGN else h
+
+
+def from_db(v: int) -> int:
+    return v + (1 << 64) if v < 0 else v
+
+
+if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+    def _popcount(x: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(x)
+else:  # pragma: no cover
+    _POP8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(x: np.ndarray) -> np.ndarray:
+        return _POP8[x.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+class PhashIndex:
+    """
+    uint64 配列に詰めた phash をまとめて XOR → popcount してハミング距離で探す。
+    調査あたり数万枚程度なら BK-tree より単純な全件ベクトル演算の方が速い。
+    """
+
+    def __init__(self, ids: list[int], hashes: list[int], times: list[float | None] | None = None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.hashes = np.asarray([to_db(h) for h in hashes], dtype=np.int64).view(np.uint64)
+        # 撮影時刻（epoch 秒、無ければ NaN）
+        self.times = np.asarray(
+            [np.nan if t is None else t for t in (times or [None] * len(ids))], dtype=float
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, photo_id: int, h: int, t: float | None = None) -> None:
+        self.ids = np.append(self.ids, np.int64(photo_id))
+        self.hashes = np.append(self.hashes, np.int64(to_db(h)).view(np.uint64))
+        self.times = np.append(self.times, np.nan if t is None else t)
+
+    def distances(self, h: int) -> np.ndarray:
+        return _popcount(self.hashes ^ np.uint64(h)).astype(np.int64)
+
+    def search(
+        self,
+        h: int,
+        max_distance: int,
+        t: float | None = None,
+        window_s: float | None = None,
+    ) -> list[tuple[int, int]]:
+        """
+        [(photo_id, distance)] を距離の昇順で返す。
+        t と window_s を渡すと撮影時刻が ±window_s 以内のもの（時刻不明は除外しない）に限る。
+        """
+        if not len(self.ids):
+            return []
+        d = self.distances(h)
+        mask = d <= max_distance
+        if t is not None and window_s is not None:
+            mask &= np.isnan(self.times) | (np.abs(self.times - t) <= window_s)
+        idx = np.flatnonzero(mask)
+        idx = idx[np.argsort(d[idx], kind="stable")]
+        return [(int(self.ids[i]), int(d[i])) for i in idx]
@@ -0,0 +1,229 @@
+# backend/app/services/photos/store.py
+# 写真の取り込み（保存・EXIF・ハッシュ）と連写グループ化、観察への紐づけ
+# - 保存先: data/photos/<survey_id>/<sha256><拡張子>（Photo.file_path は data からの相対パス）
+# - 連写: phash のハミング距離が BURST_MAX_DISTANCE 以下、かつ撮影時刻が BURST_WINDOW_S 秒以内の
+#   写真と同じグループにする（先に取り込まれた1枚が代表）
+# - 撮影日時は EXIF（カメラの現地時刻、既定 JST）を観察と同じ naive UTC に直して保存する
+from __future__ import annotations
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+import json
+import os
+
+from PIL import Image, UnidentifiedImageError
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from app.db import data_dir
+from app.models.photo import Photo
+from app.models.photolink import PhotoLink
+from app.services.exif.reader import parse_exif, taken_at_from_exif
+from app.services.features import geometry_bounds, iter_feature_rows
+from app.services.linking.assign import score_photo_to_obs
+from app.services.photos.hashing import PhashIndex, content_hash, dhash, from_db, to_db
+from app.services.timestamps import JST, to_storage
+
+BURST_MAX_DISTANCE = 10
+BURST_WINDOW_S = 10.0
+
+_EXTS = {"JPEG": ".jpg", "PNG": ".png", "TIFF": ".tif", "WEBP": ".webp", "MPO": ".jpg"}
+
+
+def photo_dir(survey_id: int) -> Path:
+    return data_dir() / "photos" / str(survey_id)
+
+
+def photo_abspath(photo: Photo) -> Path:
+    # 旧データは絶対パスのことがある（その場合はそのまま）
+    return data_dir() / photo.file_path
+
+
+def _epoch(t: datetime | None) -> float | None:
+    return t.timestamp() if t is not None else None
+
+
+class SurveyPhotoIndex:
+    """調査内の写真の phash 索引と代表写真の対応（取り込み1回分の間だけ使う）"""
+
+    def __init__(self, db: Session, survey_id: int):
+        rows = (
+            db.query(Photo.id, Photo.phash, Photo.taken_at, Photo.burst_of)
+            .filter(Photo.survey_id == survey_id, Photo.phash.isnot(None))
+            .order_by(Photo.id)
+            .all()
+        )
+        self.index = PhashIndex(
+            [r.id for r in rows], [from_db(r.phash) for r in rows], [_epoch(r.taken_at) for r in rows]
+        )
+        self.rep_of = {r.id: (r.burst_of or r.id) for r in rows}
+
+    def find_burst(self, h: int, taken_at: datetime | None,
+                   max_distance: int = BURST_MAX_DISTANCE, window_s: float = BURST_WINDOW_S) -> int | None:
+        """一致する連写グループの代表 id（無ければ None）"""
+        hits = self.index.search(h, max_distance, _epoch(taken_at), window_s)
+        return self.rep_of[hits[0][0]] if hits else None
+
+    def add(self, photo_id: int, h: int, taken_at: datetime | None, rep: int | None) -> None:
+        self.index.add(photo_id, h, _epoch(taken_at))
+        self.rep_of[photo_id] = rep or photo_id
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def ingest_photo(
+    db: Session,
+    survey_id: int,
+    data: bytes,
+    index: SurveyPhotoIndex,
+    skip_duplicates: bool = True,
+) -> dict:
+    """
+    写真1枚を取り込む（コミットは呼び出し側）。
+    画像として読めなければ ValueError。skip_duplicates なら内容が同一の既存写真を返して保存しない。
+    """
+    sha = content_hash(data)
+    if skip_duplicates:
+        dup = db.query(Photo.id).filter(Photo.survey_id == survey_id, Photo.content_hash == sha).first()
+        if dup is not None:
+            return {"photo_id": dup.id, "stored": False, "duplicate_of": dup.id}
+
+    try:
+        h = dhash(data)
+        with Image.open(BytesIO(data)) as img:
+            ext = _EXTS.get(img.format or "", ".img")
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"not an image: {e}")
+
+    path = photo_dir(survey_id) / f"{sha}{ext}"
+    if not path.exists():
+        _write_atomic(path, data)
+
+    try:
+        meta = parse_exif(str(path))
+    except Exception:
+        # EXIF が壊れている / 無い形式
+        meta = {"taken_at": None, "gps_point": None, "exif_raw": None}
+    taken_at = taken_at_from_exif(meta.get("exif_raw"))
+    if taken_at is None and meta.get("taken_at"):
+        taken_at = to_storage(datetime.fromisoformat(meta["taken_at"]), JST)
+
+    rep = index.find_burst(h, taken_at)
+    photo = Photo(
+        survey_id=survey_id,
+        file_path=str(path.relative_to(data_dir())),
+        taken_at=taken_at,
+        gps_point=meta.get("gps_point"),
+        exif_raw=meta.get("exif_raw"),
+        content_hash=sha,
+        phash=to_db(h),
+        burst_of=rep,
+    )
+    db.add(photo)
+    db.flush()
+    index.add(photo.id, h, taken_at, rep)
+    return {"photo_id": photo.id, "stored": True, "burst_of": rep}
+
+
+def regroup_bursts(
+    db: Session,
+    survey_id: int,
+    max_distance: int = BURST_MAX_DISTANCE,
+    window_s: float = BURST_WINDOW_S,
+) -> dict:
+    """
+    調査の全写真を撮影時刻順に並べ直して連写グループを作り直す（phash が無い写真はここで計算）。
+    撮影日時は exif_raw から UTC で求め直す（EXIF の現地時刻のまま保存していた旧データもここで直る）。
+    コミットまで行う。
+    """
+    photos = db.query(Photo).filter(Photo.survey_id == survey_id).all()
+    for p in photos:
+        taken_at = taken_at_from_exif(p.exif_raw)
+        if taken_at is not None:
+            p.taken_at = taken_at
+    photos.sort(key=lambda p: (p.taken_at is None, p.taken_at or datetime.min, p.id))
+    index = PhashIndex([], [])
+    rep_of: dict[int, int] = {}
+    unreadable = 0
+    for p in photos:
+        if p.phash is None:
+            try:
+                data = photo_abspath(p).read_bytes()
+                p.phash = to_db(dhash(data))
+                p.content_hash = p.content_hash or content_hash(data)
+            except (OSError, ValueError):
+                unreadable += 1
+                p.burst_of = None
+                continue
+        h = from_db(p.phash)
+        hits = index.search(h, max_distance, _epoch(p.taken_at), window_s)
+        rep = rep_of[hits[0][0]] if hits else None
+        p.burst_of = rep
+        rep_of[p.id] = rep or p.id
+        index.add(p.id, h, _epoch(p.taken_at))
+    db.commit()
+    return {
+        "photos": len(photos),
+        "bursts": sum(1 for p in photos if p.burst_of is None) - unreadable,
+        "unreadable": unreadable,
+    }
+
+
+def link_photos(db: Session, survey_id: int, min_score: float = 0.2) -> dict:
+    """
+    連写グループの代表写真だけを観察と照合し（score_photo_to_obs）、最良の観察へ紐づける。
+    同じグループの他の写真は代表と同じ観察・スコアで紐づける（is_representative は代表のみ True）。
+    既存の紐づけは作り直す。コミットまで行う。
+    """
+    # 観察ごとの代表点（全形状の外接矩形の中心）
+    obs_info: dict[int, tuple] = {}
+    obs_bounds: dict[int, list[float]] = {}
+    for _gtype, _table, _fid, geom_json, obs in iter_feature_rows(db, [survey_id]):
+        obs_info[obs.id] = (obs.started_at, obs.ended_at)
+        try:
+            b = geometry_bounds(json.loads(geom_json))
+        except Exception:
+            b = None
+        if b is None:
+            continue
+        cur = obs_bounds.get(obs.id)
+        obs_bounds[obs.id] = list(b) if cur is None else [
+            min(cur[0], b[0]), min(cur[1], b[1]), max(cur[2], b[2]), max(cur[3], b[3])
+        ]
+    obs_pt = {oid: ((b[0] + b[2]) / 2, (b[1] + b[3]) / 2) for oid, b in obs_bounds.items()}
+
+    photos = db.query(Photo).filter(Photo.survey_id == survey_id).all()
+    members: dict[int, list[Photo]] = {}
+    for p in photos:
+        if p.burst_of is not None:
+            members.setdefault(p.burst_of, []).append(p)
+
+    db.execute(delete(PhotoLink).where(PhotoLink.photo_id.in_([p.id for p in photos])))
+    links = []
+    scored = 0
+    for p in photos:
+        if p.burst_of is not None:
+            continue
+        scored += 1
+        gps = p.gps_point or {}
+        pt = (gps["lon"], gps["lat"]) if gps.get("lon") is not None and gps.get("lat") is not None else None
+        best = None
+        for oid, (start, end) in obs_info.items():
+            s = score_photo_to_obs(p.taken_at, pt, start, end, obs_pt.get(oid))
+            if best is None or s > best[1]:
+                best = (oid, s)
+        if best is None or best[1] < min_score:
+            continue
+        links.append(PhotoLink(photo_id=p.id, observation_id=best[0], link_score=best[1], is_representative=True))
+        for m in members.get(p.id, []):
+            links.append(PhotoLink(photo_id=m.id, observation_id=best[0], link_score=best[1],
+                                   is_representative=False))
+    db.add_all(links)
+    db.commit()
+    return {"photos": len(photos), "scored": scored, "links": len(links)}
+
@@ -0,0 +1,214 @@
+# backend/app/services/postgis.py
+# Postgres + PostGIS 環境でのみ有効になる空間処理の DB 側実行。
+# - 各形状テーブルに geom geometry(Geometry,4326) 列と GiST インデックスを追加し、
+#   既存の geometry（GeoJSON 文字列）からトリガで同期する（ORM モデルは変更しない）
+# - 絞り込み・ST_Transform・ST_AsGeoJSON / ST_AsMVT を SQL で行う
+# SQLite や PostGIS 拡張が無い Postgres では従来の Python 実装を使う。
+from __future__ import annotations
+from typing import Iterable, Optional
+import os
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+GEOM_TABLES = ("flightlines", "observation_points", "observation_polygons")
+
+_enabled = False
+
+
+def postgis_enabled() -> bool:
+    return _enabled
+
+
+_SYNC_FUNCTION = """
+CREATE OR REPLACE FUNCTION raptor_sync_geom() RETURNS trigger AS $$
+BEGIN
+    BEGIN
+        NEW.geom := ST_SetSRID(ST_GeomFromGeoJSON(NEW.geometry), 4326);
+    EXCEPTION WHEN OTHERS THEN
+        NEW.geom := NULL;
+    END;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def setup_postgis(engine: Engine) -> bool:
+    """
+    PostGIS が使えれば geom 列・トリガ・GiST を用意して有効化する（冪等）。
+    RAPTOR_POSTGIS=0 で明示的に無効化できる。
+    """
+    global _enabled
+    _enabled = False
+    if engine.dialect.name != "postgresql" or os.getenv("RAPTOR_POSTGIS", "1") == "0":
+        return False
+    try:
+        with engine.begin() as conn:
+            try:
+                with conn.begin_nested():
+                    conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS postgis")
+            except Exception:
+                # 権限が無い等。既に入っていれば続行
+                pass
+            installed = conn.exec_driver_sql("SELECT 1 FROM pg_extension WHERE extname = 'postgis'").first()
+            if not installed:
+                return False
+            conn.exec_driver_sql(_SYNC_FUNCTION)
+            for table in GEOM_TABLES:
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS geom geometry(Geometry, 4326)")
+                conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_sync_geom ON {table}")
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER {table}_sync_geom BEFORE INSERT OR UPDATE OF geometry ON {table} "
+                    f"FOR EACH ROW EXECUTE FUNCTION raptor_sync_geom()"
+                )
+                # 既存行の埋め戻し（トリガ経由）
+                conn.exec_driver_sql(f"UPDATE {table} SET geometry = geometry WHERE geom IS NULL")
+                conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{table}_geom ON {table} USING GIST (geom)")
+                conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{table}_observation_id ON {table} (observation_id)")
+            conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_observations_survey_id ON observations (survey_id)")
+    except Exception:
+        return False
+    _enabled = True
+    return True
+
+
+def detect_postgis(engine: Engine) -> bool:
+    """setup_postgis を流さない起動（RAPTOR_INIT_DB=0）用。geom 列が揃っていれば有効化する"""
+    global _enabled
+    _enabled = False
+    if engine.dialect.name != "postgresql" or os.getenv("RAPTOR_POSTGIS", "1") == "0":
+        return False
+    try:
+        with engine.connect() as conn:
+            n = conn.execute(text(
+                "SELECT count(*) FROM information_schema.columns "
+                "WHERE column_name = 'geom' AND table_name IN :tables"
+            ).bindparams(bindparam("tables", expanding=True)), {"tables": list(GEOM_TABLES)}).scalar_one()
+    except Exception:
+        return False
+    _enabled = n == len(GEOM_TABLES)
+    return _enabled
+
+
+# --- クエリ ----------------------------------------------------------------------
+
+def _feature_union(where: str, geom_expr: str = "g.geom", extra_join: str = "") -> str:
+    """3つの形状テーブルを観察と結合して縦に連結する SELECT"""
+    parts = []
+    for order, (gtype, table) in enumerate(
+        (("LineString", "flightlines"), ("Point", "observation_points"), ("Polygon", "observation_polygons"))
+    ):
+        parts.append(
+            f"SELECT {order} AS ord, '{gtype}' AS gtype, '{table}' AS feature_table, g.id AS feature_id, "
+            f"{geom_expr} AS geom, o.id AS observation_id, o.survey_id, o.individual_id, o.species, o.count, "
+            f"o.behavior, o.started_at, o.ended_at, o.notes "
+            f"FROM {table} g JOIN observations o ON o.id = g.observation_id {extra_join} "
+            f"WHERE g.geom IS NOT NULL {where}"
+        )
+    return " UNION ALL ".join(parts)
+
+
+def _filters(survey_id: Optional[int], bbox: Optional[tuple[float, float, float, float]]) -> tuple[str, dict]:
+    where = ""
+    params: dict = {}
+    if survey_id is not None:
+        where += " AND o.survey_id = :survey_id"
+        params["survey_id"] = survey_id
+    else:
+        # 全調査の一覧にはアーカイブ中・復元中の調査を含めない（features.iter_feature_rows と同じ）
+        where += " AND o.survey_id IN (SELECT id FROM surveys WHERE archived_at IS NULL)"
+    if bbox is not None:
+        where += " AND g.geom && ST_MakeEnvelope(:minx, :miny, :maxx, :maxy, 4326)"
+        params.update(minx=bbox[0], miny=bbox[1], maxx=bbox[2], maxy=bbox[3])
+    return where, params
+
+
+def feature_collection_json(
+    db: Session,
+    survey_id: Optional[int] = None,
+    bbox: Optional[tuple[float, float, float, float]] = None,
+) -> str:
+    """list_features と同じ形の FeatureCollection を DB 内で組み立てて JSON 文字列で返す"""
+    where, params = _filters(survey_id, bbox)
+    sql = f"""
+        SELECT json_build_object(
+            'type', 'FeatureCollection',
+            'features', COALESCE(json_agg(json_build_object(
+                'type', 'Feature',
+                'geometry', ST_AsGeoJSON(f.geom)::json,
+                'properties', json_build_object(
+                    'feature_table', f.feature_table,
+                    'feature_id', f.feature_id,
+                    'observation_id', f.observation_id,
+                    'survey_id', f.survey_id,
+                    'species', f.species,
+                    'count', f.count,
+                    'behavior', f.behavior,
+                    'started_at', f.started_at,
+                    'ended_at', f.ended_at,
+                    'notes', f.notes,
+                    'individual_id', COALESCE(f.individual_id, 'IND-' || f.observation_id)
+                )
+            ) ORDER BY f.ord, f.feature_id), '[]'::json)
+        )::text
+        FROM ({_feature_union(where)}) AS f
+    """
+    return db.execute(text(sql), params).scalar_one()
+
+
+def projected_feature_rows(db: Session, epsg_by_survey: dict[int, int]) -> Iterable:
+    """
+    調査ごとに指定した EPSG へ DB 側で変換した形状を返す（エクスポート用）。
+    行: (gtype, feature_id, geojson_text, observation_id, survey_id, individual_id, species, count,
+         behavior, started_at, ended_at, notes)
+    """
+    if not epsg_by_survey:
+        return []
+    values = ", ".join(f"({int(sid)}, {int(epsg)})" for sid, epsg in epsg_by_survey.items())
+    union = _feature_union(
+        "",
+        geom_expr="ST_Transform(g.geom, t.epsg)",
+        extra_join=f"JOIN (VALUES {values}) AS t(survey_id, epsg) ON t.survey_id = o.survey_id",
+    )
+    sql = f"""
+        SELECT f.gtype, f.feature_id, ST_AsGeoJSON(f.geom, 6), f.observation_id, f.survey_id, f.individual_id,
+               f.species, f.count, f.behavior, f.started_at, f.ended_at, f.notes
+        FROM ({union}) AS f
+        ORDER BY f.ord, f.feature_id
+    """
+    return db.execute(text(sql)).all()
+
+
+def survey_center(db: Session, survey_id: int) -> Optional[tuple[float, float]]:
+    """調査の全形状の外接矩形の中心（EPSG:4326）。形状が無ければ None"""
+    sql = f"""
+        SELECT ST_X(c), ST_Y(c) FROM (
+            SELECT ST_Centroid(ST_Extent(f.geom)::geometry) AS c
+            FROM ({_feature_union(" AND o.survey_id = :survey_id")}) AS f
+        ) AS e
+    """
+    row = db.execute(text(sql), {"survey_id": survey_id}).first()
+    if not row or row[0] is None:
+        return None
+    return float(row[0]), float(row[1])
+
+
+def mvt_tile(db: Session, z: int, x: int, y: int, survey_id: Optional[int] = None) -> bytes:
+    """Mapbox Vector Tile（レイヤ名 observations、EPSG:3857）"""
+    where, params = _filters(survey_id, None)
+    where += " AND g.geom && ST_Transform(ST_TileEnvelope(:z, :x, :y), 4326)"
+    params.update(z=z, x=x, y=y)
+    sql = f"""
+        SELECT ST_AsMVT(t, 'observations', 4096, 'mvtgeom') FROM (
+            SELECT ST_AsMVTGeom(ST_Transform(f.geom, 3857), ST_TileEnvelope(:z, :x, :y), 4096, 64, true) AS mvtgeom,
+                   f.feature_table, f.feature_id, f.observation_id, f.survey_id, f.species, f.count, f.behavior,
+                   f.started_at::text AS started_at, f.ended_at::text AS ended_at,
+                   COALESCE(f.individual_id, 'IND-' || f.observation_id) AS individual_id
+            FROM ({_feature_union(where)}) AS f
+        ) AS t
+        WHERE t.mvtgeom IS NOT NULL
+    """
+    data = db.execute(text(sql), params).scalar_one()
+    return bytes(data) if data is not None else b""
@@ -0,0 +1,233 @@
+# backend/app/services/query/index.py
+# 観察の時空間検索（POST /observations/query）用の調査ごとのインデックス。
+# - 形状: 調査の平面直角座標系（m）へ投影した shapely 形状の STRtree
+# - 時刻: 観察区間 [started_at, ended_at] を開始時刻で整列した配列（区間重複を searchsorted で絞る）
+# (survey_id, revision) をキーにプロセス内でキャッシュするので、書き込みで revision が進めば作り直される。
+# 時刻は保存値（naive UTC、services/timestamps.py）のまま UTC の epoch 秒で持つ。
+# 問い合わせのタイムゾーン無しの日時は UTC とみなし、毎日の時間帯だけ現地時刻（tz）で判定する。
+from __future__ import annotations
+from datetime import datetime, time, timezone, tzinfo
+from typing import Iterable, Optional
+import json
+
+import numpy as np
+import shapely
+from shapely import STRtree
+from shapely.geometry import shape
+from sqlalchemy.orm import Session
+
+from app.services.cache import RevisionCache
+from app.services.crs.registry import select_epsg, to_projected
+from app.services.features import iter_feature_rows, observation_properties
+from app.services.timestamps import JST
+
+_EPOCH = datetime(1970, 1, 1)
+_DAY = 86400.0
+
+# キー: (survey_id, revision)
+_cache = RevisionCache(maxsize=64)
+
+
+def to_epoch_s(value: datetime) -> float:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH).total_seconds()
+
+
+def _seconds_of_day(t: time) -> float:
+    return t.hour * 3600 + t.minute * 60 + t.second + t.microsecond / 1e6
+
+
+def _local_epsg(area_bbox, geoms: np.ndarray) -> int:
+    """平面直角座標系（形状全体の外接矩形の中心で選ぶ）。日本の範囲外なら中心の UTM 帯"""
+    center = None
+    if geoms.size:
+        minx, miny, maxx, maxy = shapely.total_bounds(geoms)
+        center = [(minx + maxx) / 2, (miny + maxy) / 2]
+    epsg = select_epsg(area_bbox, [{"coordinates": center}] if center else ())
+    if epsg is not None:
+        return epsg
+    if center is None:
+        return 3857
+    zone = min(60, max(1, int((center[0] + 180) // 6) + 1))
+    return (32600 if center[1] >= 0 else 32700) + zone
+
+
+def project(geoms, epsg: int):
+    """EPSG:4326 の shapely 形状（配列可）を epsg へ。全頂点を1回の transform で変換する"""
+    tf = to_projected(epsg)
+
+    def _tf(coords: np.ndarray) -> np.ndarray:
+        x, y = tf.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([x, y])
+
+    return shapely.transform(geoms, _tf)
+
+
+class SurveyIndex:
+    """1調査分の形状と観察区間。配列の添字が形状の番号"""
+
+    def __init__(self, survey_id: int, epsg: int, gtypes: list[str], geometry_json: list[str],
+                 properties: list[dict], geoms: np.ndarray, start: np.ndarray, end: np.ndarray):
+        self.survey_id = survey_id
+        self.epsg = epsg
+        self.gtypes = np.asarray(gtypes, dtype=object)
+        self.geometry_json = geometry_json  # 返却用（EPSG:4326。ヒットした分だけ json.loads する）
+        self.properties = properties
+        self.species = np.asarray([p["species"] for p in properties], dtype=object)
+        self.behavior = np.asarray([p["behavior"] for p in properties], dtype=object)
+        self.start = start
+        self.end = end
+        self.projected = project(geoms, epsg) if geoms.size else geoms
+        self.tree = STRtree(self.projected)
+        # 区間インデックス: 開始時刻で整列。重複判定の下限は「問い合わせ開始 - 最長区間」まで遡れば足りる
+        self.by_start = np.argsort(start, kind="stable")
+        self.sorted_start = start[self.by_start]
+        self.max_duration = float((end - start).max()) if start.size else 0.0
+
+    def __len__(self) -> int:
+        return len(self.geometry_json)
+
+    def overlapping(self, t0: Optional[float], t1: Optional[float]) -> np.ndarray:
+        """[t0, t1] と区間が重なる形状の番号（どちらかが None なら片側のみ）"""
+        lo = 0 if t0 is None else np.searchsorted(self.sorted_start, t0 - self.max_duration, side="left")
+        hi = len(self) if t1 is None else np.searchsorted(self.sorted_start, t1, side="right")
+        idx = self.by_start[lo:hi]
+        if t0 is not None:
+            idx = idx[self.end[idx] >= t0]
+        return idx
+
+    def within(self, geom, distance_m: float = 0.0) -> np.ndarray:
+        """投影済みの geom と交わる（distance_m > 0 なら距離 distance_m 以内の）形状の番号"""
+        if distance_m > 0:
+            return self.tree.query(geom, predicate="dwithin", distance=distance_m)
+        return self.tree.query(geom, predicate="intersects")
+
+
+def build_index(db: Session, survey_id: int, area_bbox=None) -> SurveyIndex:
+    gtypes, geometry_json, properties, start, end = [], [], [], [], []
+    for gtype, table, fid, geom_json, obs in iter_feature_rows(db, [survey_id]):
+        if obs.started_at is None:
+            continue
+        t0 = to_epoch_s(obs.started_at)
+        t1 = to_epoch_s(obs.ended_at) if obs.ended_at is not None else t0
+        gtypes.append(gtype)
+        geometry_json.append(geom_json)
+        properties.append({"feature_table": table, "feature_id": fid, **observation_properties(obs)})
+        start.append(t0)
+        end.append(max(t0, t1))
+    # GeoJSON の解析は GEOS 側でまとめて行う（壊れた形状は None）
+    geoms = shapely.from_geojson(np.asarray(geometry_json, dtype=object), on_invalid="ignore") \
+        if geometry_json else np.empty(0, dtype=object)
+    keep = np.flatnonzero(~shapely.is_missing(geoms) & ~shapely.is_empty(geoms))
+    geoms = geoms[keep]
+    return SurveyIndex(
+        survey_id,
+        _local_epsg(area_bbox, geoms),
+        [gtypes[i] for i in keep],
+        [geometry_json[i] for i in keep],
+        [properties[i] for i in keep],
+        geoms,
+        np.asarray(start, dtype=float)[keep],
+        np.asarray(end, dtype=float)[keep],
+    )
+
+
+def get_index(db: Session, survey_id: int, revision: int, area_bbox=None) -> SurveyIndex:
+    return _cache.get_or_compute((survey_id, revision), lambda: build_index(db, survey_id, area_bbox))
+
+
+def _utc_offsets(epoch_s: np.ndarray, tz: tzinfo) -> np.ndarray | float:
+    """各時刻での tz の UTC オフセット（秒）。固定オフセットならスカラー"""
+    fixed = tz.utcoffset(None)
+    if fixed is not None:
+        return fixed.total_seconds()
+    return np.asarray([
+        datetime.fromtimestamp(t, timezone.utc).astimezone(tz).utcoffset().total_seconds() for t in epoch_s
+    ], dtype=float)
+
+
+def _time_of_day_mask(ix: SurveyIndex, idx: np.ndarray, tod_from: time, tod_to: time,
+                      tz: tzinfo = JST) -> np.ndarray:
+    """
+    区間が tz の現地時刻での毎日の時間帯 [tod_from, tod_to] と重なるか。tod_from > tod_to なら日付をまたぐ時間帯。
+    区間の開始日を基準に前日・当日・翌日の時間帯と比べる（1日以上の区間は常に重なる）。
+    夏時間のある tz では区間開始時点のオフセットを区間全体に使う。
+    """
+    s = ix.start[idx]
+    dur = ix.end[idx] - s
+    s_tod = np.mod(s + _utc_offsets(s, tz), _DAY)
+    e_tod = s_tod + dur
+    w0 = _seconds_of_day(tod_from)
+    w1 = _seconds_of_day(tod_to)
+    if w1 < w0:
+        w1 += _DAY
+    hit = dur >= _DAY
+    for k in (-1, 0, 1):
+        hit |= (s_tod <= w1 + k * _DAY) & (e_tod >= w0 + k * _DAY)
+    return hit
+
+
+def parse_polygon(geojson: dict):
+    """問い合わせ用の多角形（EPSG:4326 の shapely 形状）。不正なら ValueError"""
+    if geojson.get("type") not in ("Polygon", "MultiPolygon"):
+        raise ValueError("polygon must be a GeoJSON Polygon or MultiPolygon")
+    try:
+        geom = shape(geojson)
+    except Exception as e:
+        raise ValueError(f"invalid polygon: {e}")
+    if geom.is_empty:
+        raise ValueError("polygon is empty")
+    return geom if geom.is_valid else shapely.make_valid(geom)
+
+
+def query_index(
+    ix: SurveyIndex,
+    near: Optional[tuple[float, float, float]] = None,
+    polygon=None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    time_of_day: Optional[tuple[time, time]] = None,
+    species: Optional[Iterable[str]] = None,
+    behavior: Optional[Iterable[str]] = None,
+    geom_types: Optional[Iterable[str]] = None,
+    tz: tzinfo = JST,
+) -> list[dict]:
+    """
+    条件をすべて満たす形状を GeoJSON Feature で返す。
+    - near: (lon, lat, radius_m)。properties.distance_m に点からの距離（m）を付ける
+    - polygon: parse_polygon の多角形（EPSG:4326）と交わる形状
+    - start / end: 観察区間 [started_at, ended_at] と重なる形状（タイムゾーン無しは UTC）
+    - time_of_day: (from, to) tz の現地時刻での毎日の時間帯と重なる形状
+    """
+    if not len(ix):
+        return []
+    # 時刻（区間インデックス）→ 空間（STRtree）→ 属性の順に絞る
+    t0 = to_epoch_s(start) if start is not None else None
+    t1 = to_epoch_s(end) if end is not None else None
+    idx = ix.overlapping(t0, t1) if (t0 is not None or t1 is not None) else np.arange(len(ix))
+
+    center = None
+    if near is not None:
+        center = project(shapely.points(near[0], near[1]), ix.epsg)
+        idx = np.intersect1d(idx, ix.within(center, near[2]), assume_unique=True)
+    if polygon is not None and idx.size:
+        idx = np.intersect1d(idx, ix.within(project(polygon, ix.epsg)), assume_unique=True)
+
+    if idx.size and species:
+        idx = idx[np.isin(ix.species[idx], list(species))]
+    if idx.size and behavior:
+        idx = idx[np.isin(ix.behavior[idx], list(behavior))]
+    if idx.size and geom_types:
+        idx = idx[np.isin(ix.gtypes[idx], list(geom_types))]
+    if idx.size and time_of_day is not None:
+        idx = idx[_time_of_day_mask(ix, idx, *time_of_day, tz)]
+
+    distances = shapely.distance(ix.projected[idx], center) if center is not None else None
+    feats = []
+    for n, i in enumerate(idx):
+        props = dict(ix.properties[i])
+        if distances is not None:
+            props["distance_m"] = round(float(distances[n]), 2)
+        feats.append({"type": "Feature", "geometry": json.loads(ix.geometry_json[i]), "properties": props})
+    return feats
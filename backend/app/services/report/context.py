@@ -0,0 +1,79 @@
+# backend/app/services/report/context.py
+# 報告書（render_report）に渡す context を調査の観察・写真から組み立てる。
+# 種ごとの代表写真は Photo のまま渡し、差し込み時に報告書サイズの縮小版へ置き換える（word.py）。
+# アーカイブ済みの調査はアーカイブファイルから読む（セッションに属さないモデルとして扱う）。
+from __future__ import annotations
+
+from sqlalchemy.orm import Session
+
+from app.models.survey import Survey
+from app.models.observation import Observation
+from app.models.photo import Photo
+from app.models.photolink import PhotoLink
+from app.services.archive import archived_tables
+from app.services.timestamps import to_local
+
+
+def _load(db: Session, survey: Survey) -> tuple[list[Observation], list[Photo], list[PhotoLink]]:
+    if survey.archived_at is not None:
+        tables = archived_tables(survey.id, survey.revision or 0)
+        return (
+            [Observation(**r) for r in tables["observations"]],
+            [Photo(**r) for r in tables["photos"]],
+            [PhotoLink(**r) for r in tables["photolinks"]],
+        )
+    obs = db.query(Observation).filter(Observation.survey_id == survey.id).all()
+    photos = db.query(Photo).filter(Photo.survey_id == survey.id).all()
+    links = (
+        db.query(PhotoLink)
+        .join(Observation, Observation.id == PhotoLink.observation_id)
+        .filter(Observation.survey_id == survey.id)
+        .all()
+    )
+    return obs, photos, links
+
+
+def representative_photos(obs: list[Observation], photos: list[Photo], links: list[PhotoLink]) -> dict[str, Photo]:
+    """
+    種ごとの代表写真。その種の観察に紐づく写真のうち、代表指定（is_representative）→ 紐づけスコアの順で選ぶ。
+    ファイルの無い（content_hash 未計算の）写真も返す（差し込み側で飛ばす）
+    """
+    species_by_obs = {o.id: o.species for o in obs}
+    photo_by_id = {p.id: p for p in photos}
+    best: dict[str, tuple[tuple, Photo]] = {}
+    for link in links:
+        species = species_by_obs.get(link.observation_id)
+        photo = photo_by_id.get(link.photo_id)
+        if species is None or photo is None:
+            continue
+        key = (bool(link.is_representative), link.link_score or 0.0, -photo.id)
+        if species not in best or key > best[species][0]:
+            best[species] = (key, photo)
+    return {species: photo for species, (_key, photo) in best.items()}
+
+
+def report_context(db: Session, survey: Survey) -> dict:
+    """render_report の context（時刻は現地時刻 JST）"""
+    obs, photos, links = _load(db, survey)
+    obs.sort(key=lambda o: (o.started_at, o.id))
+    rows = []
+    for o in obs:
+        started, ended = to_local(o.started_at), to_local(o.ended_at)
+        rows.append({
+            "species": o.species,
+            "count": o.count,
+            "behavior": o.behavior,
+            "individual_id": o.individual_id or "",
+            "started_at": started.strftime("%Y-%m-%d %H:%M"),
+            "ended_at": ended.strftime("%H:%M" if ended.date() == started.date() else "%Y-%m-%d %H:%M"),
+            "notes": o.notes or "",
+        })
+    rep = representative_photos(obs, photos, links)
+    species = list(dict.fromkeys(o.species for o in obs))
+    return {
+        "survey_name": survey.name,
+        "survey_date": survey.date.isoformat() if survey.date else "",
+        "observers": survey.observers or "",
+        "table_observations": rows,
+        "species_sections": [{"species": s, "rep_photo": rep.get(s)} for s in species],
+    }
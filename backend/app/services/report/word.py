@@ -3,18 +3,40 @@ from docxtpl import DocxTemplate, InlineImage
 from docx.shared import Mm
 from pathlib import Path
 
+from app.models.photo import Photo
+from app.services.photos.derivatives import get_derivative
+from app.services.photos.store import photo_abspath
+
+REPORT_PHOTO_WIDTH_MM = 135
+
+
+def photo_image(tpl: DocxTemplate, photo: Photo, width_mm: float = REPORT_PHOTO_WIDTH_MM) -> InlineImage:
+    """写真を報告書用の縮小版（report サイズ、生成済みならそれを再利用）で差し込む"""
+    path = get_derivative(photo_abspath(photo), photo.content_hash, "report")
+    return InlineImage(tpl, str(path), width=Mm(width_mm))
+
+
 def render_report(template_path: Path, out_path: Path, context: dict):
     tpl = DocxTemplate(str(template_path))
+    # rep_photo に Photo が渡されたら原寸ではなく縮小版を差し込む（ファイルが無ければ空欄）
+    for sec in context.get("species_sections", []):
+        photo = sec.get("rep_photo")
+        if isinstance(photo, Photo):
+            try:
+                sec["rep_photo"] = photo_image(tpl, photo) if photo.content_hash else None
+            except OSError:
+                sec["rep_photo"] = None
     tpl.render(context)
     tpl.save(str(out_path))
 
 # context例
 # {
-#   "survey_name": "2025-09-08 現地調査A",
+#   "survey_name": "2025-09-08 現地調査A", "survey_date": "2025-09-08", "observers": "...",
 #   "table_observations": [
-#       {"species":"ハイタカ","count":2,"started_at":"2025-09-08 10:21","ended_at":"10:23"},
+#       {"species":"ハイタカ","count":2,"behavior":"flight","individual_id":"","started_at":"2025-09-08 10:21","ended_at":"10:23","notes":""},
 #   ],
 #   "species_sections": [
-#       {"species":"ハイタカ","map_png":"/app/data/exports/hai_map.png","rep_photo":"/app/data/exports/hai_photo.png"},
+#       {"species":"ハイタカ","rep_photo":<Photo>},
 #   ],
 # }
+# report/context.py の report_context が調査から組み立てる
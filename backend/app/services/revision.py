@@ -0,0 +1,29 @@
+# backend/app/services/revision.py
+from typing import Iterable
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.models.survey import Survey
+
+
+def bump_revision(db: Session, survey_id: int) -> None:
+    """
+    調査の revision を +1 する（コミットは呼び出し側）。
+    派生データのキャッシュは (survey_id, revision) をキーにしているため、
+    観察・形状を書き換えたら必ず呼ぶこと。
+    """
+    db.execute(
+        update(Survey)
+        .where(Survey.id == survey_id)
+        .values(revision=Survey.revision + 1)
+    )
+    db.info.setdefault("bumped_surveys", set()).add(survey_id)
+
+
+def get_revisions(db: Session, survey_ids: Iterable[int]) -> dict[int, int]:
+    """{survey_id: revision}。存在しない調査は含まれない。"""
+    ids = list(survey_ids)
+    if not ids:
+        return {}
+    rows = db.query(Survey.id, Survey.revision).filter(Survey.id.in_(ids)).all()
+    return {sid: (rev or 0) for sid, rev in rows}
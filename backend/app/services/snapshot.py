@@ -0,0 +1,184 @@
+# backend/app/services/snapshot.py
+# 調査単位の FeatureCollection を事前に書き出しておく（GET /observations/features?survey_id=N 用）。
+# - 書き込みのコミット後（session の bumped_surveys）に再生成を予約し、短時間の連続書き込みはまとめる
+# - data/snapshots/survey_{id}.r{revision}.geojson と .gz（brotli があれば .br も）を作る
+# - 読み出し側は現在の revision のファイルがあればそれを返し、DB と JSON 化を通らない
+from __future__ import annotations
+from pathlib import Path
+from threading import Lock, Timer, get_ident
+import gzip
+import json
+import logging
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal, data_dir
+from app.models.survey import Survey
+
+try:  # 任意依存
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+# 最後の書き込みからこの秒数待って再生成。書き込みが続いても MAX_DELAY 秒以内には一度作る
+DEBOUNCE_S = float(os.getenv("RAPTOR_SNAPSHOT_DEBOUNCE", "1.0"))
+MAX_DELAY_S = float(os.getenv("RAPTOR_SNAPSHOT_MAX_DELAY", "10.0"))
+
+# Accept-Encoding で選ぶ順
+ENCODINGS = ("br", "gzip")
+_SUFFIX = {"br": ".br", "gzip": ".gz"}
+
+_lock = Lock()
+_timers: dict[int, Timer] = {}
+_first_request: dict[int, float] = {}
+
+
+def snapshot_dir() -> Path:
+    d = data_dir() / "snapshots"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def snapshot_path(survey_id: int, revision: int) -> Path:
+    return snapshot_dir() / f"survey_{survey_id}.r{revision}.geojson"
+
+
+def current_snapshot(survey_id: int, revision: int, accept_encoding: str = "") -> tuple[Path, str | None] | None:
+    """
+    現在の revision のスナップショット (path, content-encoding)。無ければ None。
+    Accept-Encoding に応じて .br / .gz を選ぶ。
+    """
+    base = snapshot_path(survey_id, revision)
+    if not base.exists():
+        return None
+    accepted = {e.split(";")[0].strip() for e in accept_encoding.lower().split(",")}
+    for enc in ENCODINGS:
+        if enc in accepted:
+            p = base.with_name(base.name + _SUFFIX[enc])
+            if p.exists():
+                return p, enc
+    return base, None
+
+
+# --- 生成 ---------------------------------------------------------------------------
+
+def _render(db: Session, survey_id: int) -> bytes:
+    from app.services.features import feature_collection
+    from app.services.postgis import feature_collection_json, postgis_enabled
+    from app.services.archive import is_archived
+
+    if postgis_enabled() and not is_archived(db, survey_id):
+        return feature_collection_json(db, survey_id).encode("utf-8")
+    # FastAPI の JSONResponse と同じ形式
+    fc = feature_collection(db, [survey_id])
+    return json.dumps(fc, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # 複数ワーカーが同じファイルを同時に作っても壊れないよう一時名は書き手ごと
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _remove_old(survey_id: int, keep_revision: int) -> None:
+    # 直前の revision は残す（配信中のリクエストがあり得るため）
+    for p in snapshot_dir().glob(f"survey_{survey_id}.r*.geojson*"):
+        try:
+            rev = int(p.name.split(".r", 1)[1].split(".", 1)[0])
+        except (IndexError, ValueError):
+            continue
+        if rev < keep_revision - 1:
+            p.unlink(missing_ok=True)
+
+
+def remove_snapshots(survey_id: int) -> None:
+    """調査削除時用（id が再利用されたときに古いファイルを返さないため）"""
+    for p in snapshot_dir().glob(f"survey_{survey_id}.r*.geojson*"):
+        p.unlink(missing_ok=True)
+
+
+def build_snapshot(survey_id: int) -> Path | None:
+    """
+    スナップショットを作る。読み取り中に revision が進んだ場合は破棄する
+    （その書き込みのコミットで再生成が予約されている）。
+    """
+    db = SessionLocal()
+    try:
+        revision = db.query(Survey.revision).filter(Survey.id == survey_id).scalar()
+        if revision is None:
+            return None
+        path = snapshot_path(survey_id, revision)
+        if path.exists():
+            return path
+        data = _render(db, survey_id)
+        db.rollback()
+        if db.query(Survey.revision).filter(Survey.id == survey_id).scalar() != revision:
+            return None
+    finally:
+        db.close()
+
+    # 圧縮版を先に置き、最後に本体（本体の存在 = 完成）
+    _write_atomic(path.with_name(path.name + ".gz"), gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write_atomic(path.with_name(path.name + ".br"), brotli.compress(data, quality=11))
+    _write_atomic(path, data)
+    _remove_old(survey_id, revision)
+    return path
+
+
+def _run(survey_id: int) -> None:
+    with _lock:
+        _timers.pop(survey_id, None)
+        _first_request.pop(survey_id, None)
+    try:
+        build_snapshot(survey_id)
+    except Exception:
+        log.exception("snapshot build failed: survey %s", survey_id)
+
+
+def schedule(survey_id: int, delay: float | None = None) -> None:
+    """再生成を予約する（既に予約済みなら待ち時間を延ばす。ただし MAX_DELAY_S まで）"""
+    delay = DEBOUNCE_S if delay is None else delay
+    now = time.monotonic()
+    with _lock:
+        first = _first_request.setdefault(survey_id, now)
+        delay = max(0.0, min(delay, first + MAX_DELAY_S - now))
+        old = _timers.pop(survey_id, None)
+        if old is not None:
+            old.cancel()
+        t = Timer(delay, _run, (survey_id,))
+        t.daemon = True
+        _timers[survey_id] = t
+        t.start()
+
+
+def ensure_snapshot(survey_id: int) -> None:
+    """読み出しでスナップショットが無かったとき用。予約が無ければすぐ作る"""
+    with _lock:
+        if survey_id in _timers:
+            return
+    schedule(survey_id, 0.0)
+
+
+# --- セッションフック ---------------------------------------------------------------
+
+def _after_commit(session: Session) -> None:
+    for survey_id in session.info.pop("bumped_surveys", ()):
+        schedule(survey_id)
+
+
+def _after_rollback(session: Session, _previous_transaction) -> None:
+    session.info.pop("bumped_surveys", None)
+
+
+def enable_snapshots() -> None:
+    """bump_revision したセッションのコミット後にスナップショット再生成を予約する（冪等）"""
+    if not event.contains(SessionLocal, "after_commit", _after_commit):
+        event.listen(SessionLocal, "after_commit", _after_commit)
+        event.listen(SessionLocal, "after_soft_rollback", _after_rollback)
@@ -0,0 +1,45 @@
+# backend/app/services/timestamps.py
+# 観察時刻の保存規約: DB には UTC の壁時計時刻を naive datetime で保存する。
+# - 記録 API（フロントは toISOString の "Z" 付きで送る）・過去データ取り込みの両方でここを通す
+# - タイムゾーン無しの値の解釈は入口ごとに決める（API は UTC、過去データは現地時刻 JST）
+# - 毎日の時間帯など現地時刻が要る計算は local_tz で変換してから行う
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# 日本は夏時間が無いので固定オフセット（tzdata が無い環境でも動く）
+JST = timezone(timedelta(hours=9), "JST")
+DEFAULT_LOCAL_TZ = "Asia/Tokyo"
+
+
+def to_storage(value: datetime, naive_tz: tzinfo = timezone.utc) -> datetime:
+    """保存用の naive UTC に。naive な値は naive_tz の時刻とみなす"""
+    if value.tzinfo is None:
+        if naive_tz is timezone.utc:
+            return value
+        value = value.replace(tzinfo=naive_tz)
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def local_tz(name: str | None) -> tzinfo:
+    """IANA 名 → tzinfo（未指定・Asia/Tokyo は JST）。不明な名前は ValueError"""
+    if not name or name in (DEFAULT_LOCAL_TZ, "JST"):
+        return JST
+    if name in ("UTC", "Z"):
+        return timezone.utc
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        raise ValueError(f"unknown time zone: {name}") from e
+
+
+def to_local(value: datetime, tz: tzinfo = JST) -> datetime:
+    """保存値（naive UTC）→ tz の壁時計時刻（naive）"""
+    return value.replace(tzinfo=timezone.utc).astimezone(tz).replace(tzinfo=None)
+
+
+def iso_utc(value: datetime | None) -> str | None:
+    """保存値（naive UTC）→ "Z" 付き ISO 8601（秒まで）"""
+    if value is None:
+        return None
+    return to_storage(value).replace(microsecond=0).isoformat() + "Z"
@@ -0,0 +1,276 @@
+# backend/app/services/trajectory/engine.py
+from __future__ import annotations
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+import numpy as np
+from pyproj import Transformer
+from shapely.geometry import MultiPoint, mapping
+from shapely.ops import transform as shp_transform
+
+# 距離計算はすべて平面直角座標系（m）上で行う。高度は扱わない（2D）。
+
+_EPOCH = datetime(1970, 1, 1)
+KDE_MAX_CELLS = 512  # 1辺あたりのグリッド数上限（超える場合はセルを粗くする）
+KDE_CHUNK = 4096  # カーネル行列を作る際の点の分割数
+
+
+def _to_epoch_s(value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH).total_seconds()
+
+
+def assemble_trajectory(features: Iterable[dict], tf: Transformer) -> dict:
+    """
+    同一個体の Point / LineString を時刻順に並べた1本の軌跡にする。
+    - Point: 観察区間の中央時刻
+    - LineString: 各頂点に started_at〜ended_at を累積距離で按分した時刻を付与
+    features: {"geometry": GeoJSON, "properties": {"observation_id","started_at","ended_at",...}}
+    返り値は numpy 配列の dict（x,y は投影座標[m]、lon,lat は EPSG:4326、t はエポック秒）
+    """
+    lons, lats, ts, obs_ids, seq = [], [], [], [], []
+    order = 0
+    for feat in features:
+        geom = feat.get("geometry") or {}
+        props = feat.get("properties") or {}
+        gtype = geom.get("type")
+        t0 = _to_epoch_s(props.get("started_at"))
+        t1 = _to_epoch_s(props.get("ended_at"))
+        if t0 is None:
+            continue
+        if t1 is None or t1 < t0:
+            t1 = t0
+
+        if gtype == "Point":
+            coords = np.asarray([geom.get("coordinates", [])[:2]], dtype=float)
+        elif gtype == "LineString":
+            coords = np.asarray([c[:2] for c in geom.get("coordinates", [])], dtype=float)
+        else:
+            continue
+        if coords.ndim != 2 or coords.shape[0] == 0 or coords.shape[1] != 2:
+            continue
+
+        if gtype == "Point":
+            t = np.array([(t0 + t1) / 2.0])
+        else:
+            x, y = tf.transform(coords[:, 0], coords[:, 1])
+            step = np.hypot(np.diff(x), np.diff(y))
+            cum = np.concatenate(([0.0], np.cumsum(step)))
+            if cum[-1] > 0:
+                frac = cum / cum[-1]
+            else:
+                frac = np.linspace(0.0, 1.0, len(cum)) if len(cum) > 1 else np.zeros(1)
+            t = t0 + frac * (t1 - t0)
+
+        n = coords.shape[0]
+        lons.append(coords[:, 0])
+        lats.append(coords[:, 1])
+        ts.append(t)
+        obs_ids.append(np.full(n, int(props.get("observation_id") or 0)))
+        seq.append(np.arange(order, order + n))
+        order += n
+
+    if not lons:
+        empty = np.empty(0)
+        return {"lon": empty, "lat": empty, "x": empty, "y": empty, "t": empty, "observation_id": np.empty(0, dtype=int)}
+
+    lon = np.concatenate(lons)
+    lat = np.concatenate(lats)
+    t = np.concatenate(ts)
+    oid = np.concatenate(obs_ids)
+    s = np.concatenate(seq)
+
+    # 時刻順（同時刻は入力順を保持）
+    idx = np.lexsort((s, t))
+    lon, lat, t, oid = lon[idx], lat[idx], t[idx], oid[idx]
+    x, y = tf.transform(lon, lat)
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+
+    # 同一位置・同一時刻の連続重複（線の終点と次の線の始点など）を除去
+    if len(t) > 1:
+        dup = (np.diff(x) == 0) & (np.diff(y) == 0) & (np.diff(t) == 0)
+        keep = np.concatenate(([True], ~dup))
+        lon, lat, x, y, t, oid = lon[keep], lat[keep], x[keep], y[keep], t[keep], oid[keep]
+
+    return {"lon": lon, "lat": lat, "x": x, "y": y, "t": t, "observation_id": oid}
+
+
+def segment_metrics(traj: dict) -> dict:
+    """区間ごとの距離[m]・経過秒・速度[m/s]・転回角[deg]"""
+    x, y, t = traj["x"], traj["y"], traj["t"]
+    if len(x) < 2:
+        empty = np.empty(0)
+        return {"step_m": empty, "dt_s": empty, "speed_mps": empty, "turning_deg": empty}
+
+    dx, dy = np.diff(x), np.diff(y)
+    dt = np.diff(t)
+    step = np.hypot(dx, dy)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = np.where(dt > 0, step / dt, np.nan)
+
+    # 転回角: 連続する2区間の進行方向の差（-180〜180）。停止区間を含む場合は NaN
+    heading = np.arctan2(dy, dx)
+    turn = np.diff(heading)
+    turn = (turn + np.pi) % (2 * np.pi) - np.pi
+    moving = step > 0
+    turn = np.where(moving[:-1] & moving[1:], np.degrees(turn), np.nan)
+
+    return {"step_m": step, "dt_s": dt, "speed_mps": speed, "turning_deg": turn}
+
+
+def _nan_stat(func, values: np.ndarray) -> Optional[float]:
+    v = values[np.isfinite(values)]
+    return float(func(v)) if v.size else None
+
+
+def summarize(traj: dict, seg: dict) -> dict:
+    x, y, t = traj["x"], traj["y"], traj["t"]
+    total = float(seg["step_m"].sum()) if seg["step_m"].size else 0.0
+    net = float(np.hypot(x[-1] - x[0], y[-1] - y[0])) if len(x) > 1 else 0.0
+    return {
+        "n_points": int(len(x)),
+        "n_observations": int(np.unique(traj["observation_id"]).size),
+        "started_at": _iso(t[0]) if len(t) else None,
+        "ended_at": _iso(t[-1]) if len(t) else None,
+        "duration_s": float(t[-1] - t[0]) if len(t) > 1 else 0.0,
+        "total_distance_m": total,
+        "net_displacement_m": net,
+        "straightness": (net / total) if total > 0 else None,
+        "speed_mean_mps": _nan_stat(np.mean, seg["speed_mps"]),
+        "speed_median_mps": _nan_stat(np.median, seg["speed_mps"]),
+        "speed_max_mps": _nan_stat(np.max, seg["speed_mps"]),
+        "turning_abs_mean_deg": _nan_stat(lambda v: np.mean(np.abs(v)), seg["turning_deg"]),
+    }
+
+
+def _iso(epoch_s: float) -> str:
+    return datetime.fromtimestamp(round(float(epoch_s), 3), tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def mcp(x: np.ndarray, y: np.ndarray, percent: float = 100.0):
+    """
+    最外郭法（Minimum Convex Polygon）。percent < 100 の場合は
+    重心から遠い点を除外してから凸包を取る。返り値は shapely 図形（投影座標）
+    """
+    if len(x) < 3:
+        return None
+    pts = np.column_stack((x, y))
+    if percent < 100.0:
+        d = np.hypot(x - x.mean(), y - y.mean())
+        k = max(3, int(np.ceil(len(d) * percent / 100.0)))
+        pts = pts[np.argsort(d)[:k]]
+    hull = MultiPoint(pts).convex_hull
+    return hull if hull.geom_type == "Polygon" else None
+
+
+def kde_home_range(
+    x: np.ndarray,
+    y: np.ndarray,
+    cell_m: float = 50.0,
+    bandwidth_m: Optional[float] = None,
+    levels: Iterable[float] = (50.0, 95.0),
+) -> Optional[dict]:
+    """
+    グリッド上のガウスカーネル密度推定で行動圏（等値線内面積）を求める。
+    bandwidth 未指定時は参照帯域幅 h_ref = sqrt((sx^2+sy^2)/2) * n^(-1/6)
+    カーネルは x/y で分離できるので density = Ky^T @ Kx として行列積で計算する。
+    """
+    n = len(x)
+    if n < 2:
+        return None
+    if bandwidth_m is None:
+        sd = np.sqrt((np.var(x, ddof=1) + np.var(y, ddof=1)) / 2.0)
+        bandwidth_m = float(sd * n ** (-1.0 / 6.0))
+    if not np.isfinite(bandwidth_m) or bandwidth_m <= 0:
+        return None
+
+    pad = 3.0 * bandwidth_m
+    minx, maxx = x.min() - pad, x.max() + pad
+    miny, maxy = y.min() - pad, y.max() + pad
+    cell = float(cell_m)
+    span = max(maxx - minx, maxy - miny)
+    if span / cell > KDE_MAX_CELLS:
+        cell = span / KDE_MAX_CELLS
+    gx = np.arange(minx + cell / 2, maxx, cell)
+    gy = np.arange(miny + cell / 2, maxy, cell)
+
+    inv = 1.0 / (2.0 * bandwidth_m ** 2)
+    density = np.zeros((len(gy), len(gx)))
+    # 点数が多い場合のメモリを抑えるため分割して加算
+    for i in range(0, n, KDE_CHUNK):
+        xs, ys = x[i:i + KDE_CHUNK], y[i:i + KDE_CHUNK]
+        kx = np.exp(-((gx[None, :] - xs[:, None]) ** 2) * inv)  # (m, nx)
+        ky = np.exp(-((gy[None, :] - ys[:, None]) ** 2) * inv)  # (m, ny)
+        density += ky.T @ kx  # (ny, nx)
+    total = density.sum()
+    if total <= 0:
+        return None
+    prob = density / total
+
+    # 確率の高いセルから累積し、各レベルに達するまでのセル数×セル面積
+    flat = np.sort(prob.ravel())[::-1]
+    cum = np.cumsum(flat)
+    cell_area = cell * cell
+    isopleths = {}
+    for lv in levels:
+        k = int(np.searchsorted(cum, lv / 100.0) + 1)
+        isopleths[str(int(lv)) if float(lv).is_integer() else str(lv)] = float(min(k, flat.size) * cell_area)
+
+    return {
+        "bandwidth_m": bandwidth_m,
+        "cell_m": cell,
+        "grid_shape": [int(len(gy)), int(len(gx))],
+        "isopleth_area_m2": isopleths,
+    }
+
+
+def analyze_individual(
+    features: Iterable[dict],
+    tf: Transformer,
+    tf_inv: Transformer,
+    mcp_percent: float = 100.0,
+    kde_cell_m: float = 50.0,
+    kde_bandwidth_m: Optional[float] = None,
+) -> dict:
+    """軌跡の組み立て〜区間指標〜行動圏推定までをまとめて返す（JSON化可能な dict）"""
+    traj = assemble_trajectory(features, tf)
+    seg = segment_metrics(traj)
+    summary = summarize(traj, seg)
+
+    hull = mcp(traj["x"], traj["y"], mcp_percent)
+    mcp_out = None
+    if hull is not None:
+        hull_ll = shp_transform(lambda a, b, z=None: tf_inv.transform(a, b), hull)
+        mcp_out = {"percent": mcp_percent, "area_m2": float(hull.area), "geometry": mapping(hull_ll)}
+
+    kde = kde_home_range(traj["x"], traj["y"], kde_cell_m, kde_bandwidth_m)
+
+    coords = np.column_stack((traj["lon"], traj["lat"])).tolist()
+    return {
+        "trajectory": {
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": coords} if len(coords) > 1
+            else ({"type": "Point", "coordinates": coords[0]} if coords else None),
+            "properties": {
+                "times": [_iso(v) for v in traj["t"]],
+                "observation_ids": traj["observation_id"].tolist(),
+            },
+        },
+        "segments": {k: _json_floats(v) for k, v in seg.items()},
+        "summary": summary,
+        "home_range": {"mcp": mcp_out, "kde": kde},
+    }
+
+
+def _json_floats(values: np.ndarray) -> list:
+    # NaN は JSON にできないので None に
+    return [None if not np.isfinite(v) else float(v) for v in values]
+
@@ -0,0 +1,58 @@
+# backend/tests/conftest.py
+# API テスト共通: 一時ディレクトリの SQLite とデータディレクトリを設定してから app を読み込む
+# （app.db は import 時に接続先を決める）。
+#   cd backend && python -m pytest
+import os
+import tempfile
+from datetime import date
+
+_TMP = tempfile.mkdtemp(prefix="raptor-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/test.db"
+os.environ["RAPTOR_DATA_DIR"] = f"{_TMP}/data"
+os.environ.setdefault("RAPTOR_WARM_CRS", "0")
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+from app.models.survey import Survey  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    # startup で init_db（テーブル作成）が走る
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def db(client):
+    s = SessionLocal()
+    try:
+        yield s
+    finally:
+        s.close()
+
+
+@pytest.fixture
+def survey(db) -> Survey:
+    s = Survey(name="test", date=date(2024, 5, 1))
+    db.add(s)
+    db.commit()
+    return s
+
+
+@pytest.fixture
+def record(client):
+    """POST /observations/record（時刻は "Z" 付き ISO 8601。フロントと同じ）"""
+    def _record(survey_id: int, geometry: dict, started_at: str, ended_at: str, species: str = "ノスリ") -> dict:
+        r = client.post("/observations/record", json={
+            "observation": {"survey_id": survey_id, "species": species, "count": 1, "behavior": "flight",
+                            "started_at": started_at, "ended_at": ended_at},
+            "feature": {"type": "Feature", "geometry": geometry, "properties": {}},
+        })
+        assert r.status_code == 200, r.text
+        return r.json()
+
+    return _record
@@ -0,0 +1,21 @@
+# backend/tests/test_features.py
+from datetime import datetime
+
+from app.models.survey import Survey
+
+
+def test_unfiltered_listing_excludes_archived_surveys(client, db, survey, record):
+    other = Survey(name="other", date=survey.date)
+    db.add(other)
+    db.commit()
+    for sid in (survey.id, other.id):
+        record(sid, {"type": "Point", "coordinates": [139.70, 35.60]}, "2024-05-01T01:00:00Z", "2024-05-01T01:05:00Z")
+    # アーカイブの途中（archived_at は立ったが常用テーブルの行はまだ残っている）
+    other.archived_at = datetime.utcnow()
+    db.commit()
+
+    r = client.get("/observations/features")
+    assert r.status_code == 200
+    surveys = {f["properties"]["survey_id"] for f in r.json()["features"]}
+    assert survey.id in surveys
+    assert other.id not in surveys
@@ -0,0 +1,30 @@
+# backend/tests/test_heatmap.py
+import numpy as np
+import pytest
+
+from app.services.heatmap import grid
+
+
+@pytest.fixture
+def flight(survey, record):
+    record(survey.id, {"type": "LineString", "coordinates": [[139.70, 35.60], [139.75, 35.62]]},
+           "2024-05-01T01:00:00Z", "2024-05-01T01:05:00Z")
+    return survey
+
+
+def test_densify_below_cell_fraction_is_400(client, flight):
+    params = {"survey_ids": flight.id, "cell_m": 100, "format": "json"}
+    r = client.get("/heatmap", params={**params, "densify_m": 1e-9})
+    assert r.status_code == 400, r.text
+    r = client.get("/heatmap", params={**params, "densify_m": 10})
+    assert r.status_code == 200, r.text
+
+
+def test_densified_vertices_are_capped_before_allocation(monkeypatch):
+    # 1辺 100 km の線を 10 m 間隔 → 約 1 万頂点。上限を下げて補間前に断られることを確かめる
+    x, y = np.array([0.0, 100_000.0]), np.array([0.0, 0.0])
+    assert grid.densified_size(x, y, 10.0) == len(grid.densify_line(x, y, 10.0)[0])
+    monkeypatch.setattr(grid, "MAX_DENSIFIED_VERTICES", 1000)
+    monkeypatch.setattr(grid, "densify_line", lambda *a: pytest.fail("densified past the cap"))
+    with pytest.raises(ValueError, match="densified vertices"):
+        grid.build_grid([], [(x, y)], cell_m=100.0, densify_m=10.0)
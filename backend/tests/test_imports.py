@@ -0,0 +1,32 @@
+# backend/tests/test_imports.py
+from datetime import datetime
+
+import pytest
+
+from app.db import SessionLocal
+from app.models.observation import Observation
+from app.models.survey import Survey
+from app.services.archive import SurveyArchived
+from app.services.importer.legacy import import_features
+
+
+def test_archived_between_batches_stops_import(db, survey):
+    def source():
+        yield {"type": "Point", "coordinates": [139.70, 35.60]}, {"species": "ノスリ"}, 4326
+        # 1バッチ目のコミット後、別の接続からアーカイブ（archive_survey の 1) と同じ）
+        other = SessionLocal()
+        other.get(Survey, survey.id).archived_at = datetime.utcnow()
+        other.commit()
+        other.close()
+        yield {"type": "Point", "coordinates": [139.71, 35.61]}, {"species": "ノスリ"}, 4326
+
+    with pytest.raises(SurveyArchived, match="1 observations were imported"):
+        import_features(db, survey.id, survey.date, source(), batch_size=1)
+    assert db.query(Observation).filter(Observation.survey_id == survey.id).count() == 1
+
+
+def test_import_into_archived_survey_is_409(client, db, survey):
+    survey.archived_at = datetime.utcnow()
+    db.commit()
+    r = client.post(f"/import/{survey.id}", files={"file": ("a.geojson", b'{"type": "Point", "coordinates": [139.7, 35.6]}')})
+    assert r.status_code == 409, r.text
@@ -0,0 +1,47 @@
+# backend/tests/test_photos.py
+from datetime import datetime
+from io import BytesIO
+
+from PIL import Image
+
+from app.models.photo import Photo
+
+
+def _jpeg_with_exif_time(value: str) -> bytes:
+    """GPS 無し・DateTimeOriginal だけを持つ JPEG"""
+    exif = Image.Exif()
+    exif.get_ifd(0x8769)[0x9003] = value  # ExifIFD / DateTimeOriginal
+    buf = BytesIO()
+    Image.new("RGB", (64, 48), (120, 80, 40)).save(buf, "JPEG", exif=exif)
+    return buf.getvalue()
+
+
+def test_link_by_exif_time_only(client, db, survey, record):
+    # 観察 01:00–01:10Z（= 10:00–10:10 JST）、写真は EXIF 10:05（カメラの現地時刻 JST）で GPS 無し
+    record(survey.id, {"type": "Point", "coordinates": [139.7, 35.6]},
+                 "2024-05-01T01:00:00Z", "2024-05-01T01:10:00Z")
+    r = client.post(f"/photos/{survey.id}",
+                    files=[("files", ("a.jpg", _jpeg_with_exif_time("2024:05:01 10:05:00"), "image/jpeg"))])
+    assert r.status_code == 200, r.text
+    photo_id = r.json()["photos"][0]["photo_id"]
+    assert db.get(Photo, photo_id).taken_at.isoformat() == "2024-05-01T01:05:00"
+
+    r = client.post(f"/photos/{survey.id}/link")
+    assert r.status_code == 200
+    assert r.json()["links"] == 1
+
+
+def test_regroup_converts_legacy_local_times(client, db, survey):
+    # 旧データ: EXIF の現地時刻のまま保存されている
+    p = Photo(survey_id=survey.id, file_path="missing.jpg", taken_at=datetime(2024, 5, 1, 10, 5), phash=0,
+              exif_raw={"EXIF DateTimeOriginal": "2024:05:01 10:05:00"})
+    db.add(p)
+    db.commit()
+    r = client.post(f"/photos/{survey.id}/bursts")
+    assert r.status_code == 200
+    db.refresh(p)
+    assert p.taken_at.isoformat() == "2024-05-01T01:05:00"
+    # 何度実行しても同じ
+    client.post(f"/photos/{survey.id}/bursts")
+    db.refresh(p)
+    assert p.taken_at.isoformat() == "2024-05-01T01:05:00"
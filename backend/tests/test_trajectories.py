@@ -0,0 +1,24 @@
+# backend/tests/test_trajectories.py
+import pytest
+
+
+@pytest.fixture
+def flight(survey, record):
+    record(survey.id, {"type": "LineString", "coordinates": [[139.70, 35.60], [139.71, 35.61]]},
+           "2024-05-01T01:00:00Z", "2024-05-01T01:05:00Z")
+    return survey
+
+
+@pytest.mark.parametrize("target_epsg", [999999, 4326])
+def test_invalid_target_epsg_is_400(client, flight, target_epsg):
+    # 存在しないコード・経緯度（度単位）の CRS は距離がメートルで出ないので受け付けない
+    r = client.get(f"/trajectories/{flight.id}", params={"target_epsg": target_epsg})
+    assert r.status_code == 400, r.text
+    r = client.get("/heatmap", params={"survey_ids": flight.id, "target_epsg": target_epsg, "format": "json"})
+    assert r.status_code == 400, r.text
+
+
+def test_projected_target_epsg(client, flight):
+    r = client.get(f"/trajectories/{flight.id}", params={"target_epsg": 6677})
+    assert r.status_code == 200, r.text
+    assert r.json()
@@ -0,0 +1,63 @@
+# scripts/archive_surveys.py
+# 終了した調査のアーカイブ / 復元
+#   python scripts/archive_surveys.py archive 12 13
+#   python scripts/archive_surveys.py archive --before 2024-04-01   # 調査日がこれより前の調査をまとめて
+#   python scripts/archive_surveys.py restore 12
+#   python scripts/archive_surveys.py list
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from app.db import SessionLocal, init_db  # noqa: E402
+from app.models.survey import Survey  # noqa: E402
+from app.services.archive import DEFAULT_CHUNK, archive_path, archive_survey, restore_survey  # noqa: E402
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="archive / restore surveys")
+    ap.add_argument("command", choices=["archive", "restore", "list"])
+    ap.add_argument("survey_ids", nargs="*", type=int)
+    ap.add_argument("--before", type=date.fromisoformat, help="archive: 調査日がこの日より前の未アーカイブ調査")
+    ap.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="削除・挿入のチャンク行数")
+    args = ap.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.command == "list":
+            for s in db.query(Survey).filter(Survey.archived_at.isnot(None)).order_by(Survey.id):
+                path = archive_path(s.id)
+                size = f"{path.stat().st_size / 1024:.0f} KiB" if path.exists() else "missing"
+                print(f"{s.id}\t{s.date}\t{s.name}\tarchived {s.archived_at:%Y-%m-%d %H:%M}\t{size}")
+            return 0
+
+        ids = list(args.survey_ids)
+        if args.command == "archive" and args.before:
+            ids += [sid for (sid,) in db.query(Survey.id).filter(
+                Survey.date < args.before, Survey.archived_at.is_(None)).order_by(Survey.id)]
+        if not ids:
+            ap.error("no surveys specified")
+
+        failed = 0
+        for sid in ids:
+            try:
+                if args.command == "archive":
+                    r = archive_survey(db, sid, args.chunk)
+                    print(f"archived survey {sid}: {r['counts']} -> {r['path']}")
+                else:
+                    r = restore_survey(db, sid, args.chunk)
+                    print(f"restored survey {sid}: {r['counts']}")
+            except (LookupError, ValueError) as e:
+                db.rollback()
+                print(f"survey {sid}: {e}", file=sys.stderr)
+                failed += 1
+        return 1 if failed else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
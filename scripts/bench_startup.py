@@ -0,0 +1,141 @@
+# scripts/bench_startup.py
+# API の起動コスト（import 時間・起動処理時間・RSS）を役割ごとに測る。回帰検出用に閾値も指定できる。
+#   python scripts/bench_startup.py                          # all / api / export を各5回
+#   python scripts/bench_startup.py --role api --forbid-heavy --max-rss-mb 90
+#   python scripts/bench_startup.py --role all --importtime 15   # import の重いモジュール上位
+# 各計測は新しいプロセスで行う（DB は一時 SQLite。--database-url で変更可）。
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1] / "backend"
+
+# API 専用ワーカーでは読み込まれないはずのモジュール
+HEAVY_MODULES = ("numpy", "pyproj", "shapely", "shapefile", "PIL", "exifread", "docxtpl", "docx")
+
+_CHILD = r"""
+import json, os, sys, time, asyncio
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r / (1024 * 1024) if sys.platform == "darwin" else r / 1024
+
+base = rss_mb()
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+rss_import = rss_mb()
+heavy_import = [m for m in HEAVY if m in sys.modules]
+async def started():
+    # on_event("startup") のハンドラは lifespan 経由で呼ばれる
+    async with app.main.app.router.lifespan_context(app.main.app):
+        return time.perf_counter()
+t2 = asyncio.run(started())
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "startup_ms": (t2 - t1) * 1000,
+    "rss_base_mb": base,
+    "rss_import_mb": rss_import,
+    "rss_startup_mb": rss_mb(),
+    "heavy_after_import": heavy_import,
+    "heavy_after_startup": [m for m in HEAVY if m in sys.modules],
+}))
+"""
+
+
+def run_once(role: str, env_extra: dict, importtime: bool = False) -> tuple[dict, str]:
+    env = {**os.environ, "RAPTOR_ROLE": role, **env_extra}
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    code = f"HEAVY = {HEAVY_MODULES!r}\n" + _CHILD
+    out = subprocess.run(cmd + ["-c", code], cwd=str(BACKEND_DIR), env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"{role}: child failed\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1]), out.stderr
+
+
+def top_imports(stderr: str, n: int) -> list[tuple[int, str]]:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cum_us, name = (p.strip() for p in line.replace("import time:", "").split("|"))
+        # トップレベルのパッケージと app 配下だけ
+        if name.startswith("app.") or "." not in name:
+            rows.append((int(cum_us), name))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="measure API cold start per worker role")
+    ap.add_argument("--role", action="append", choices=["all", "api", "export"])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--database-url", help="既定は一時 SQLite")
+    ap.add_argument("--skip-init-db", action="store_true", help="RAPTOR_INIT_DB=0 で測る")
+    ap.add_argument("--importtime", type=int, default=0, metavar="N", help="import の累積時間上位 N を表示")
+    ap.add_argument("--max-import-ms", type=float)
+    ap.add_argument("--max-startup-ms", type=float)
+    ap.add_argument("--max-rss-mb", type=float, help="起動後 RSS（中央値）の上限")
+    ap.add_argument("--forbid-heavy", action="store_true", help="起動後に重いモジュールが読み込まれていたら失敗")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    roles = args.role or ["all", "api", "export"]
+    tmp = tempfile.mkdtemp()
+    env_extra = {"DATABASE_URL": args.database_url or f"sqlite:///{Path(tmp) / 'bench.db'}"}
+    if args.skip_init_db:
+        env_extra["RAPTOR_INIT_DB"] = "0"
+    # 初回の create_all は計測に含めない
+    run_once(roles[0], {k: v for k, v in env_extra.items() if k != "RAPTOR_INIT_DB"})
+
+    results = {}
+    failures = []
+    for role in roles:
+        samples = [run_once(role, env_extra)[0] for _ in range(args.runs)]
+        med = {k: statistics.median(s[k] for s in samples)
+               for k in ("import_ms", "startup_ms", "rss_base_mb", "rss_import_mb", "rss_startup_mb")}
+        med["heavy_after_startup"] = samples[-1]["heavy_after_startup"]
+        results[role] = med
+        if args.max_import_ms is not None and med["import_ms"] > args.max_import_ms:
+            failures.append(f"{role}: import {med['import_ms']:.0f} ms > {args.max_import_ms:.0f} ms")
+        if args.max_startup_ms is not None and med["startup_ms"] > args.max_startup_ms:
+            failures.append(f"{role}: startup {med['startup_ms']:.0f} ms > {args.max_startup_ms:.0f} ms")
+        if args.max_rss_mb is not None and med["rss_startup_mb"] > args.max_rss_mb:
+            failures.append(f"{role}: rss {med['rss_startup_mb']:.1f} MB > {args.max_rss_mb:.1f} MB")
+        if args.forbid_heavy and med["heavy_after_startup"]:
+            failures.append(f"{role}: heavy modules loaded: {', '.join(med['heavy_after_startup'])}")
+
+    if args.json:
+        print(json.dumps({"results": results, "failures": failures}, indent=2))
+    else:
+        print(f"{'role':<8}{'import ms':>11}{'startup ms':>12}{'RSS MB':>9}  heavy modules after startup")
+        for role, r in results.items():
+            print(f"{role:<8}{r['import_ms']:>11.0f}{r['startup_ms']:>12.0f}{r['rss_startup_mb']:>9.1f}  "
+                  f"{', '.join(r['heavy_after_startup']) or '-'}")
+        if args.importtime:
+            for role in roles:
+                _, stderr = run_once(role, env_extra, importtime=True)
+                print(f"\n-- import time top {args.importtime} ({role}, cumulative ms) --")
+                for us, name in top_imports(stderr, args.importtime):
+                    print(f"{us / 1000:>9.1f}  {name}")
+        for f in failures:
+            print(f"FAIL {f}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
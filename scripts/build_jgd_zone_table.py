@@ -0,0 +1,120 @@
+# scripts/build_jgd_zone_table.py
+# 平面直角座標系の系番号を引く参照点表（backend/app/services/crs/jgd2011_zone_refs.csv）を作る。
+#   pip install japancode geonamescache   # 元データ（実行時には不要）
+#   python scripts/build_jgd_zone_table.py
+# 参照点:
+#   - 市区町村（政令市は区）の役所位置: japancode data/municipalities.json（MIT）
+#   - 人口 500 人以上の地名: geonamescache data/cities500.json（GeoNames, CC BY 4.0）
+#     GeoNames の admin1 コードは、役所位置で最も多く当たる都道府県に対応付ける
+# 系は平成14年国土交通省告示第9号の区分（都道府県、北海道は市町村・振興局）で決める。
+# 島嶼の経緯度による区分（東京都・沖縄県・鹿児島県）は実行時に問い合わせ点の座標で判定する。
+import argparse
+import collections
+import csv
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from app.services.crs.registry import PREF_ZONES, ZONE_TABLE_PATH  # noqa: E402
+
+# 北海道の XI 系・XIII 系（それ以外の北海道は XII 系）
+HOKKAIDO_XI = {
+    "小樽市", "函館市", "伊達市", "北斗市",
+    # 後志総合振興局
+    "島牧村", "寿都町", "黒松内町", "蘭越町", "ニセコ町", "真狩村", "留寿都村", "喜茂別町", "京極町", "倶知安町",
+    "共和町", "岩内町", "泊村", "神恵内村", "積丹町", "古平町", "仁木町", "余市町", "赤井川村",
+    # 胆振総合振興局のうち
+    "豊浦町", "壮瞥町", "洞爺湖町",
+    # 渡島総合振興局
+    "松前町", "福島町", "知内町", "木古内町", "七飯町", "鹿部町", "森町", "八雲町", "長万部町",
+    # 檜山振興局
+    "江差町", "上ノ国町", "厚沢部町", "乙部町", "奥尻町", "今金町", "せたな町",
+}
+HOKKAIDO_XIII = {
+    "北見市", "帯広市", "釧路市", "網走市", "根室市",
+    # オホーツク総合振興局のうち
+    "美幌町", "津別町", "斜里町", "清里町", "小清水町", "訓子府町", "置戸町", "佐呂間町", "大空町",
+    # 十勝総合振興局
+    "音更町", "士幌町", "上士幌町", "鹿追町", "新得町", "清水町", "芽室町", "中札内村", "更別村", "大樹町",
+    "広尾町", "幕別町", "池田町", "豊頃町", "本別町", "足寄町", "陸別町", "浦幌町",
+    # 釧路総合振興局
+    "釧路町", "厚岸町", "浜中町", "標茶町", "弟子屈町", "鶴居村", "白糠町",
+    # 根室振興局
+    "別海町", "中標津町", "標津町", "羅臼町",
+}
+
+
+def _package_file(package: str, rel: str) -> Path:
+    import importlib.util
+
+    spec = importlib.util.find_spec(package)
+    if spec is None or spec.origin is None:
+        raise SystemExit(f"{package} is not installed; pass the file path explicitly")
+    return Path(spec.origin).parent / rel
+
+
+def _zone(pref: int, city: str) -> int:
+    if pref == 1:
+        return 11 if city in HOKKAIDO_XI else 13 if city in HOKKAIDO_XIII else 12
+    return PREF_ZONES[pref]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="build the JGD2011 zone reference point table")
+    ap.add_argument("--municipalities", type=Path, help="japancode data/municipalities.json")
+    ap.add_argument("--geonames", type=Path, help="geonamescache data/cities500.json")
+    ap.add_argument("--out", type=Path, default=ZONE_TABLE_PATH)
+    args = ap.parse_args()
+
+    muni_path = args.municipalities or _package_file("japancode", "data/municipalities.json")
+    gn_path = args.geonames or _package_file("geonamescache", "data/cities500.json")
+
+    munis = json.loads(muni_path.read_text(encoding="utf-8"))
+    m_lon = np.asarray([m["lng"] for m in munis], dtype=float)
+    m_lat = np.asarray([m["lat"] for m in munis], dtype=float)
+    m_pref = np.asarray([int(m["pid"]) for m in munis])
+    # 政令市の区は「札幌市 中央区」の形。北海道の区分は市町村名で引く
+    m_city = [m["city"].split(" ")[0] for m in munis]
+    unknown = (HOKKAIDO_XI | HOKKAIDO_XIII) - {c for c, p in zip(m_city, m_pref) if p == 1}
+    if unknown:
+        raise SystemExit(f"municipalities not found in source: {sorted(unknown)}")
+
+    def nearest(lon: float, lat: float, mask=None) -> int:
+        dx = (m_lon - lon) * np.cos(np.radians(lat))
+        d = dx * dx + (m_lat - lat) ** 2
+        if mask is not None:
+            d = np.where(mask, d, np.inf)
+        return int(np.argmin(d))
+
+    rows = [(lon, lat, int(p), _zone(int(p), c)) for lon, lat, p, c in zip(m_lon, m_lat, m_pref, m_city)]
+
+    places = [v for v in json.loads(gn_path.read_text(encoding="utf-8")).values() if v["countrycode"] == "JP"]
+    votes: dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+    for v in places:
+        votes[v["admin1code"]][int(m_pref[nearest(v["longitude"], v["latitude"])])] += 1
+    admin1 = {code: c.most_common(1)[0][0] for code, c in votes.items()}
+    if len(set(admin1.values())) != 47:
+        raise SystemExit("GeoNames admin1 codes did not map one-to-one onto prefectures")
+    hokkaido = m_pref == 1
+    for v in places:
+        lon, lat, pref = v["longitude"], v["latitude"], admin1[v["admin1code"]]
+        city = m_city[nearest(lon, lat, hokkaido)] if pref == 1 else ""
+        rows.append((lon, lat, pref, _zone(pref, city)))
+
+    with args.out.open("w", encoding="utf-8", newline="") as f:
+        f.write("# generated by scripts/build_jgd_zone_table.py\n")
+        f.write("# sources: japancode municipalities.json (MIT); GeoNames cities500 via geonamescache (CC BY 4.0)\n")
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(["lon", "lat", "pref", "zone"])
+        for lon, lat, pref, zone in sorted(rows, key=lambda r: (r[2], r[1], r[0])):
+            w.writerow([f"{lon:.5f}", f"{lat:.5f}", pref, zone])
+    print(f"{len(rows)} reference points -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+# scripts/import_legacy.py
+# 過去データ（Shapefile zip / GeoJSON / GPX）を調査に一括取り込みする CLI
+#   python scripts/import_legacy.py <survey_id> <file> [<file> ...] [--species ノスリ] [--behavior flight]
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from app.db import SessionLocal, init_db  # noqa: E402
+from app.models.survey import Survey  # noqa: E402
+from app.services.importer.legacy import DEFAULT_BATCH, detect_format, import_features, iter_source  # noqa: E402
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="import legacy survey data")
+    ap.add_argument("survey_id", type=int)
+    ap.add_argument("files", nargs="+", type=Path)
+    ap.add_argument("--species", default="unknown", help="種名が属性に無い場合の既定値")
+    ap.add_argument("--behavior", default="flight", choices=["flight", "circle", "rest"])
+    ap.add_argument("--source-epsg", type=int, default=None, help=".prj が無い場合の座標系")
+    ap.add_argument("--encoding", default="CP932", help="Shapefile の DBF 文字コード")
+    ap.add_argument("--batch-size", type=int, default=DEFAULT_BATCH)
+    args = ap.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        survey = db.get(Survey, args.survey_id)
+        if not survey:
+            print(f"survey {args.survey_id} not found", file=sys.stderr)
+            return 1
+        for path in args.files:
+            fmt = detect_format(path.name)
+            with path.open("rb") as f:
+                result = import_features(
+                    db, survey.id, survey.date,
+                    iter_source(f, fmt, args.encoding, args.source_epsg),
+                    default_species=args.species,
+                    default_behavior=args.behavior,
+                    batch_size=args.batch_size,
+                )
+            print(path, fmt, result)
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
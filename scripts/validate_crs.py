@@ -1,6 +1,69 @@
 # scripts/validate_crs.py
-from pyproj import CRS
+# 平面直角座標系（6669〜6687）の一覧と、自動選択（app.services.crs.registry）の確認
+import sys
+from pathlib import Path
 
-codes = [6669, 6670, 6671, 6672, 6673, 6674, 6675, 6676, 6677, 6678, 6679, 6680, 6681, 6682, 6683, 6684, 6685, 6686, 6687]
-for c in codes:
-    print(c, CRS.from_epsg(c).name)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from app.services.crs.registry import JGD2011_EPSG_CODES, get_crs, epsg_for_lonlat, warm_up  # noqa: E402
+
+for c in JGD2011_EPSG_CODES:
+    print(c, get_crs(c).name)
+
+# 代表地点 → 期待する EPSG
+SAMPLES = [
+    ("長崎", 129.87, 32.75, 6669),
+    ("福岡", 130.40, 33.59, 6670),
+    ("広島", 132.46, 34.39, 6671),
+    ("松山", 132.77, 33.84, 6672),
+    ("神戸", 135.19, 34.69, 6673),
+    ("大阪", 135.50, 34.69, 6674),
+    ("名古屋", 136.90, 35.18, 6675),
+    ("長野", 138.18, 36.65, 6676),
+    ("東京", 139.69, 35.69, 6677),
+    ("仙台", 140.87, 38.27, 6678),
+    ("函館", 140.73, 41.77, 6679),
+    ("札幌", 141.35, 43.06, 6680),
+    ("釧路", 144.38, 42.98, 6681),
+    ("父島", 142.19, 27.09, 6682),
+    ("那覇", 127.68, 26.21, 6683),
+    ("石垣", 124.16, 24.34, 6684),
+    # 経度帯・矩形の近似で誤っていた地点（都府県で決まる系）
+    ("和歌山", 135.17, 34.23, 6674),
+    ("前橋", 139.06, 36.39, 6677),
+    ("高崎", 139.00, 36.32, 6677),
+    ("呉", 132.57, 34.25, 6671),
+    ("下関", 130.94, 33.96, 6671),
+    ("対馬", 129.29, 34.20, 6669),
+    ("加賀", 136.31, 36.30, 6675),
+    ("大間", 140.91, 41.52, 6678),
+    # 県境・海峡を挟む地点と島嶼
+    ("門司", 130.96, 33.94, 6670),
+    ("因島", 133.18, 34.28, 6671),
+    ("川西", 135.42, 34.83, 6673),
+    ("有田", 129.88, 33.19, 6670),
+    ("洲本", 134.90, 34.34, 6673),
+    ("小豆島", 134.23, 34.48, 6672),
+    ("佐渡", 138.37, 38.02, 6676),
+    ("隠岐", 133.32, 36.21, 6671),
+    ("屋久島", 130.53, 30.34, 6670),
+    ("奄美", 129.49, 28.38, 6669),
+    ("南大東", 131.23, 25.83, 6685),
+    ("沖ノ鳥島", 136.07, 20.42, 6686),
+    ("南鳥島", 153.98, 24.28, 6687),
+    # 北海道（振興局・市町村で決まる系）
+    ("倶知安", 140.76, 42.90, 6679),
+    ("旭川", 142.36, 43.77, 6680),
+    ("帯広", 143.20, 42.92, 6681),
+    ("網走", 144.27, 44.02, 6681),
+    ("紋別", 143.35, 44.36, 6680),
+]
+
+warm_up()
+ng = 0
+for name, lon, lat, expected in SAMPLES:
+    got = epsg_for_lonlat(lon, lat)
+    mark = "OK" if got == expected else "NG"
+    ng += mark == "NG"
+    print(f"{mark} {name} ({lon}, {lat}) -> {got} (expected {expected})")
+sys.exit(1 if ng else 0)